@@ -0,0 +1,255 @@
+# ann_index.py — Index FAISS approchés / quantifiés (IVF, HNSW, IVF-PQ, SQ8, float16) + rapport rappel/latence
+# L'index exact (index.faiss, IndexFlatL2) reste la référence mise à jour par index_open_faiss.py ;
+# l'index approché en est dérivé (index_ann.faiss) et c'est lui que HybridSearcher charge s'il existe.
+# index.json (empreinte des lignes de index.faiss) est écrit en dernier, après tous les fichiers dérivés
+# et index.faiss : un lecteur qui le lit d'abord détecte un index à moitié mis à jour.
+# Compatible Python 3.9
+
+from typing import Dict, List, Optional
+import argparse
+import json
+import math
+import os
+import time
+
+import faiss
+import numpy as np
+
+INDEX_FILE = "index.faiss"
+INDEX_META = "index.json"
+ANN_FILE = "index_ann.faiss"
+ANN_META = "ann.json"
+ANN_REPORT = "ann_report.json"
+
+TRAIN_SAMPLE = 50_000  # vecteurs max pour l'entraînement (IVF / PQ / SQ)
+REPORT_QUERIES = 200   # requêtes du rapport (vecteurs tirés de l'index, leur propre ligne exclue)
+REPORT_K = 10
+
+# paramètres de recherche balayés par le rapport
+NPROBE_GRID = [1, 4, 16, 64]
+EF_SEARCH_GRID = [16, 64, 128, 256]
+
+FILTER_EF_MAX = 1024  # efSearch max. d'une recherche HNSW filtrée
+
+def resolve_spec(spec: str, n: int, dim: int) -> str:
+    """Alias lisibles → chaîne index_factory, dimensionnés sur la taille du corpus."""
+    nlist = max(1, min(int(4 * math.sqrt(n)), n // 39 or 1))  # ~39 points / centroïde au minimum
+    nbits = max(1, min(8, int(math.log2(max(n, 2)))))      # 2^nbits centroïdes PQ ≤ n
+    m = next(m for m in (dim // 8, dim // 4, dim // 2, dim) if m and dim % m == 0)
+    aliases = {
+        "flat": "Flat",
+        "ivf": f"IVF{nlist},Flat",
+        "hnsw": "HNSW32",
+        "ivf-pq": f"IVF{nlist},PQ{m}x{nbits}",
+        "ivfpq": f"IVF{nlist},PQ{m}x{nbits}",
+        "sq8": "SQ8",
+        "float16": "SQfp16",
+        "fp16": "SQfp16",
+    }
+    return aliases.get(spec.lower(), spec)  # sinon : chaîne index_factory brute (ex. "IVF256,SQ8")
+
+def build_ann(xb: np.ndarray, spec: str, train_size: int = TRAIN_SAMPLE, seed: int = 0) -> faiss.Index:
+    """Construit l'index `spec` (L2, comme l'index exact) et l'entraîne sur un échantillon de xb."""
+    index = faiss.index_factory(xb.shape[1], resolve_spec(spec, len(xb), xb.shape[1]), faiss.METRIC_L2)
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = xb if len(xb) <= train_size else xb[rng.choice(len(xb), train_size, replace=False)]
+        index.train(sample)
+    index.add(xb)
+    return index
+
+def read_index(path: str, mmap: bool = True) -> faiss.Index:
+    """Lit un index FAISS en mmap (pages chargées à la demande, démarrage quasi instantané),
+    avec repli sur une lecture complète si ce type d'index ne le permet pas."""
+    if mmap:
+        flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)  # IFC : codes Flat / SQ / PQ aussi
+        try:
+            return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            pass
+    return faiss.read_index(path)
+
+def save_index_meta(index_dir: str, rows_hash: str, ntotal: int) -> None:
+    """Empreinte des lignes de index.faiss, à écrire une fois index.faiss et ses fichiers dérivés en place."""
+    path = os.path.join(index_dir, INDEX_META)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"faiss_rows": rows_hash, "ntotal": ntotal}, f)
+    os.replace(path + ".tmp", path)
+
+def load_index_meta(index_dir: str) -> Optional[Dict]:
+    """{"faiss_rows", "ntotal"} de index.json ; None pour un index construit avant son introduction."""
+    try:
+        with open(os.path.join(index_dir, INDEX_META), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None) -> None:
+    """Applique nprobe (IVF) / efSearch (HNSW) quand ils ont un sens pour ce type d'index."""
+    ps = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        if value is None:
+            continue
+        try:
+            ps.set_index_parameter(index, name, value)
+        except RuntimeError:  # paramètre sans objet (ex. nprobe sur HNSW)
+            pass
+
+# ---------- Recherche restreinte à un sous-ensemble de lignes (filtres de métadonnées) ----------
+def id_selector(mask: np.ndarray) -> faiss.IDSelector:
+    """Sélecteur des lignes où `mask` est vrai (bitmap : un test O(1) par vecteur visité)."""
+    bits = np.packbits(np.asarray(mask, dtype=bool), bitorder="little")
+    sel = faiss.IDSelectorBitmap(len(bits), faiss.swig_ptr(bits))
+    sel.bitmap_ref = bits  # le bitmap doit vivre aussi longtemps que le sélecteur
+    return sel
+
+def _selector_params(index: faiss.Index, sel: faiss.IDSelector, k: int, fraction: float,
+                     widen: bool = False) -> faiss.SearchParameters:
+    """Paramètres de recherche portant `sel`. nprobe / efSearch courants divisés par la part de
+    lignes retenues (`fraction`) : on visite autant de lignes autorisées qu'une recherche non
+    filtrée. `widen` : toutes les listes IVF, file HNSW maximale."""
+    index = faiss.downcast_index(index)
+    scale = 1.0 / max(fraction, 1e-6)
+    if isinstance(index, faiss.IndexPreTransform):
+        return faiss.SearchParametersPreTransform(
+            index_params=_selector_params(index.index, sel, k, fraction, widen))
+    if isinstance(index, faiss.IndexIVF):
+        nprobe = index.nlist if widen else min(index.nlist, math.ceil(index.nprobe * scale))
+        return faiss.SearchParametersIVF(sel=sel, nprobe=nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        ef = index.hnsw.efSearch
+        ef = FILTER_EF_MAX if widen else min(FILTER_EF_MAX, max(k, math.ceil(ef * scale)))
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=ef)
+    return faiss.SearchParameters(sel=sel)
+
+def search_subset(index: faiss.Index, xq: np.ndarray, k: int, sel: faiss.IDSelector,
+                  n_allowed: int):
+    """index.search limité aux lignes de `sel` (n_allowed lignes). Un index approché peut en
+    renvoyer moins de min(k, n_allowed) (listes IVF non visitées, graphe HNSW) : ces requêtes
+    sont relancées avec une recherche élargie."""
+    fraction = n_allowed / max(index.ntotal, 1)
+    D, I = index.search(xq, k, params=_selector_params(index, sel, k, fraction))
+    short = np.flatnonzero((I != -1).sum(axis=1) < min(k, n_allowed))
+    if len(short):
+        D2, I2 = index.search(xq[short], k, params=_selector_params(index, sel, k, fraction, widen=True))
+        D[short], I[short] = D2, I2
+    return D, I
+
+def _param_grid(index: faiss.Index) -> List[Dict[str, int]]:
+    try:
+        faiss.extract_index_ivf(index)
+        return [{"nprobe": p} for p in NPROBE_GRID]
+    except RuntimeError:
+        pass
+    if isinstance(faiss.downcast_index(index), faiss.IndexHNSW):
+        return [{"efSearch": e} for e in EF_SEARCH_GRID]
+    return [{}]
+
+def _search_params(index: faiss.Index) -> Dict[str, int]:
+    """Réglages de recherche courants (nprobe / efSearch) de l'index, s'il en a."""
+    try:
+        return {"nprobe": faiss.extract_index_ivf(index).nprobe}
+    except RuntimeError:
+        pass
+    hnsw = faiss.downcast_index(index)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        return {"efSearch": hnsw.hnsw.efSearch}
+    return {}
+
+def evaluate(index: faiss.Index, xb: np.ndarray, spec: str, n_queries: int = REPORT_QUERIES,
+             k: int = REPORT_K, seed: int = 1) -> List[Dict]:
+    """Rappel@k vs recherche exacte, latence par requête (ms) et taille, pour chaque réglage.
+    Les requêtes sont des vecteurs de l'index : leur propre ligne (trouvée d'office) est retirée
+    des résultats exacts et approchés avant de compter, sinon le rappel est gonflé. Les réglages
+    de recherche de l'index sont rétablis en sortie (il peut être sauvegardé ensuite)."""
+    rng = np.random.default_rng(seed)
+    qi = rng.choice(len(xb), min(n_queries, len(xb)), replace=False)
+    xq = xb[qi]
+    exact = faiss.IndexFlatL2(xb.shape[1])
+    exact.add(xb)
+    _, truth = exact.search(xq, k + 1)
+    truth = [t[(t != i) & (t != -1)][:k] for t, i in zip(truth, qi)]
+    size = faiss.serialize_index(index).nbytes
+    original = _search_params(index)
+
+    rows = []
+    try:
+        for params in _param_grid(index):
+            set_search_params(index, params.get("nprobe"), params.get("efSearch"))
+            found, lat = [], []
+            for i, q in zip(qi, xq):  # une requête à la fois, comme en service
+                t = time.perf_counter()
+                _, ids = index.search(q[None, :], k + 1)
+                lat.append((time.perf_counter() - t) * 1000)
+                found.append(ids[0][ids[0] != i][:k])
+            recall = np.mean([len(set(f) & set(t)) / max(len(t), 1) for f, t in zip(found, truth)])
+            rows.append({
+                "spec": resolve_spec(spec, len(xb), xb.shape[1]),
+                "params": params,
+                f"recall@{k}": round(float(recall), 4),
+                "p50_ms": round(float(np.percentile(lat, 50)), 3),
+                "p99_ms": round(float(np.percentile(lat, 99)), 3),
+                "size_mb": round(size / 2**20, 2),
+            })
+    finally:
+        set_search_params(index, original.get("nprobe"), original.get("efSearch"))
+    return rows
+
+def print_report(rows: List[Dict]) -> None:
+    rk = next(k for k in rows[0] if k.startswith("recall@"))
+    print(f"({rk} : requêtes tirées de l'index, leur propre ligne exclue)")
+    print(f"{'spec':<22}{'params':<16}{rk:>10}{'p50 ms':>9}{'p99 ms':>9}{'size MB':>9}")
+    for r in rows:
+        params = ",".join(f"{k}={v}" for k, v in r["params"].items()) or "-"
+        print(f"{r['spec']:<22}{params:<16}{r[rk]:>10.3f}{r['p50_ms']:>9.3f}"
+              f"{r['p99_ms']:>9.3f}{r['size_mb']:>9.2f}")
+
+# ---------- Persistance ----------
+def save_ann(index_dir: str, index: faiss.Index, spec: str, rows_hash: str, report: List[Dict]) -> None:
+    path = os.path.join(index_dir, ANN_FILE)
+    faiss.write_index(index, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    with open(os.path.join(index_dir, ANN_META), "w", encoding="utf-8") as f:
+        json.dump({"spec": spec, "faiss_rows": rows_hash, "ntotal": index.ntotal}, f)
+    with open(os.path.join(index_dir, ANN_REPORT), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+def remove_ann(index_dir: str) -> None:
+    for name in (ANN_FILE, ANN_META, ANN_REPORT):
+        path = os.path.join(index_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+def load_ann(index_dir: str, rows_hash: str) -> Optional[faiss.Index]:
+    """Index approché s'il existe et correspond aux mêmes lignes que l'index exact, sinon None."""
+    try:
+        with open(os.path.join(index_dir, ANN_META), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("faiss_rows") != rows_hash:
+        print("⚠️  index approché périmé : index exact utilisé (relancer index_open_faiss.py)")
+        return None
+    return read_index(os.path.join(index_dir, ANN_FILE))
+
+# ---------- CLI : comparer plusieurs types d'index sur l'index existant ----------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Compare des index FAISS approchés à l'index exact.")
+    ap.add_argument("--index-dir", default="faiss_open_index")
+    ap.add_argument("--specs", default="Flat,IVF,HNSW,IVF-PQ,SQ8,float16",
+                    help="alias (Flat, IVF, HNSW, IVF-PQ, SQ8, float16) ou chaînes index_factory")
+    ap.add_argument("-k", type=int, default=REPORT_K)
+    ap.add_argument("--queries", type=int, default=REPORT_QUERIES)
+    args = ap.parse_args()
+
+    flat = faiss.read_index(os.path.join(args.index_dir, "index.faiss"))
+    xb = flat.reconstruct_n(0, flat.ntotal)
+    report = []
+    for spec in args.specs.split(","):
+        t = time.perf_counter()
+        index = build_ann(xb, spec.strip())
+        print(f"→ {spec.strip()}: built in {time.perf_counter() - t:.1f}s")
+        report += evaluate(index, xb, spec.strip(), n_queries=args.queries, k=args.k)
+    print()
+    print_report(report)
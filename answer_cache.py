@@ -0,0 +1,178 @@
+# answer_cache.py — Cache sémantique des réponses du LLM (app.py)
+# Une question déjà traitée, ou une paraphrase (« c'est quoi un SRM ? » / « définition SRM »), reprend
+# la réponse et les sources stockées au lieu d'un nouvel appel Groq. Un succès exige :
+# - cosinus entre embeddings des questions ≥ ANSWER_CACHE_THRESHOLD
+# - même langue de question et exactement le même ensemble de chunks retrouvés
+# Éviction LRU (ANSWER_CACHE_SIZE entrées) et par âge (ANSWER_CACHE_TTL) ; persistance SQLite ;
+# taux de succès et tokens économisés via metrics.py et `python answer_cache.py`.
+# Compatible Python 3.9
+
+from typing import Dict, Iterable, List, Optional, Tuple
+from collections import OrderedDict
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "answer_cache.sqlite")  # "" → cache désactivé
+THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.9"))    # cosinus minimal
+MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+MAX_AGE = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))    # secondes (0 = sans limite)
+
+# ---------- Langue de la question ----------
+_WORDS = re.compile(r"[a-zàâäçéèêëîïôöùûüœ']+")
+FR_WORDS = {"le", "la", "les", "un", "une", "des", "du", "de", "est", "c'est", "quoi", "quel", "quelle",
+            "quels", "quelles", "comment", "pourquoi", "qu'est-ce", "que", "qui", "et", "ou", "pour",
+            "avec", "dans", "sur", "entre", "définition", "différence"}
+EN_WORDS = {"the", "a", "an", "is", "are", "what", "which", "how", "why", "when", "does", "do", "of",
+            "and", "or", "for", "with", "in", "on", "between", "definition", "difference"}
+
+def detect_language(text: str) -> str:
+    """« fr », « en » ou « » (indécidable) d'après les mots outils et les accents."""
+    words = _WORDS.findall((text or "").lower())
+    fr = sum(w in FR_WORDS or w.startswith(("l'", "d'", "qu'")) for w in words)
+    fr += any(ch in "àâçéèêëîïôùûœ" for w in words for ch in w)
+    en = sum(w in EN_WORDS for w in words)
+    return "fr" if fr > en else "en" if en > fr else ""
+
+def sources_key(chunk_ids: Iterable) -> str:
+    """Ensemble des chunks retrouvés (ordre indifférent)."""
+    return ",".join(sorted(str(i) for i in chunk_ids))
+
+def estimate_tokens(*texts: str) -> int:
+    """Ordre de grandeur (~4 caractères / token) quand l'API ne renvoie pas l'usage."""
+    return sum(len(t) for t in texts) // 4 + 1
+
+class CachedAnswer:
+    __slots__ = ("id", "question", "language", "sources_key", "answer", "sources", "tokens",
+                 "created", "used", "hits", "vec")
+
+    def __init__(self, id: int, question: str, language: str, sources_key: str, answer: str, sources: str,
+                 tokens: int, created: float, used: float, hits: int, vec: np.ndarray):
+        self.id, self.question, self.language, self.sources_key = id, question, language, sources_key
+        self.answer, self.sources, self.tokens = answer, sources, tokens
+        self.created, self.used, self.hits, self.vec = created, used, hits, vec
+
+class AnswerCache:
+    """Réponses indexées par embedding de question, en mémoire (ordre LRU) et sur disque (thread-safe)."""
+
+    def __init__(self, path: str = ANSWER_CACHE, threshold: float = THRESHOLD,
+                 maxsize: int = MAX_ENTRIES, max_age: float = MAX_AGE):
+        self.threshold, self.maxsize, self.max_age = threshold, maxsize, max_age
+        self.hits = self.misses = self.tokens_saved = 0  # depuis le démarrage
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()  # du moins au plus récemment servi
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS answers (id INTEGER PRIMARY KEY, question TEXT, "
+                        "language TEXT, sources_key TEXT, answer TEXT, sources TEXT, tokens INTEGER, "
+                        "created REAL, used REAL, hits INTEGER, vec BLOB)")
+        for row in self.db.execute("SELECT * FROM answers ORDER BY used"):
+            e = CachedAnswer(*row[:-1], np.frombuffer(row[-1], dtype=np.float32))
+            self._entries[e.id] = e
+        with self._lock:
+            self._evict(time.time())
+
+    @staticmethod
+    def _unit(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32).ravel()
+        n = float(np.linalg.norm(v))
+        return v / n if n > 0 else v
+
+    def _evict(self, now: float) -> None:
+        """Entrées trop vieilles, puis les moins récemment servies au-delà de maxsize (verrou tenu)."""
+        drop = [i for i, e in self._entries.items() if self.max_age and now - e.created > self.max_age]
+        excess = len(self._entries) - len(drop) - self.maxsize
+        if excess > 0:
+            gone = set(drop)
+            drop += [i for i in self._entries if i not in gone][:excess]
+        for i in drop:
+            del self._entries[i]
+        if drop:
+            self.db.executemany("DELETE FROM answers WHERE id = ?", ((i,) for i in drop))
+            self.db.commit()
+
+    def lookup(self, vec, language: str, chunk_ids: Iterable) -> Optional[Tuple[CachedAnswer, float]]:
+        """(réponse, cosinus) de la question stockée la plus proche, ou None sous le seuil."""
+        key, v, now = sources_key(chunk_ids), self._unit(vec), time.time()
+        with self._lock:
+            self._evict(now)
+            same = [e for e in self._entries.values() if e.language == language and e.sources_key == key]
+            best, sim = None, -1.0
+            if same:
+                sims = np.stack([e.vec for e in same]) @ v
+                j = int(np.argmax(sims))
+                best, sim = same[j], float(sims[j])
+            if best is None or sim < self.threshold:
+                self.misses += 1
+                return None
+            best.used, best.hits = now, best.hits + 1
+            self._entries.move_to_end(best.id)
+            self.hits += 1
+            self.tokens_saved += best.tokens
+            self.db.execute("UPDATE answers SET used = ?, hits = ? WHERE id = ?", (now, best.hits, best.id))
+            self.db.commit()
+            return best, sim
+
+    def put(self, vec, question: str, language: str, chunk_ids: Iterable, answer: str, sources: str,
+            tokens: int) -> None:
+        v, key, now = self._unit(vec), sources_key(chunk_ids), time.time()
+        with self._lock:
+            cur = self.db.execute("INSERT INTO answers (question, language, sources_key, answer, sources, "
+                                  "tokens, created, used, hits, vec) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?)",
+                                  (question, language, key, answer, sources, int(tokens), now, now, v.tobytes()))
+            e = CachedAnswer(cur.lastrowid, question, language, key, answer, sources, int(tokens), now, now, 0, v)
+            self._entries[e.id] = e
+            self.db.commit()
+            self._evict(now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.db.execute("DELETE FROM answers")
+            self.db.commit()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Format de Metrics.register_caches ; + tokens économisés (session et cumul sur disque)."""
+        with self._lock:
+            total = self.hits + self.misses
+            lifetime = sum(e.hits for e in self._entries.values())
+            return {"answers": {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "tokens_saved": self.tokens_saved,
+                "lifetime_hits": lifetime,
+                "lifetime_tokens_saved": sum(e.hits * e.tokens for e in self._entries.values()),
+            }}
+
+    def top(self, n: int = 10) -> List[CachedAnswer]:
+        """Entrées qui ont économisé le plus de tokens."""
+        with self._lock:
+            return sorted(self._entries.values(), key=lambda e: e.hits * e.tokens, reverse=True)[:n]
+
+    def close(self) -> None:
+        self.db.close()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="État du cache de réponses du LLM.")
+    ap.add_argument("--path", default=ANSWER_CACHE or "answer_cache.sqlite")
+    ap.add_argument("--top", type=int, default=10, help="questions qui ont économisé le plus de tokens")
+    ap.add_argument("--clear", action="store_true", help="vide le cache")
+    args = ap.parse_args()
+
+    cache = AnswerCache(args.path)
+    if args.clear:
+        cache.clear()
+        print("🗑️  cache de réponses vidé")
+    st = cache.stats()["answers"]
+    print(f"{st['size']} réponses · {st['lifetime_hits']} succès · "
+          f"~{st['lifetime_tokens_saved']} tokens économisés")
+    for e in cache.top(args.top):
+        if e.hits:
+            print(f"  {e.hits:4d} × {e.tokens:5d} tok  [{e.language or '?'}] {e.question}")
+    cache.close()
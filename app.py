@@ -1,29 +1,34 @@
 # app.py
 # ======
 # Ce script fait 3 choses :
-# 1. Charge un index FAISS qui contient nos documents (Wikipédia ici)
+# 1. Charge notre recherche hybride (FAISS + BM25) sur les documents (Wikipédia ici)
 # 2. Branche un LLM gratuit (Llama-3-8B-Instruct via Groq) grâce à LangChain
 # 3. Crée une interface Gradio où l'utilisateur tape une question et reçoit
-#    une réponse générée + les sources utilisées
+#    une réponse générée (affichée token par token) + les sources utilisées
+#    (les mêmes passages que ceux vus par le LLM)
 
 # ------------------------------------------------------------------
 # 0. Imports standards
 # ------------------------------------------------------------------
+import asyncio
 import os
+import threading
+import time
+from functools import lru_cache
 from dotenv import load_dotenv  # charge les variables définies dans .env (clé API)
 
 # ------------------------------------------------------------------
-# 1. Imports LangChain : LLM + chaîne de réponse
+# 1. Imports LangChain : prompt (le client Groq est importé à la demande, cf. 5.)
 # ------------------------------------------------------------------
-from langchain_groq import ChatGroq  # wrapper Groq (LLM gratuit, rapide)
-from langchain.chains import RetrievalQA  # chaîne "question → réponse" avec contexte
-from langchain.prompts import PromptTemplate  # template pour dire au LLM comment répondre
+from langchain_core.prompts import PromptTemplate  # template pour dire au LLM comment répondre
 
 # ------------------------------------------------------------------
-# 2. Imports pour le vecteur-store (base de connaissances)
+# 2. Import de la recherche (base de connaissances)
 # ------------------------------------------------------------------
-from langchain_community.vectorstores import FAISS  # index de similarité
-from langchain_community.embeddings import HuggingFaceEmbeddings  # modèle d'embeddings
+from retrieval_client import RETRIEVAL_URL, RemoteSearcher  # client du serveur de recherche partagé
+from metrics import METRICS, serve as serve_metrics  # latences par étape (p50/p95/p99), export Prometheus
+from context_pack import CONTEXT_TOKENS, pack_context  # passages fusionnés, dédupliqués, sous budget
+from answer_cache import ANSWER_CACHE, AnswerCache, detect_language, estimate_tokens  # cache sémantique
 
 # ------------------------------------------------------------------
 # 3. Imports UI
@@ -35,18 +40,32 @@ import gradio as gr
 # ------------------------------------------------------------------
 load_dotenv()  # lit le fichier .env local
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_API_BASE = os.getenv("GROQ_API_BASE")  # ex. http://127.0.0.1:8008 avec mock_llm_server.py (hors ligne)
 if not GROQ_API_KEY:
-    raise ValueError("Clé GROQ_API_KEY manquante dans .env ou variables HF Spaces")
+    if not GROQ_API_BASE:
+        raise ValueError("Clé GROQ_API_KEY manquante dans .env ou variables HF Spaces")
+    GROQ_API_KEY = "mock"  # le serveur local n'en vérifie pas
+
+# File d'attente Gradio : on borne le nombre d'appels LLM simultanés (limite de débit Groq)
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))  # réponses générées en parallèle
+QUEUE_MAX = int(os.getenv("QUEUE_MAX", "32"))             # requêtes en attente au-delà → refusées
+METRICS_PORT = os.getenv("METRICS_PORT")  # ex. 9108 → /metrics, /metrics.json et sonde /ready
 
 # ------------------------------------------------------------------
 # 5. Initialisation du LLM
 # ------------------------------------------------------------------
 # ChatGroq : interface OpenAI-compatible → pas de carte bleue, 30 k tokens/h gratuits
-llm = ChatGroq(
-    model="llama-3.1-8b-instant",  # modèle open-source hébergé par Groq
-    temperature=0.3,  # 0 = très déterministe, 1 = très créatif
-    groq_api_key=GROQ_API_KEY,
-)
+@lru_cache(maxsize=1)
+def get_llm():
+    from langchain_groq import ChatGroq  # wrapper Groq (LLM gratuit, rapide) ; import différé
+    return ChatGroq(
+        model="llama-3.1-8b-instant",  # modèle open-source hébergé par Groq
+        temperature=0.3,  # 0 = très déterministe, 1 = très créatif
+        groq_api_key=GROQ_API_KEY,
+        base_url=GROQ_API_BASE,  # None → API Groq
+    )
+
+threading.Thread(target=get_llm, name="llm-loader", daemon=True).start()  # prêt avant la 1re question
 
 # ------------------------------------------------------------------
 # 6. Template de prompt : on guide le LLM pour qu’il réponde en français
@@ -54,6 +73,7 @@ llm = ChatGroq(
 # ------------------------------------------------------------------
 prompt_template = """Tu es un assistant scientifique francophone.
 Réponds de manière concise et claire en utilisant uniquement le contexte ci-dessous.
+Cite les passages utilisés par leur numéro, par exemple [1].
 Si le contexte ne permet pas de répondre, dis simplement « Je ne sais pas. »
 
 Contexte :
@@ -68,72 +88,155 @@ PROMPT = PromptTemplate(
 )
 
 # ------------------------------------------------------------------
-# 7. Chargement de l’index FAISS (base de connaissances)
+# 7. Chargement de la recherche hybride (index FAISS + BM25 + chunk store)
 # ------------------------------------------------------------------
-INDEX_DIR = "faiss_open_index"  # dossier créé précédemment
-EMBED_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+K_SOURCES = 3  # chunks retrouvés ; fusionnés en passages envoyés au LLM et affichés comme sources
 
-embeddings = HuggingFaceEmbeddings(
-    model_name=EMBED_MODEL,
-    encode_kwargs={"normalize_embeddings": True},
-)
+# RETRIEVAL_URL défini → client léger de retrieval_server.py (index et modèle partagés entre workers) ;
+# sinon chargée et chauffée en arrière-plan : l'interface s'affiche sans attendre l'index ni le modèle
+if RETRIEVAL_URL:
+    loader = RemoteSearcher(RETRIEVAL_URL)
+else:
+    from hybrid_search import SearcherLoader  # réécriture + FAISS + BM25 + fusion + filtre domaine + boost
+    loader = SearcherLoader()
 
-# allow_dangerous_deserialization=True car l’index a été sauvé localement
-vectorstore = FAISS.load_local(INDEX_DIR, embeddings, allow_dangerous_deserialization=True)
+# Cache sémantique des réponses (answer_cache.py) : une paraphrase d'une question déjà traitée,
+# avec les mêmes sources, ne coûte aucun appel Groq. ANSWER_CACHE="" → désactivé.
+answers = AnswerCache(ANSWER_CACHE) if ANSWER_CACHE else None
+if answers is not None:
+    METRICS.register_caches("llm", answers.stats)
 
 # ------------------------------------------------------------------
-# 8. Chaîne de réponse : RetrievalQA
-#    - retriever : trouve les 3 passages les plus proches
-#    - llm : génère la réponse à partir de ces passages
+# 8. Mise en forme : contexte du prompt + cartes sources
 # ------------------------------------------------------------------
-qa_chain = RetrievalQA.from_chain_type(
-    llm=llm,
-    chain_type="stuff",  # on « bourre » tous les passages dans le prompt
-    retriever=vectorstore.as_retriever(search_kwargs={"k": 3}),
-    chain_type_kwargs={"prompt": PROMPT},
-)
-
-# ------------------------------------------------------------------
-# 9. Fonction appelée par Gradio
-# ------------------------------------------------------------------
-def answer_question(question: str) -> str:
-    """Pose la question au LLM et renvoie la réponse + liens sources."""
-    question = question.strip()
-    if not question:
-        return "<i>Entre une question…</i>"
+def build_context(docs):
+    """Passages du prompt : chunks d'un même article fusionnés par offsets, phrases quasi dupliquées
+    retirées, numérotés [n] dans l'ordre du classement jusqu'à CONTEXT_TOKENS (cf. context_pack.py)."""
+    return pack_context(docs, CONTEXT_TOKENS)
 
-    # 1) réponse générée
-    answer = qa_chain.run(question)
-
-    # 2) on récupère les documents utilisés pour afficher les sources
-    docs = vectorstore.similarity_search(question, k=3)
-
-    # 3) mise en forme HTML rapide
+def render_sources(passages) -> str:
     sources = []
-    for i, d in enumerate(docs, 1):
-        title = d.metadata.get("title", "—")
-        url = d.metadata.get("url", "#")
-        snippet = (d.page_content[:300] + "…").replace("\n", " ")
+    for p in passages:  # même numéro [n] que dans le contexte du LLM
+        snippet = (p.text[:300] + "…").replace("\n", " ")
         sources.append(
             f"<div style='margin:8px 0;padding:8px;border:1px solid #ddd;border-radius:8px'>"
-            f"<b>{i}. {title}</b><br/>"
-            f"<a href='{url}' target='_blank'>{url}</a><br/>"
+            f"<b>[{p.n}] {p.title}</b><br/>"
+            f"<a href='{p.url}' target='_blank'>{p.url}</a><br/>"
             f"<span style='opacity:.8'>{snippet}</span>"
             f"</div>"
         )
+    return "\n".join(sources)
+
+def render_timings(timings, ttft=None) -> str:
+    parts = [f"{name} {ms:.0f} ms" for name, ms in timings.items()]
+    if ttft is not None:
+        parts.append(f"1er token {ttft:.0f} ms")
+    return f"<div style='opacity:.6;font-size:.85em'>⏱ {' · '.join(parts)} · total {sum(timings.values()):.0f} ms</div>"
 
-    return f"<b>Réponse :</b><br/>{answer}<br/><br/><b>Sources :</b><br/>" + "\n".join(sources)
+def render_answer(answer: str, sources: str, timings, ttft=None) -> str:
+    return (f"<b>Réponse :</b><br/>{answer}<br/><br/><b>Sources :</b><br/>" + sources
+            + render_timings(timings, ttft))
+
+def chunk_ids(docs):
+    return [d.metadata.get("chunk_id", d.metadata.get("id")) for d in docs]
+
+# ------------------------------------------------------------------
+# 9. Fonction appelée par Gradio (générateur async : la réponse s'affiche au fil des tokens)
+# ------------------------------------------------------------------
+async def answer_question(question: str):
+    """Pose la question au LLM et renvoie (en continu) la réponse + liens sources."""
+    question = (question or "").strip()
+    if not question:
+        yield "<i>Entre une question…</i>"
+        return
+    timings = {}
+    if not loader.ready():
+        yield "<i>⏳ Chargement de l'index et du modèle…</i>"
+    searcher = await loader.aget()
+
+    # 1) une seule recherche : ces passages vont au LLM ET dans les sources affichées
+    #    (hors de la boucle asyncio de Gradio ; branches dense et BM25 en parallèle)
+    t = time.perf_counter()
+    docs, _ = await searcher.asearch(question, k_final=K_SOURCES)
+    timings["recherche"] = (time.perf_counter() - t) * 1000
+
+    # 2) contexte compacté (fusion, dédoublonnage, budget) + sources HTML, affichées avant le 1er token
+    t = time.perf_counter()
+    context = build_context(docs)
+    timings["contexte"] = (time.perf_counter() - t) * 1000
+    METRICS.observe("context_pack", timings["contexte"] / 1000)
+    METRICS.count("context_tokens", context.tokens)
+    METRICS.inc("context_tokens_saved", context.saved)
+    t = time.perf_counter()
+    sources = render_sources(context.passages) + (
+        f"<div style='opacity:.6;font-size:.85em'>📦 contexte ~{context.tokens} tokens "
+        f"({context.saved:+d} économisés vs chunks bruts)</div>")
+    timings["rendu"] = (time.perf_counter() - t) * 1000
+    METRICS.observe("html", timings["rendu"] / 1000)
+
+    # 2 bis) même question (ou paraphrase), même langue, mêmes passages → réponse déjà générée
+    if answers is not None:
+        t = time.perf_counter()
+        vec = await asyncio.to_thread(searcher.embed_query, question)
+        lang = detect_language(question)
+        hit = await asyncio.to_thread(answers.lookup, vec, lang, chunk_ids(docs))  # SQLite hors boucle
+        timings["cache"] = (time.perf_counter() - t) * 1000
+        METRICS.observe("answer_cache", timings["cache"] / 1000)
+        if hit is not None:
+            cached, sim = hit
+            METRICS.inc("llm_tokens_saved", cached.tokens)
+            yield (render_answer(cached.answer, cached.sources, timings)
+                   + f"<div style='opacity:.6;font-size:.85em'>♻️ réponse en cache (cosinus {sim:.2f}, "
+                     f"~{cached.tokens} tokens économisés)</div>")
+            return
+    yield render_answer("<i>…</i>", sources, timings)
+
+    # 3) réponse générée à partir de ces mêmes passages, streamée token par token.
+    #    Si l'utilisateur annule (bouton Stop, onglet fermé), Gradio annule cette tâche :
+    #    CancelledError remonte dans astream, qui ferme la connexion HTTP → Groq arrête de générer.
+    prompt = PROMPT.format(context=context.text, question=question)
+    answer, ttft, usage = "", None, None
+    t = time.perf_counter()
+    async for chunk in get_llm().astream(prompt):
+        usage = getattr(chunk, "usage_metadata", None) or usage  # dernier chunk (x_groq)
+        if not chunk.content:
+            continue
+        if ttft is None:
+            ttft = (time.perf_counter() - t) * 1000
+            METRICS.observe("llm_ttft", ttft / 1000)
+        answer += chunk.content
+        yield render_answer(answer, sources, timings, ttft)
+    timings["LLM"] = (time.perf_counter() - t) * 1000
+    METRICS.observe("llm", timings["LLM"] / 1000)
+    METRICS.count("llm_chars", len(answer))
+    if answers is not None and answer.strip():
+        tokens = usage["total_tokens"] if usage else estimate_tokens(prompt, answer)
+        await asyncio.to_thread(answers.put, vec, question, lang, chunk_ids(docs), answer, sources, tokens)
+    yield render_answer(answer, sources, timings, ttft)
 
 # ------------------------------------------------------------------
 # 10. Interface Gradio
 # ------------------------------------------------------------------
 with gr.Blocks(theme=gr.themes.Soft(), title="Experiment Brief Q&A") as demo:
-    gr.Markdown("## 🔎 Experiment Brief — Q&R avec Llama-3 (Groq) + FAISS")
+    gr.Markdown("## 🔎 Experiment Brief — Q&R avec Llama-3 (Groq) + FAISS + BM25")
     with gr.Row():
         q = gr.Textbox(label="Ta question", placeholder="Ex. Quelle est la différence entre interleaving et A/B testing ?")
-    go = gr.Button("Répondre")
+    with gr.Row():
+        go = gr.Button("Répondre", variant="primary")
+        stop = gr.Button("Stop")
     out = gr.HTML()
-    go.click(answer_question, inputs=q, outputs=out)
+    # même concurrency_id : au plus LLM_CONCURRENCY générations à la fois (bouton + Entrée),
+    # les autres patientent dans la file
+    answering = go.click(answer_question, inputs=q, outputs=out, concurrency_limit=LLM_CONCURRENCY,
+                         concurrency_id="llm")
+    submitting = q.submit(answer_question, inputs=q, outputs=out, concurrency_limit=LLM_CONCURRENCY,
+                          concurrency_id="llm")
+    stop.click(None, cancels=[answering, submitting])
+
+demo.queue(max_size=QUEUE_MAX)
+
+if METRICS_PORT:
+    serve_metrics(METRICS, int(METRICS_PORT), ready=loader.ready)
 
 # ------------------------------------------------------------------
 # 11. Lancement
@@ -0,0 +1,434 @@
+# bench_retrieval.py — Banc d'essai de la recherche : qualité (recall@k, MRR, nDCG) et vitesse
+# Qualité : requêtes FR/EN annotées (bench_queries.jsonl → articles attendus) sur l'index réel,
+#           pour FAISS seul, BM25 seul, HybridSearcher et HybridSearcher filtré sur la langue de la requête.
+# Vitesse : corpus synthétiques 10× / 100× / 1000× l'index réel (vecteurs bruités, postings BM25
+#           répliqués) → débit et latences p50 / p99.
+# Démarrage à froid : interpréteur neuf → import, chargement (mmap, snapshot), chauffe, 1re requête.
+# Déduplication (--dedup) : qualité de l'index réel contre la même après retrait des chunks quasi
+#           dupliqués (near_dup.py). L'index source doit être construit sans déduplication (--no-dedup).
+#           Recall strict (le chunk canonique ne vaut que pour son article) et, à côté, crédité (il vaut
+#           aussi pour les articles de ses doublons retirés, à son rang, sans décaler les suivants).
+# Sortie JSON (--out) pour comparer deux versions du code de recherche.
+# Compatible Python 3.9
+
+import os
+os.environ.setdefault("HF_HUB_OFFLINE", "1")  # modèle local figé : aucun téléchargement pendant un bench
+
+from typing import Callable, Dict, List, Optional
+import argparse
+import json
+import math
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+import faiss
+import numpy as np
+
+from ann_index import INDEX_FILE, build_ann, save_ann, save_index_meta
+from bm25_index import BM25Index, faiss_rows_hash, okapi_idf, tokenize
+from chunk_store import DUP_DTYPE, STORE_DIR, ChunkStore
+from encoders import BACKENDS, ONNX_DIR
+from fusion import FUSION_MODES
+from hybrid_search import (BOOST_TERMS, DOMAIN_TERMS, EMBED_BACKEND, EMBED_MODEL, FUSION_MODE, INDEX_DIR,
+                           HybridSearcher)
+from metrics import Metrics
+from near_dup import THRESHOLD as DEDUP_THRESHOLD, NearDupIndex
+from term_signals import compute_signals, load_signals, save_signals
+from warm_snapshot import SNAPSHOT_DIR
+
+QUERIES_FILE = "bench_queries.jsonl"
+WORK_DIR = "bench_work"       # corpus synthétiques (supprimés après usage sauf --keep-work)
+KS = (1, 3, 5, 10)
+NDCG_K = 10
+DEPTH = 30                    # chunks récupérés par système avant regroupement par article
+SCALES = (10, 100, 1000)
+NOISE = 0.02                  # écart-type du bruit ajouté aux vecteurs des copies synthétiques
+REPEAT = 5                    # passes sur les requêtes pour les latences
+BATCH = 16                    # taille des lots pour le débit search_many
+COLD_RUNS = 3                 # démarrages à froid mesurés (médiane)
+
+# exécuté dans un interpréteur neuf : argv = index_dir, modèle, backend, requête
+COLD_START = """
+import json, sys, time
+t0 = time.perf_counter()
+from hybrid_search import HybridSearcher
+t1 = time.perf_counter()
+hs = HybridSearcher(index_dir=sys.argv[1], embed_model=sys.argv[2], embed_backend=sys.argv[3])
+t2 = time.perf_counter()
+hs.warmup()
+t3 = time.perf_counter()
+hs.search(sys.argv[4])
+t4 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "load_s": t2 - t1, "warmup_s": t3 - t2,
+                  "first_query_s": t4 - t3, "ready_s": t3 - t0}))
+"""
+
+def load_queries(path: str = QUERIES_FILE) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def percentiles(lat_ms: List[float]) -> Dict[str, float]:
+    return {"p50_ms": round(float(np.percentile(lat_ms, 50)), 3),
+            "p99_ms": round(float(np.percentile(lat_ms, 99)), 3)}
+
+# ---------- Qualité ----------
+def ranked_articles(titles: List[List[str]]) -> Dict[str, int]:
+    """Chunks classés (titre de l'article puis ceux des quasi-doublons) → rang de chaque article
+    (1re occurrence). Seul l'article du chunk prend un rang ; ceux de ses doublons reçoivent le rang
+    du chunk sans décaler les suivants : le crédit ne fait que remonter des articles, jamais descendre."""
+    ranks: Dict[str, int] = {}   # articles des chunks : mêmes rangs qu'en strict
+    credit: Dict[str, int] = {}  # articles des doublons : rang du chunk canonique qui les porte
+    for own, *dups in titles:
+        ranks.setdefault(own, len(ranks) + 1)
+        for t in dups:
+            credit.setdefault(t, len(ranks))
+    for t, r in credit.items():
+        if r < ranks.get(t, r + 1):
+            ranks[t] = r
+    return ranks
+
+def score_query(ranks: Dict[str, int], relevant: set) -> Dict[str, float]:
+    found = {t: ranks[t] for t in relevant if t in ranks}
+    out = {f"recall@{k}": sum(r <= k for r in found.values()) / len(relevant) for k in KS}
+    out["mrr"] = 1.0 / min(found.values()) if found else 0.0
+    dcg = sum(1.0 / math.log2(r + 1) for r in found.values() if r <= NDCG_K)
+    idcg = sum(1.0 / math.log2(i + 1) for i in range(1, min(len(relevant), NDCG_K) + 1))
+    out[f"ndcg@{NDCG_K}"] = dcg / idcg
+    return out
+
+def systems(hs: HybridSearcher, credit_duplicates: bool = False) -> Dict[str, Callable[[Dict], List[List[str]]]]:
+    """Titres des chunks classés, par système ; FAISS et BM25 seuls reçoivent la même requête
+    réécrite que HybridSearcher (seule la fusion / le filtrage diffère). hybrid_lang : recherche
+    restreinte à la langue de la requête (filtre dans FAISS et BM25). Avec `credit_duplicates`, un chunk
+    compte aussi pour les articles de ses quasi-doublons écartés à l'indexation (renvois du chunk store)."""
+    def titles(row: int) -> List[str]:
+        dups = hs.store.duplicates(row) if credit_duplicates else ()
+        return [hs.store.metadata(row)["title"]] + [d["title"] for d in dups]
+
+    def doc_titles(docs) -> List[List[str]]:
+        return [[d.metadata["title"]] + [x["title"] for x in d.metadata.get("duplicates", ()) if credit_duplicates]
+                for d in docs]
+
+    def dense(q: Dict) -> List[List[str]]:
+        run = hs._dense_branch([hs._rewrite(q["query"])], DEPTH)[0]
+        return [titles(int(r)) for r in hs.store.rows_of(run["id"])]
+
+    def sparse(q: Dict) -> List[List[str]]:
+        rows, _ = hs.bm25.search(tokenize(hs._rewrite(q["query"])), DEPTH)
+        return [titles(int(r)) for r in rows]
+
+    def hybrid(q: Dict) -> List[List[str]]:
+        return doc_titles(hs.search(q["query"], k_dense=DEPTH, k_final=DEPTH)[0])
+
+    def hybrid_lang(q: Dict) -> List[List[str]]:
+        return doc_titles(hs.search(q["query"], k_dense=DEPTH, k_final=DEPTH, filters={"language": q["lang"]})[0])
+
+    return {"faiss": dense, "bm25": sparse, "hybrid": hybrid, "hybrid_lang": hybrid_lang}
+
+def evaluate_quality(hs: HybridSearcher, queries: List[Dict], credit_duplicates: bool = False) -> Dict:
+    titles = set(hs.store.values["title"])
+    labeled = []
+    for q in queries:
+        relevant = set(q["relevant"]) & titles  # variantes de titre absentes de l'index ignorées
+        if relevant:
+            labeled.append((q, relevant))
+    report = {"queries": len(labeled), "skipped": len(queries) - len(labeled), "systems": {}}
+    if not labeled:  # autre corpus que l'index curé : aucun titre annoté présent
+        print(f"⚠️  aucune des {len(queries)} requêtes n'a d'article attendu dans l'index : qualité non mesurée")
+        return report
+
+    for name, run in systems(hs, credit_duplicates).items():
+        per_lang: Dict[str, List[Dict[str, float]]] = {}
+        lat = []
+        for q, relevant in labeled:
+            t = time.perf_counter()
+            ranked = ranked_articles(run(q))
+            lat.append((time.perf_counter() - t) * 1000)
+            per_lang.setdefault(q["lang"], []).append(score_query(ranked, relevant))
+
+        def mean(rows: List[Dict[str, float]]) -> Dict[str, float]:
+            return {k: round(float(np.mean([r[k] for r in rows])), 4) for k in rows[0]}
+
+        everything = [r for rows in per_lang.values() for r in rows]
+        report["systems"][name] = {**mean(everything), **percentiles(lat),
+                                   "by_lang": {lang: mean(rows) for lang, rows in sorted(per_lang.items())}}
+    return report
+
+# ---------- Corpus synthétiques ----------
+def tile_bm25(base: BM25Index, n: int) -> BM25Index:
+    """Postings de n copies du corpus (copie c : lignes + c × n_docs), sans re-tokeniser."""
+    nb = base.n_docs
+    lens = np.diff(base.indptr)
+    offsets = (np.arange(n, dtype=np.int64) * nb)[:, None]
+    doc_ids = np.empty(len(base.doc_ids) * n, dtype=np.int32)
+    tf = np.empty(len(base.tf) * n, dtype=np.float32)
+    for j in range(len(lens)):  # postings triés par ligne : copie par copie
+        a, b = int(base.indptr[j]), int(base.indptr[j + 1])
+        doc_ids[a * n:b * n] = (offsets + np.asarray(base.doc_ids[a:b])).ravel()
+        tf[a * n:b * n] = np.tile(base.tf[a:b], n)
+    return BM25Index(base.terms, np.asarray(base.indptr, dtype=np.int64) * n, doc_ids, tf,
+                     np.tile(base.doc_len, n), okapi_idf(lens * n, nb * n))
+
+def build_synthetic(src: str, dst: str, scale: int, noise: float = NOISE,
+                    index_spec: str = "Flat", seed: int = 0) -> int:
+    """Index `scale` × plus grand que `src` : copies bruitées des vecteurs, chunks et postings répliqués
+    (le texte des articles est partagé), signaux répliqués. Renvoie le nombre de lignes."""
+    store = ChunkStore(src)
+    flat = faiss.read_index(os.path.join(src, INDEX_FILE))
+    xb = flat.reconstruct_n(0, flat.ntotal)
+    rows_hash = faiss_rows_hash([store.rows_hash, f"x{scale}", f"noise={noise}", f"seed={seed}"])
+
+    shutil.rmtree(dst, ignore_errors=True)
+    os.makedirs(os.path.join(dst, STORE_DIR))
+
+    # vecteurs : copie 0 = l'original, les autres bruitées puis renormalisées
+    rng = np.random.default_rng(seed)
+    index = faiss.IndexFlatL2(xb.shape[1])
+    for c in range(scale):
+        x = xb
+        if c:
+            x = xb + rng.normal(0.0, noise, xb.shape).astype(np.float32)
+            x /= np.linalg.norm(x, axis=1, keepdims=True)
+        index.add(x)
+    faiss.write_index(index, os.path.join(dst, INDEX_FILE))
+    if index_spec.lower() != "flat":
+        save_ann(dst, build_ann(index.reconstruct_n(0, index.ntotal), index_spec), index_spec, rows_hash, [])
+
+    # chunk store : mêmes articles (texte partagé), chunks répliqués
+    s_dir, d_dir = os.path.join(src, STORE_DIR), os.path.join(dst, STORE_DIR)
+    shutil.copyfile(os.path.join(s_dir, "texts.bin"), os.path.join(d_dir, "texts.bin"))
+    shutil.copyfile(os.path.join(s_dir, "articles.npy"), os.path.join(d_dir, "articles.npy"))
+    chunks = np.tile(store.chunks, scale)
+    chunks["id"] = np.arange(len(chunks))  # identifiants uniques d'une copie à l'autre
+    np.save(os.path.join(d_dir, "chunks.npy"), chunks)
+    with open(os.path.join(s_dir, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["faiss_rows"] = rows_hash
+    with open(os.path.join(d_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    # BM25 et signaux répliqués
+    bm25 = BM25Index.load(src, store.rows_hash) or BM25Index.from_texts(store.texts())
+    tile_bm25(bm25, scale).save(dst, rows_hash)
+    signals = load_signals(src, len(store), store.rows_hash, DOMAIN_TERMS, BOOST_TERMS)
+    if signals is None:
+        signals = compute_signals((store.document(r) for r in range(len(store))), DOMAIN_TERMS, BOOST_TERMS)
+    save_signals(dst, np.tile(signals, scale), rows_hash, DOMAIN_TERMS, BOOST_TERMS)
+    save_index_meta(dst, rows_hash, index.ntotal)
+    return index.ntotal
+
+def build_deduped(src: str, dst: str, threshold: float = DEDUP_THRESHOLD, index_spec: str = "Flat") -> Dict:
+    """Copie de `src` sans ses chunks quasi dupliqués (même passe que index_open_faiss, dans l'ordre
+    des lignes FAISS) : vecteurs, chunks, BM25 et signaux restreints aux copies canoniques.
+    Renvoie le rapport de NearDupIndex."""
+    store = ChunkStore(src)
+    flat = faiss.read_index(os.path.join(src, INDEX_FILE))
+    dedup = NearDupIndex(threshold)
+    keep, dups = [], []
+    for r in range(len(store)):
+        c = store.chunks[r]
+        canonical = dedup.add(str(int(c["id"])), store.text(r), store.metadata(r)["language"])
+        if canonical is None:
+            keep.append(r)
+        else:
+            dups.append((c["id"], int(canonical), c["article"], c["start"], c["end"]))
+    keep = np.asarray(keep, dtype=np.int64)
+    rows_hash = faiss_rows_hash([store.rows_hash, f"dedup={threshold}"])
+
+    shutil.rmtree(dst, ignore_errors=True)
+    os.makedirs(os.path.join(dst, STORE_DIR))
+    index = faiss.IndexFlatL2(flat.d)
+    index.add(flat.reconstruct_n(0, flat.ntotal)[keep])
+    faiss.write_index(index, os.path.join(dst, INDEX_FILE))
+    if index_spec.lower() != "flat":
+        save_ann(dst, build_ann(index.reconstruct_n(0, index.ntotal), index_spec), index_spec, rows_hash, [])
+
+    s_dir, d_dir = os.path.join(src, STORE_DIR), os.path.join(dst, STORE_DIR)
+    shutil.copyfile(os.path.join(s_dir, "texts.bin"), os.path.join(d_dir, "texts.bin"))
+    shutil.copyfile(os.path.join(s_dir, "articles.npy"), os.path.join(d_dir, "articles.npy"))
+    np.save(os.path.join(d_dir, "chunks.npy"), store.chunks[keep])
+    dups = np.concatenate([store.dups, np.array(dups, dtype=DUP_DTYPE)])
+    np.save(os.path.join(d_dir, "dups.npy"), dups[np.argsort(dups["canonical"], kind="stable")])
+    with open(os.path.join(s_dir, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["faiss_rows"] = rows_hash
+    with open(os.path.join(d_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    BM25Index.from_texts(store.texts(keep.tolist())).save(dst, rows_hash)
+    signals = load_signals(src, len(store), store.rows_hash, DOMAIN_TERMS, BOOST_TERMS)
+    if signals is None:
+        signals = compute_signals((store.document(r) for r in range(len(store))), DOMAIN_TERMS, BOOST_TERMS)
+    save_signals(dst, signals[keep], rows_hash, DOMAIN_TERMS, BOOST_TERMS)
+    save_index_meta(dst, rows_hash, index.ntotal)
+    return {**dedup.report(), "vector_bytes_saved": (flat.ntotal - len(keep)) * flat.d * 4}
+
+def bench_speed(hs: HybridSearcher, queries: List[str], repeat: int = REPEAT, batch: int = BATCH) -> Dict:
+    for q in queries:  # chauffe (modèle, pages mmap)
+        hs.search(q)
+    lat = []
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for q in queries:
+            t = time.perf_counter()
+            hs.search(q)
+            lat.append((time.perf_counter() - t) * 1000)
+    seq = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for i in range(0, len(queries), batch):
+            hs.search_many(queries[i:i + batch])
+    batched = time.perf_counter() - t0
+
+    stages = hs.metrics.to_dict()["latency_seconds"]
+    return {
+        "qps": round(len(lat) / seq, 2),
+        "batch_qps": round(len(lat) / batched, 2),
+        **percentiles(lat),
+        "stages_p50_ms": {k: round(v["p50"] * 1000, 3) for k, v in sorted(stages.items())},
+    }
+
+def cold_start(index_dir: str, model: str, backend: str, query: str, runs: int = COLD_RUNS) -> Dict:
+    """Médianes (s) sur `runs` processus neufs ; process_s inclut le démarrage de l'interpréteur.
+    Le cache disque de l'OS reste chaud d'un run à l'autre (comme un réplica relancé)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", COLD_START, os.path.abspath(index_dir), model, backend, query],
+                             cwd=here, capture_output=True, text=True, check=True).stdout
+        sample = json.loads(out.strip().splitlines()[-1])
+        sample["process_s"] = time.perf_counter() - t
+        samples.append(sample)
+    return {"runs": runs, "snapshot": os.path.isdir(os.path.join(index_dir, SNAPSHOT_DIR)),
+            **{k: round(float(np.median([s[k] for s in samples])), 3) for k in samples[0]}}
+
+def searcher(index_dir: str, model: str, backend: str = EMBED_BACKEND,
+             onnx_dir: Optional[str] = None, fusion: str = FUSION_MODE) -> HybridSearcher:
+    # pas de cache ni de budget de latence : chaque requête passe par tout le pipeline
+    return HybridSearcher(cache_size=0, dense_timeout=None, sparse_timeout=None, metrics=Metrics(),
+                          index_dir=index_dir, embed_model=model, embed_backend=backend, onnx_dir=onnx_dir,
+                          fusion=fusion)
+
+# ---------- Rapport ----------
+def environment(model: str, backend: str, fusion: str, index_dir: str) -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"model": model, "backend": backend, "fusion": fusion, "index_dir": index_dir, "commit": commit,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "faiss": faiss.__version__, "numpy": np.__version__, "cpus": os.cpu_count(),
+            "machine": platform.machine()}
+
+def print_quality(report: Dict) -> None:
+    if not report["systems"]:
+        return
+    cols = [f"recall@{k}" for k in KS] + ["mrr", f"ndcg@{NDCG_K}", "p50_ms"]
+    print(f"\nQualité — {report['queries']} requêtes ({report['skipped']} sans article attendu dans l'index)")
+    print(f"{'système':<12}" + "".join(f"{c:>11}" for c in cols))
+    for name, r in report["systems"].items():
+        print(f"{name:<12}" + "".join(f"{r[c]:>11.3f}" for c in cols))
+
+def print_dedup(r: Dict) -> None:
+    print(f"\nDéduplication (Jaccard ≥ {r['threshold']}) : {r['chunks']} → {r['kept']} lignes "
+          f"(-{r['shrink']:.1%}, {r['vector_bytes_saved'] / 2**20:.1f} Mio de vecteurs en moins)")
+    if not r["before"]["systems"]:
+        return
+    print("avant → après (strict) [après, doublons crédités]")
+    cols = [f"recall@{k}" for k in KS] + ["mrr"]
+    print(f"{'système':<12}" + "".join(f"{c:>27}" for c in cols))
+    for name, before in r["before"]["systems"].items():
+        after, credited = r["after"]["systems"][name], r["after_credited"]["systems"][name]
+        print(f"{name:<12}" + "".join(f"{before[c]:>8.3f} → {after[c]:.3f} [{credited[c]:.3f}]" for c in cols))
+
+def print_cold_start(r: Dict) -> None:
+    print(f"\nDémarrage à froid (médiane de {r['runs']}, snapshot {'oui' if r['snapshot'] else 'non'}) : "
+          f"import {r['import_s']:.2f}s · chargement {r['load_s']:.2f}s · chauffe {r['warmup_s']:.2f}s · "
+          f"prêt {r['ready_s']:.2f}s · 1re requête {r['first_query_s'] * 1000:.0f} ms · processus {r['process_s']:.2f}s")
+
+def print_speed(rows: List[Dict]) -> None:
+    print(f"\nVitesse\n{'échelle':<9}{'lignes':>10}{'req/s':>9}{'lot req/s':>11}{'p50 ms':>9}{'p99 ms':>9}")
+    for r in rows:
+        print(f"{r['scale']:<9}{r['rows']:>10}{r['qps']:>9.1f}{r['batch_qps']:>11.1f}"
+              f"{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark qualité / vitesse de la recherche.")
+    ap.add_argument("--index-dir", default=INDEX_DIR)
+    ap.add_argument("--model", default=EMBED_MODEL, help="modèle d'embedding (celui de l'index ; local)")
+    ap.add_argument("--backend", default=EMBED_BACKEND, choices=BACKENDS, help="encodeur des requêtes")
+    ap.add_argument("--fusion", default=FUSION_MODE, choices=FUSION_MODES, help="mode de fusion dense + BM25")
+    ap.add_argument("--queries", default=QUERIES_FILE)
+    ap.add_argument("--scales", default=",".join(map(str, SCALES)), help="ex. 10,100,1000 ('' = aucune)")
+    ap.add_argument("--index-spec", default="Flat", help="index FAISS des corpus synthétiques (cf. ann_index)")
+    ap.add_argument("--noise", type=float, default=NOISE)
+    ap.add_argument("--repeat", type=int, default=REPEAT)
+    ap.add_argument("--work-dir", default=WORK_DIR)
+    ap.add_argument("--keep-work", action="store_true", help="garde les corpus synthétiques")
+    ap.add_argument("--skip-quality", action="store_true")
+    ap.add_argument("--dedup", type=float, nargs="?", const=DEDUP_THRESHOLD,
+                    help="compare la qualité avant / après retrait des quasi-doublons (seuil Jaccard ; "
+                         "index source construit avec --no-dedup)")
+    ap.add_argument("--cold-runs", type=int, default=COLD_RUNS, help="0 = pas de mesure du démarrage à froid")
+    ap.add_argument("--out", help="fichier JSON des résultats (sinon stdout)")
+    args = ap.parse_args()
+    if args.dedup is not None and len(ChunkStore(args.index_dir).dups):
+        ap.error(f"--dedup : {args.index_dir} est déjà dédupliqué (avant = après) ; "
+                 "le reconstruire avec index_open_faiss.py --no-dedup --full")
+
+    queries = load_queries(args.queries)
+    results: Dict = {"env": environment(args.model, args.backend, args.fusion, args.index_dir)}
+
+    if args.cold_runs:
+        results["cold_start"] = cold_start(args.index_dir, args.model, args.backend, queries[0]["query"],
+                                           args.cold_runs)
+        print_cold_start(results["cold_start"])
+
+    onnx_dir = os.path.join(args.index_dir, ONNX_DIR)  # export partagé avec les corpus synthétiques
+    hs = searcher(args.index_dir, args.model, args.backend, onnx_dir, args.fusion)
+    results["env"]["rows"] = len(hs.store)
+    if not args.skip_quality:
+        results["quality"] = evaluate_quality(hs, queries)
+        print_quality(results["quality"])
+    if args.dedup is not None:
+        dst = os.path.join(args.work_dir, "dedup")
+        dedup = build_deduped(args.index_dir, dst, args.dedup)
+        hs_dedup = searcher(dst, args.model, args.backend, onnx_dir, args.fusion)
+        dedup["before"] = results.get("quality") or evaluate_quality(hs, queries)
+        dedup["after"] = evaluate_quality(hs_dedup, queries)
+        dedup["after_credited"] = evaluate_quality(hs_dedup, queries, credit_duplicates=True)
+        hs_dedup.close()
+        if not args.keep_work:
+            shutil.rmtree(dst, ignore_errors=True)
+        results["dedup"] = dedup
+        print_dedup(dedup)
+
+    texts = [q["query"] for q in queries]
+    speed = [{"scale": 1, "rows": len(hs.store), **bench_speed(hs, texts, args.repeat)}]
+    hs.close()
+    for scale in [int(s) for s in args.scales.split(",") if s.strip()]:
+        dst = os.path.join(args.work_dir, f"x{scale}")
+        t = time.perf_counter()
+        rows = build_synthetic(args.index_dir, dst, scale, args.noise, args.index_spec)
+        print(f"→ corpus ×{scale} : {rows} lignes ({time.perf_counter() - t:.1f}s)")
+        hs = searcher(dst, args.model, args.backend, onnx_dir, args.fusion)
+        speed.append({"scale": scale, "rows": rows, "index_spec": args.index_spec,
+                      **bench_speed(hs, texts, args.repeat)})
+        hs.close()
+        if not args.keep_work:
+            shutil.rmtree(dst, ignore_errors=True)
+    results["speed"] = speed
+    print_speed(speed)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\n✅ Résultats → {args.out}")
+    else:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
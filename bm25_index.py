@@ -0,0 +1,196 @@
+# bm25_index.py — Index lexical BM25 persistant (postings CSR) à côté de l'index FAISS
+# Écrit par index_open_faiss.py, chargé en mmap par hybrid_search.py (plus de BM25 reconstruit au démarrage).
+# Compatible Python 3.9
+
+from typing import Dict, Iterable, List, Optional, Tuple
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+BM25_DIR = "bm25"      # sous-dossier de INDEX_DIR
+BM25_VERSION = 1
+FLUSH_DOCS = 10_000    # docs entre deux conversions des postings en tableaux NumPy (construction)
+
+# Mêmes paramètres que rank_bm25.BM25Okapi (utilisé auparavant via BM25Retriever)
+K1, B, EPSILON = 1.5, 0.75, 0.25
+
+def tokenize(text: str) -> List[str]:
+    """Tokenisation partagée index / requête (= default_preprocessing_func de BM25Retriever)."""
+    return text.split()
+
+def faiss_rows_hash(row_ids: Iterable[str]) -> str:
+    """Empreinte de l'ordre des lignes FAISS (identifiant de chaque ligne) : lie BM25 à son index."""
+    h = hashlib.sha1()
+    for doc_id in row_ids:
+        h.update(doc_id.encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+class BM25Index:
+    """Postings terme → (doc, tf) au format CSR + longueurs de docs + IDF (docs = lignes FAISS)."""
+
+    def __init__(self, terms: List[str], indptr: np.ndarray, doc_ids: np.ndarray,
+                 tf: np.ndarray, doc_len: np.ndarray, idf: np.ndarray):
+        self.terms = terms
+        self.vocab: Dict[str, int] = {t: j for j, t in enumerate(terms)}
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tf = tf
+        self.doc_len = doc_len
+        self.idf = idf
+        self.n_docs = len(doc_len)
+        self.avgdl = float(doc_len.sum()) / self.n_docs if self.n_docs else 0.0
+        # normalisation de longueur K1 * (1 - B + B * dl / avgdl), une valeur par doc ;
+        # docs tous vides (avgdl = 0) : dl = 0 partout, le rapport vaut 0 quel que soit le diviseur
+        self._norm = K1 * (1 - B + B * np.asarray(doc_len, dtype=np.float64) / (self.avgdl or 1.0)) \
+            if self.n_docs else np.zeros(0)
+
+    # ---------- Construction ----------
+    @classmethod
+    def from_texts(cls, texts: Iterable[str]) -> "BM25Index":
+        """Postings accumulés par blocs de FLUSH_DOCS docs en tableaux compacts (int32 / float32),
+        pas en listes Python : la mémoire reste proche de la taille de l'index final."""
+        vocab: Dict[str, int] = {}
+        rows, cols, vals, doc_len = [], [], [], []
+        blocks: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+
+        def flush() -> None:
+            blocks.append((np.array(rows, dtype=np.int32), np.array(cols, dtype=np.int32),
+                           np.array(vals, dtype=np.float32)))
+            for buf in (rows, cols, vals):
+                buf.clear()
+
+        for d, text in enumerate(texts):
+            freqs: Dict[str, int] = {}
+            toks = tokenize(text)
+            for t in toks:
+                freqs[t] = freqs.get(t, 0) + 1
+            for t, tf in freqs.items():
+                rows.append(vocab.setdefault(t, len(vocab)))
+                cols.append(d)
+                vals.append(tf)
+            doc_len.append(len(toks))
+            if (d + 1) % FLUSH_DOCS == 0:
+                flush()
+        flush()
+        n_docs = len(doc_len)
+        r, c, v = (np.concatenate(parts) for parts in zip(*blocks))
+        blocks.clear()
+        post = csr_matrix((v, (r, c)), shape=(len(vocab), n_docs))
+        post.sort_indices()
+
+        return cls(list(vocab), post.indptr.astype(np.int64), post.indices.astype(np.int32),
+                   post.data.astype(np.float32), np.array(doc_len, dtype=np.int32),
+                   okapi_idf(np.diff(post.indptr), n_docs))
+
+    # ---------- Persistance ----------
+    def save(self, index_dir: str, rows_hash: str) -> None:
+        """rows_hash : faiss_rows_hash() de l'index FAISS auquel ces postings correspondent.
+        Chaque fichier est écrit à côté puis remplacé (un processus qui a mmappé l'ancien le garde
+        intact) ; meta.json, qui porte l'empreinte, en dernier."""
+        out = os.path.join(index_dir, BM25_DIR)
+        os.makedirs(out, exist_ok=True)
+        for name in ("indptr", "doc_ids", "tf", "doc_len", "idf"):
+            path = os.path.join(out, f"{name}.npy")
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, getattr(self, name))
+            os.replace(path + ".tmp", path)
+        for name, obj in (("vocab.json", self.terms),
+                          ("meta.json", {
+                              "version": BM25_VERSION,
+                              "faiss_rows": rows_hash,
+                              "n_docs": self.n_docs,
+                              "n_terms": len(self.terms),
+                              "k1": K1, "b": B, "epsilon": EPSILON,
+                          })):
+            path = os.path.join(out, name)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(obj, f, ensure_ascii=False)
+            os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, index_dir: str, rows_hash: str) -> Optional["BM25Index"]:
+        """Charge les postings en mmap ; None si absents, d'une autre version ou d'un autre index."""
+        src = os.path.join(index_dir, BM25_DIR)
+        try:
+            with open(os.path.join(src, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            if (meta.get("version") != BM25_VERSION
+                    or meta.get("faiss_rows") != rows_hash):
+                return None
+            with open(os.path.join(src, "vocab.json"), encoding="utf-8") as f:
+                terms = json.load(f)
+            arrays = {name: np.load(os.path.join(src, f"{name}.npy"), mmap_mode="r")
+                      for name in ("indptr", "doc_ids", "tf", "doc_len", "idf")}
+        except (OSError, ValueError):
+            return None
+        # fichiers de deux écritures différentes (lecture pendant une sauvegarde) : tailles incohérentes
+        if (len(terms) != meta.get("n_terms") or len(arrays["doc_len"]) != meta.get("n_docs")
+                or len(arrays["indptr"]) != len(terms) + 1 or len(arrays["idf"]) != len(terms)):
+            return None
+        return cls(terms, **arrays)
+
+    # ---------- Scoring ----------
+    def score_many(self, queries: List[List[str]]) -> csr_matrix:
+        """Scores BM25 d'un lot (requêtes × docs, creux) : seuls les postings des termes des requêtes sont lus.
+
+        Les entrées non nulles d'une ligne sont les docs candidats (au moins un terme en commun).
+        """
+        cols: Dict[int, int] = {}  # terme du vocabulaire → colonne locale au lot
+        q_rows, q_cols = [], []
+        for r, toks in enumerate(queries):
+            for t in toks:
+                j = self.vocab.get(t)
+                if j is not None:
+                    q_rows.append(r)
+                    q_cols.append(cols.setdefault(j, len(cols)))
+        terms = np.fromiter(cols, dtype=np.int64, count=len(cols))
+
+        starts, ends = self.indptr[terms], self.indptr[terms + 1]
+        lens = ends - starts
+        sel = np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)] or [np.zeros(0, np.int64)])
+        docs = np.asarray(self.doc_ids[sel])
+        tf = np.asarray(self.tf[sel], dtype=np.float64)
+        w = np.repeat(self.idf[terms], lens) * (tf * (K1 + 1) / (tf + self._norm[docs]))
+        postings = csr_matrix((w, docs, np.concatenate(([0], np.cumsum(lens)))),
+                              shape=(len(terms), self.n_docs))
+
+        Q = csr_matrix((np.ones(len(q_rows)), (q_rows, q_cols)), shape=(len(queries), len(terms)))
+        return (Q @ postings).tocsr()
+
+    def search_many(self, queries: List[List[str]], k: int,
+                    allowed: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Top-k (lignes, scores) par requête tokenisée, scores décroissants.
+        `allowed` : masque booléen des lignes admises (filtre de métadonnées), appliqué avant le top-k."""
+        S = self.score_many(queries)
+        out = []
+        for i in range(S.shape[0]):
+            rows, scores = S.indices[S.indptr[i]:S.indptr[i + 1]], S.data[S.indptr[i]:S.indptr[i + 1]]
+            if allowed is not None:
+                keep = allowed[rows]
+                rows, scores = rows[keep], scores[keep]
+            out.append(top_k(rows, scores, k))
+        return out
+
+    def search(self, tokens: List[str], k: int,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return self.search_many([tokens], k, allowed)[0]
+
+def okapi_idf(df: np.ndarray, n_docs: int) -> np.ndarray:
+    """IDF Okapi avec plancher epsilon * idf moyen (comme rank_bm25) ; df = docs par terme."""
+    idf = [math.log(n_docs - n + 0.5) - math.log(n + 0.5) for n in np.asarray(df).tolist()]
+    floor = EPSILON * (sum(idf) / len(idf)) if idf else 0.0
+    return np.array([x if x >= 0 else floor for x in idf], dtype=np.float64)
+
+def top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Sélection partielle (argpartition) puis tri ; ex aequo départagés par ligne croissante."""
+    if len(rows) > k > 0:
+        kth = scores[np.argpartition(-scores, k - 1)[:k]].min()
+        keep = np.flatnonzero(scores >= kth)  # garde tous les ex aequo de la frontière
+        rows, scores = rows[keep], scores[keep]
+    order = np.lexsort((rows, -scores))[:max(k, 0)]
+    return rows[order], scores[order]
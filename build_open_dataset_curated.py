@@ -1,8 +1,12 @@
 # build_open_dataset_curated.py — Wikipédia FR/EN must-have (strict mais pragmatique)
+# Pages récupérées par wiki_fetch (EN et FR en parallèle, cache disque par révision, --offline).
 from typing import List, Dict, Optional
-import wikipediaapi
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datasets import Dataset, DatasetDict, Features, Value, Sequence
 
+from wiki_fetch import RATE_PER_HOST, WIKI_API, WIKI_CACHE, WORKERS, Page, WikiFetcher
+
 HF_USER = "lmhdii"
 DS_NAME = f"{HF_USER}/experiment-brief-open"
 
@@ -80,42 +84,32 @@ def relevant(title: str, text: str, lang: str) -> bool:
     x = (text or "").lower()
     keys = KEYS_EN if lang == "en" else KEYS_FR
     return any(k in t or k in x for k in keys)
-def fetch_best(wiki, lang, candidates):
+def to_row(lang: str, p: Page) -> Dict:
+    return {
+        "id": f"wiki::{lang}::{p.title}",
+        "source_type": "wiki",
+        "title": p.title,
+        "url": p.url,
+        "language": lang,
+        "year": "",
+        "topics": [],
+        "text": p.text or "",
+    }
+
+def fetch_best(pages: Dict[str, Optional[Page]], lang: str, candidates: List[str]) -> Optional[Dict]:
+    """Choisit parmi les pages déjà récupérées (aucune requête ici)."""
+    found = [p for p in (pages.get(t) for t in candidates) if p is not None and (p.text or "").strip()]
     # 1) essai strict + garde-fou
-    for title in candidates:
-        p = wiki.page(title)
-        if p.exists() and (p.text or "").strip() and relevant(p.title, p.text, lang):
-            return {
-                "id": f"wiki::{lang}::{p.title}",
-                "source_type": "wiki",
-                "title": p.title,
-                "url": p.fullurl,
-                "language": lang,
-                "year": "",
-                "topics": [],
-                "text": p.text or "",
-            }
+    for p in found:
+        if relevant(p.title, p.text, lang):
+            return to_row(lang, p)
     # 2) fallback "force include" si la page existe mais le garde-fou est trop strict
-    for title in candidates:
-        p = wiki.page(title)
-        if p.exists() and (p.text or "").strip():
-            return {
-                "id": f"wiki::{lang}::{p.title}",
-                "source_type": "wiki",
-                "title": p.title,
-                "url": p.fullurl,
-                "language": lang,
-                "year": "",
-                "topics": [],
-                "text": p.text or "",
-            }
-    return None
+    return to_row(lang, found[0]) if found else None
 
-def collect(lang: str, topics: Dict[str,List[str]]) -> List[Dict]:
-    wiki = wikipediaapi.Wikipedia(language=lang, user_agent="experiment-brief-assistant/0.4")
+def collect(lang: str, topics: Dict[str,List[str]], pages: Dict[str, Optional[Page]]) -> List[Dict]:
     out, seen = [], set()
     for _, cand in topics.items():
-        row = fetch_best(wiki, lang, cand)
+        row = fetch_best(pages, lang, cand)
         if row and row["title"] not in seen:
             out.append(row); seen.add(row["title"])
             print(f"✓ [{lang}] {row['title']}")
@@ -123,17 +117,39 @@ def collect(lang: str, topics: Dict[str,List[str]]) -> List[Dict]:
             print(f"⚠️  missing: [{lang}] {cand}")
     return out
 
+def prefetch(fetcher: WikiFetcher,
+             langs: Dict[str, Dict[str, List[str]]]) -> Dict[str, Dict[str, Optional[Page]]]:
+    """Tous les candidats de toutes les langues, chaque titre une seule fois, langues en parallèle."""
+    with ThreadPoolExecutor(len(langs)) as ex:
+        futs = {lang: ex.submit(fetcher.fetch_many, lang, [t for c in topics.values() for t in c])
+                for lang, topics in langs.items()}
+        return {lang: f.result() for lang, f in futs.items()}
+
 if __name__ == "__main__":
-    print("→ Fetch curated EN (patched)…")
-    en_rows = collect("en", CANDIDATES_EN)
-    print("→ Fetch curated FR (patched)…")
-    fr_rows = collect("fr", CANDIDATES_FR)
+    ap = argparse.ArgumentParser(description="Construit et publie le dataset Wikipédia FR/EN curé.")
+    ap.add_argument("--offline", action="store_true", help="rejoue uniquement depuis le cache (aucun réseau)")
+    ap.add_argument("--cache", default=WIKI_CACHE, help="cache disque des pages (SQLite)")
+    ap.add_argument("--api", default=WIKI_API, help="gabarit d'URL de l'API MediaWiki ({lang})")
+    ap.add_argument("--workers", type=int, default=WORKERS, help="requêtes HTTP simultanées")
+    ap.add_argument("--rate", type=float, default=RATE_PER_HOST, help="requêtes / s max. par hôte")
+    ap.add_argument("--no-push", action="store_true", help="ne publie pas sur le Hub")
+    args = ap.parse_args()
+
+    print("→ Fetch curated EN + FR (patched)…")
+    with WikiFetcher(args.cache, args.api, args.workers, args.rate, args.offline) as fetcher:
+        pages = prefetch(fetcher, {"en": CANDIDATES_EN, "fr": CANDIDATES_FR})
+        print(f"  {dict(fetcher.stats)}")
+    en_rows = collect("en", CANDIDATES_EN, pages["en"])
+    fr_rows = collect("fr", CANDIDATES_FR, pages["fr"])
 
     wiki_en = Dataset.from_list(en_rows, features=FEATURES)
     wiki_fr = Dataset.from_list(fr_rows, features=FEATURES)
     dsd = DatasetDict({"wiki_en": wiki_en, "wiki_fr": wiki_fr})
     print({k: len(v) for k, v in dsd.items()})
 
-    print(f"→ Push to Hub: {DS_NAME}")
-    dsd.push_to_hub(DS_NAME, private=False)
-    print("✅ Dataset publié (curated patched).")
+    if args.no_push:
+        print("⏭️  --no-push : dataset non publié.")
+    else:
+        print(f"→ Push to Hub: {DS_NAME}")
+        dsd.push_to_hub(DS_NAME, private=False)
+        print("✅ Dataset publié (curated patched).")
@@ -0,0 +1,201 @@
+# chunk_store.py — Stockage colonnaire des chunks (texte par article + offsets), lu en mmap
+# Remplace le docstore pickle de LangChain côté recherche : seuls les top-k deviennent des Document.
+# Chaque chunk porte un identifiant entier stable (dérivé de son identifiant docstore à l'indexation) :
+# il ne change pas d'une mise à jour incrémentale à l'autre, contrairement au numéro de ligne FAISS.
+# Les quasi-doublons écartés à l'indexation (near_dup.py) y sont gardés comme renvois vers leur copie
+# canonique (dups.npy) : le texte de leur article reste dans le store et peut être cité.
+# Compatible Python 3.9
+
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+import hashlib
+import json
+import mmap
+import os
+
+import numpy as np
+from langchain_core.documents import Document
+
+STORE_DIR = "chunks"  # sous-dossier de INDEX_DIR
+STORE_VERSION = 2  # v2 : identifiants entiers stables
+
+META_FIELDS = ["id", "title", "url", "language", "source_type", "split"]
+PARTITION_FIELDS = ("language", "split", "source_type")  # filtres de recherche (cf. rows_where)
+
+ARTICLE_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4")] + [(f, "<u4") for f in META_FIELDS])
+CHUNK_DTYPE = np.dtype([("id", "<i8"), ("article", "<u4"), ("start", "<u4"), ("end", "<u4")])
+DUP_DTYPE = np.dtype([("id", "<i8"), ("canonical", "<i8"), ("article", "<u4"), ("start", "<u4"), ("end", "<u4")])
+
+def stable_id(chunk_id: str) -> int:
+    """Identifiant entier (63 bits, positif) d'un chunk, déterminé par son identifiant docstore."""
+    return int.from_bytes(hashlib.blake2b(chunk_id.encode("utf-8"), digest_size=8).digest(), "big") >> 1
+
+class ChunkRecord:
+    """Position d'un chunk : article + offsets UTF-8 (octets) dans le texte de l'article."""
+    __slots__ = ("article", "start", "end")
+
+    def __init__(self, article: int, start: int, end: int):
+        self.article = article
+        self.start = start
+        self.end = end
+
+def _replace_npy(path: str, arr: np.ndarray) -> None:
+    # écriture atomique : un lecteur qui a mmappé l'ancien fichier le garde intact
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, arr)
+    os.replace(path + ".tmp", path)
+
+# ---------- Écriture (index_open_faiss.py) ----------
+class ChunkStoreWriter:
+    """Ajoute les articles au fil du flux, puis écrit les chunks dans l'ordre des lignes FAISS."""
+
+    def __init__(self, index_dir: str):
+        self.dir = os.path.join(index_dir, STORE_DIR)
+        os.makedirs(self.dir, exist_ok=True)
+        self._blob = open(os.path.join(self.dir, "texts.bin.tmp"), "wb")
+        self._offset = 0
+        self._articles: List[tuple] = []
+        self._values: Dict[str, Dict[str, int]] = {f: {} for f in META_FIELDS}  # valeurs internées
+        self._spans: Dict[str, ChunkRecord] = {}
+        self._dups: Dict[str, str] = {}  # quasi-doublon écarté → copie canonique (identifiants docstore)
+
+    def add_article(self, meta: Dict, text: str) -> int:
+        data = text.encode("utf-8")
+        self._blob.write(data)
+        codes = [self._values[f].setdefault(str(meta.get(f, "")), len(self._values[f]))
+                 for f in META_FIELDS]
+        self._articles.append((self._offset, len(data), *codes))
+        self._offset += len(data)
+        return len(self._articles) - 1
+
+    def add_chunk(self, chunk_id: str, article: int, start: int, end: int) -> None:
+        self._spans[chunk_id] = ChunkRecord(article, start, end)
+
+    def add_duplicate(self, chunk_id: str, canonical: str) -> None:
+        """`chunk_id` (déjà passé par add_chunk) n'est pas indexé : il renvoie à `canonical`."""
+        self._dups[chunk_id] = canonical
+
+    def close(self, row_ids: Sequence[int], rows_hash: str) -> None:
+        """row_ids : identifiants stables (stable_id) dans l'ordre des lignes FAISS."""
+        self._blob.close()
+        spans = {stable_id(i): r for i, r in self._spans.items()}
+        if len(spans) != len(self._spans):
+            raise ValueError("collision d'identifiants de chunks")
+        chunks = np.array([(i, r.article, r.start, r.end) for i in row_ids for r in (spans[i],)],
+                          dtype=CHUNK_DTYPE)
+        dups = np.array([(stable_id(d), stable_id(c), r.article, r.start, r.end)
+                         for d, c in self._dups.items() for r in (self._spans[d],)], dtype=DUP_DTYPE)
+        dups = dups[np.argsort(dups["canonical"], kind="stable")]
+        _replace_npy(os.path.join(self.dir, "chunks.npy"), chunks)
+        _replace_npy(os.path.join(self.dir, "dups.npy"), dups)
+        _replace_npy(os.path.join(self.dir, "articles.npy"), np.array(self._articles, dtype=ARTICLE_DTYPE))
+        with open(os.path.join(self.dir, "meta.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump({
+                "version": STORE_VERSION,
+                "faiss_rows": rows_hash,
+                "fields": META_FIELDS,
+                "values": {f: list(v) for f, v in self._values.items()},
+            }, f, ensure_ascii=False)
+        os.replace(os.path.join(self.dir, "texts.bin.tmp"), os.path.join(self.dir, "texts.bin"))
+        os.replace(os.path.join(self.dir, "meta.json.tmp"), os.path.join(self.dir, "meta.json"))
+
+# ---------- Lecture (hybrid_search.py) ----------
+class ChunkStore:
+    """Accès aux chunks par ligne FAISS ; textes et tables lus en mmap, métadonnées internées."""
+
+    def __init__(self, index_dir: str):
+        src = os.path.join(index_dir, STORE_DIR)
+        with open(os.path.join(src, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"chunk store v{meta.get('version')} non supporté (relancer index_open_faiss.py)")
+        self.rows_hash: str = meta["faiss_rows"]
+        self.values: Dict[str, List[str]] = meta["values"]
+        self.chunks = np.load(os.path.join(src, "chunks.npy"), mmap_mode="r")
+        self.articles = np.load(os.path.join(src, "articles.npy"), mmap_mode="r")
+        dups = os.path.join(src, "dups.npy")  # absent des stores construits sans déduplication
+        self.dups = np.load(dups) if os.path.exists(dups) else np.zeros(0, dtype=DUP_DTYPE)
+        with open(os.path.join(src, "texts.bin"), "rb") as f:
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        self._row_codes: Dict[str, np.ndarray] = {}
+        self._by_id: Optional[np.ndarray] = None  # lignes triées par identifiant (rows_of)
+        self._sorted_ids: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Identifiant stable de chaque ligne."""
+        return self.chunks["id"]
+
+    def rows_of(self, ids: np.ndarray) -> np.ndarray:
+        """Lignes des identifiants `ids` (tous présents dans le store)."""
+        if self._by_id is None:
+            by_id = np.argsort(self.ids, kind="stable")
+            self._sorted_ids, self._by_id = np.asarray(self.ids[by_id]), by_id
+        return self._by_id[np.searchsorted(self._sorted_ids, ids)]
+
+    def record(self, row: int) -> ChunkRecord:
+        c = self.chunks[row]
+        return ChunkRecord(int(c["article"]), int(c["start"]), int(c["end"]))
+
+    def article_text(self, article: int, start: int = 0, end: Optional[int] = None) -> str:
+        a = self.articles[article]
+        off = int(a["offset"])
+        end = int(a["length"]) if end is None else end
+        return self._blob[off + start:off + end].decode("utf-8")
+
+    def text(self, row: int) -> str:
+        r = self.record(row)
+        return self.article_text(r.article, r.start, r.end)
+
+    def texts(self, rows: Optional[Iterable[int]] = None) -> Iterable[str]:
+        return (self.text(i) for i in (range(len(self)) if rows is None else rows))
+
+    def _article_meta(self, article: int) -> Dict:
+        a = self.articles[article]
+        return {f: self.values[f][int(a[f])] for f in META_FIELDS}
+
+    def metadata(self, row: int) -> Dict:
+        return self._article_meta(int(self.chunks[row]["article"]))
+
+    def duplicates(self, row: int) -> List[Dict]:
+        """Quasi-doublons de la ligne écartés à l'indexation : métadonnées de leur article + offsets."""
+        if not len(self.dups):
+            return []
+        cid = int(self.chunks[row]["id"])
+        a, b = np.searchsorted(self.dups["canonical"], [cid, cid + 1])
+        out = []
+        for d in self.dups[a:b]:
+            meta = self._article_meta(int(d["article"]))
+            meta.update(chunk_id=int(d["id"]), start=int(d["start"]), end=int(d["end"]))
+            out.append(meta)
+        return out
+
+    def row_codes(self, field: str) -> np.ndarray:
+        """Code interné de `field` pour chaque ligne (calculé une fois par champ)."""
+        codes = self._row_codes.get(field)
+        if codes is None:
+            codes = self._row_codes[field] = np.asarray(self.articles[field])[self.chunks["article"]]
+        return codes
+
+    def rows_where(self, filters: Dict[str, Union[str, Sequence[str]]]) -> np.ndarray:
+        """Masque booléen des lignes dont chaque champ filtré vaut l'une des valeurs demandées."""
+        mask = np.ones(len(self), dtype=bool)
+        for field, wanted in filters.items():
+            if field not in PARTITION_FIELDS:
+                raise ValueError(f"filtre inconnu : {field} ({', '.join(PARTITION_FIELDS)})")
+            wanted = [wanted] if isinstance(wanted, str) else wanted
+            codes = [i for i, v in enumerate(self.values[field]) if v in wanted]
+            mask &= np.isin(self.row_codes(field), codes)
+        return mask
+
+    def document(self, row: int) -> Document:
+        """Matérialise un chunk en Document LangChain (à réserver aux résultats finaux)."""
+        r = self.record(row)
+        meta = self.metadata(row)
+        meta.update(row=int(row), chunk_id=int(self.chunks[row]["id"]), start=r.start, end=r.end)
+        dups = self.duplicates(row)
+        if dups:  # autres articles où ce passage figure (citables)
+            meta["duplicates"] = [{"title": d["title"], "url": d["url"]} for d in dups]
+        return Document(page_content=self.article_text(r.article, r.start, r.end), metadata=meta)
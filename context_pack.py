@@ -0,0 +1,171 @@
+# context_pack.py — Assemblage du contexte envoyé au LLM sous budget de tokens
+# Les chunks (900 caractères, 150 de recouvrement, cf. index_open_faiss.chunk_spans) d'un même
+# article se recouvrent : collés tels quels, le texte commun est payé deux fois. Ici :
+# 1. regroupement par article, fusion des spans qui se recouvrent ou se touchent (offsets du chunk store)
+# 2. suppression des phrases quasi dupliquées (déjà vues plus haut dans le classement)
+# 3. remplissage dans l'ordre du classement jusqu'au budget (dernier passage coupé à la phrase ; le
+#    premier est toujours gardé, tronqué au budget si sa première phrase ne tient pas)
+# Chaque passage garde son numéro [n], son titre et son URL : le LLM cite [n], l'UI affiche les mêmes.
+# Compatible Python 3.9
+
+from typing import Dict, List, Optional, Sequence, Tuple
+import os
+import re
+
+from langchain_core.documents import Document
+
+from answer_cache import estimate_tokens
+
+CONTEXT_TOKENS = int(os.getenv("CONTEXT_TOKENS", "1200"))  # budget du contexte (tokens estimés)
+NEAR_DUP = 0.85      # Jaccard (mots) au-delà duquel deux phrases sont des quasi-doublons
+MIN_DUP_WORDS = 5    # phrases plus courtes : seuls les doublons exacts sont retirés
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+_WORD = re.compile(r"\w+")
+
+class Passage:
+    """Span fusionné d'un article ; `rank` = meilleur rang de ses chunks dans les résultats."""
+    __slots__ = ("n", "title", "url", "language", "article", "start", "end", "text", "rank", "chunk_ids",
+                 "raw_chars")
+
+    def __init__(self, doc: Document, rank: int):
+        m = doc.metadata
+        self.n = 0
+        self.title, self.url, self.language = m.get("title", "—"), m.get("url", "#"), m.get("language", "")
+        self.article = m.get("id") or (self.title, self.url)
+        self.start, self.end = int(m.get("start", 0)), int(m.get("end", 0))
+        self.text, self.rank = doc.page_content, rank
+        self.chunk_ids = [m.get("chunk_id")]
+        self.raw_chars = len(doc.page_content)  # chunks bruts absorbés (référence des tokens économisés)
+
+    def absorb(self, doc: Document, rank: int) -> None:
+        """Ajoute un chunk qui commence avant la fin du span (ou juste à sa fin)."""
+        start, end = int(doc.metadata["start"]), int(doc.metadata["end"])
+        if end > self.end:
+            # offsets UTF-8 : on ne garde du chunk que les octets au-delà de la fin du span
+            # (chunks = tranches du même texte : la concaténation redonne l'article)
+            tail = doc.page_content.encode("utf-8")[self.end - start:].decode("utf-8")
+            self.text, self.end = self.text + tail, end
+        self.rank = min(self.rank, rank)
+        self.chunk_ids.append(doc.metadata.get("chunk_id"))
+        self.raw_chars += len(doc.page_content)
+
+class PackedContext:
+    """`dropped` : passages coupés ou laissés de côté faute de budget ; `naive_tokens` : chunks bruts
+    correspondant au contenu émis (passages tronqués comptés pour leur partie émise)."""
+    __slots__ = ("text", "passages", "tokens", "naive_tokens", "dropped")
+
+    def __init__(self, text: str, passages: List[Passage], tokens: int, naive_tokens: int, dropped: int):
+        self.text, self.passages, self.tokens = text, passages, tokens
+        self.naive_tokens, self.dropped = naive_tokens, dropped
+
+    @property
+    def saved(self) -> int:
+        """Tokens de prompt économisés (fusion, déduplication) par rapport aux mêmes chunks bruts."""
+        return max(self.naive_tokens - self.tokens, 0)
+
+def merge_spans(docs: Sequence[Document]) -> List[Passage]:
+    """Chunks → passages : par article, spans qui se recouvrent ou se touchent fusionnés ;
+    passages triés par meilleur rang. Sans offsets (ancien store), un chunk = un passage."""
+    by_article: Dict = {}
+    for rank, d in enumerate(docs):
+        key = d.metadata.get("id") or (d.metadata.get("title"), d.metadata.get("url"))
+        by_article.setdefault(key, []).append((rank, d))
+    passages: List[Passage] = []
+    for hits in by_article.values():
+        hits.sort(key=lambda h: int(h[1].metadata.get("start", 0)))
+        cur: Optional[Passage] = None
+        for rank, d in hits:
+            has_offsets = "start" in d.metadata and "end" in d.metadata
+            if cur is not None and has_offsets and int(d.metadata["start"]) <= cur.end:
+                cur.absorb(d, rank)
+                continue
+            cur = Passage(d, rank)
+            passages.append(cur)
+            if not has_offsets:
+                cur = None
+    return sorted(passages, key=lambda p: p.rank)
+
+def _sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE_END.split(text) if s.strip()]
+
+def _is_duplicate(words: Tuple[str, ...], seen_exact: set, seen_sets: List[set]) -> bool:
+    if words in seen_exact:
+        return True
+    if len(words) < MIN_DUP_WORDS:
+        return False
+    ws = set(words)
+    return any(len(ws & s) >= NEAR_DUP * len(ws | s) for s in seen_sets)
+
+def dedupe_sentences(passages: List[Passage]) -> int:
+    """Retire (en place) les phrases quasi identiques à une phrase mieux classée ; renvoie le nombre retiré."""
+    seen_exact: set = set()
+    seen_sets: List[set] = []
+    removed = 0
+    for p in passages:
+        kept = []
+        for s in _sentences(p.text):
+            words = tuple(_WORD.findall(s.lower()))
+            if words and _is_duplicate(words, seen_exact, seen_sets):
+                removed += 1
+                continue
+            kept.append(s)
+            seen_exact.add(words)
+            if len(words) >= MIN_DUP_WORDS:
+                seen_sets.append(set(words))
+        p.text = " ".join(kept)
+    return removed
+
+def _header(n: int, p: Passage) -> str:
+    return f"[{n}] {p.title}"
+
+def _truncate(text: str, tokens: int) -> str:
+    """Coupe dure à ~`tokens` tokens, au dernier espace si possible."""
+    cut = text[:max(tokens, 1) * 4]
+    return cut.rsplit(" ", 1)[0] if " " in cut and len(cut) < len(text) else cut
+
+def pack_context(docs: Sequence[Document], budget: int = CONTEXT_TOKENS) -> PackedContext:
+    """Contexte du prompt : passages fusionnés, dédupliqués, numérotés [n] dans l'ordre du classement,
+    ajoutés tant que le budget le permet (le premier qui dépasse est coupé à la phrase ; le premier
+    passage est toujours émis, tronqué au budget s'il le faut)."""
+    passages = merge_spans(docs)
+    dedupe_sentences(passages)
+    blocks: List[str] = []
+    packed: List[Passage] = []
+    used, cut, raw_chars, pending = 0, False, 0, 0  # pending : passages entièrement dédupliqués
+    for p in passages:
+        if not p.text.strip():
+            pending += p.raw_chars
+            continue
+        n = len(blocks) + 1
+        block = f"{_header(n, p)}\n{p.text}"
+        cost = estimate_tokens(block)
+        if used + cost > budget:  # dernier passage : autant de phrases que le budget le permet
+            kept, cost = [], estimate_tokens(_header(n, p))
+            for s in _sentences(p.text):
+                c = estimate_tokens(" " + s)
+                if used + cost + c > budget:
+                    break
+                kept.append(s)
+                cost += c
+            if kept:
+                text = " ".join(kept)
+            elif not blocks:  # contexte vide sinon : coupe dure du premier passage
+                text = _truncate(p.text, budget - cost)
+            else:
+                break
+            p.text, cut = text, True
+            block = f"{_header(n, p)}\n{p.text}"
+            cost = estimate_tokens(block)
+        p.n = n
+        blocks.append(block)
+        packed.append(p)
+        used += cost
+        raw_chars += pending + (len(block) if cut else p.raw_chars)
+        pending = 0
+        if cut:
+            break
+    text = "\n\n".join(blocks)
+    remaining = sum(1 for p in passages if p.text.strip()) - len(packed)
+    return PackedContext(text, packed, estimate_tokens(text) if text else 0,
+                         raw_chars // 4 + 1 if packed else 0, remaining + cut)
@@ -0,0 +1,253 @@
+# encoders.py — Encodeurs de requêtes interchangeables (EMBED_BACKEND / --backend)
+# - torch     : HuggingFaceEmbeddings (sentence-transformers) — référence, celui qui a construit l'index
+# - onnx      : le même modèle exporté en ONNX, exécuté par onnxruntime sur CPU
+# - onnx-int8 : idem avec quantification dynamique int8 des poids (MatMul)
+# L'export est livré avec l'index (INDEX_DIR/onnx) :
+#   python encoders.py export    # export + quantification + vérification de l'accord avec torch
+#   python encoders.py check --backend onnx-int8
+# Compatible Python 3.9
+
+from typing import Dict, List, Optional, Sequence
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from langchain_core.embeddings import Embeddings
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_DIR = "onnx"  # sous-dossier de INDEX_DIR
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+ENCODER_VERSION = 1
+
+# Threads intra-op d'onnxruntime : les cœurs physiques (l'hyperthreading n'aide pas les GEMM).
+# Les requêtes simultanées partagent la même session (run() est thread-safe).
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+BATCH_SIZE = 32
+
+# Accord minimal (cosinus) avec l'encodeur torch pour qu'un export soit accepté
+MIN_COSINE = {"onnx": 0.999, "onnx-int8": 0.98}
+
+class OnnxEmbeddings(Embeddings):
+    """Encodeur ONNX : tokenizer Rust (tokenizers), lots triés par longueur et rembourrés au plus
+    long du lot, mean pooling sur le masque d'attention puis normalisation L2 (comme l'index)."""
+
+    def __init__(self, model_path: str, tokenizer_path: str, max_length: int, pad_id: int,
+                 inputs: Sequence[str], threads: int = EMBED_THREADS, batch_size: int = BATCH_SIZE):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.no_padding()  # rembourrage fait ici, lot par lot
+        self.pad_id, self.inputs, self.batch_size = pad_id, tuple(inputs), batch_size
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, opts, providers=["CPUExecutionProvider"])
+
+    def _encode_ids(self, texts: List[str]) -> List[List[int]]:
+        if len(texts) == 1:  # cas d'une requête : pas de passage par le pool de threads du tokenizer
+            return [self.tokenizer.encode(texts[0]).ids]
+        return [e.ids for e in self.tokenizer.encode_batch(texts)]
+
+    def _run(self, ids: List[List[int]]) -> np.ndarray:
+        width = max(len(x) for x in ids)
+        input_ids = np.full((len(ids), width), self.pad_id, dtype=np.int64)
+        mask = np.zeros((len(ids), width), dtype=np.int64)
+        for r, x in enumerate(ids):
+            input_ids[r, :len(x)] = x
+            mask[r, :len(x)] = 1
+        feed = {"input_ids": input_ids, "attention_mask": mask}
+        if "token_type_ids" in self.inputs:
+            feed["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, feed)[0]
+        m = mask[:, :, None].astype(np.float32)
+        vecs = (hidden * m).sum(axis=1) / np.maximum(m.sum(axis=1), 1e-9)
+        return vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Matrice (n, dim) float32, lignes dans l'ordre de `texts`."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        ids = self._encode_ids(list(texts))
+        order = np.argsort([len(x) for x in ids], kind="stable")
+        out: Optional[np.ndarray] = None
+        for s in range(0, len(order), self.batch_size):
+            batch = order[s:s + self.batch_size]
+            vecs = self._run([ids[i] for i in batch])
+            if out is None:
+                out = np.empty((len(ids), vecs.shape[1]), dtype=np.float32)
+            out[batch] = vecs
+        return out
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+def read_meta(onnx_dir: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(onnx_dir, "encoder.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def load_encoder(backend: str, model: str, onnx_dir: Optional[str] = None,
+                 threads: int = EMBED_THREADS) -> Embeddings:
+    """Encodeur du backend demandé. model : nom du modèle de l'index (ou dossier local pour torch)."""
+    if backend == "torch":
+        # import tardif : torch / sentence-transformers ne sont chargés qu'ici (démarrage à froid)
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model, encode_kwargs={"normalize_embeddings": True})
+    if backend not in ONNX_FILES:
+        raise ValueError(f"backend d'encodage inconnu : {backend} ({', '.join(BACKENDS)})")
+    meta = read_meta(onnx_dir) if onnx_dir else None
+    if meta is None or meta.get("version") != ENCODER_VERSION:
+        raise FileNotFoundError(f"export ONNX absent de {onnx_dir} (python encoders.py export)")
+    if meta["model"] != model:
+        raise ValueError(f"export ONNX construit pour {meta['model']}, pas {model}")
+    path = os.path.join(onnx_dir, ONNX_FILES[backend])
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} absent (python encoders.py export)")
+    return OnnxEmbeddings(path, os.path.join(onnx_dir, "tokenizer.json"), meta["max_seq_length"],
+                          meta["pad_id"], meta["inputs"], threads)
+
+# ---------- Export ----------
+def export_onnx(model_name: str, out_dir: str, quantize: bool = True, opset: int = 14) -> Dict:
+    """Exporte le transformer (→ last_hidden_state, axes batch / séquence dynamiques), le tokenizer
+    rapide et, si `quantize`, une version int8. Renvoie les métadonnées (encoder.json)."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st = SentenceTransformer(model_name, device="cpu")
+    pooling = st[1].get_pooling_mode_str()
+    if pooling != "mean" or len(st) != 2:
+        raise ValueError(f"{model_name} : seul transformer + mean pooling est exporté (trouvé {pooling})")
+    hf, tok = st[0].auto_model.eval(), st.tokenizer
+    sample = tok(["a/b testing sample ratio mismatch", "test A/B"], padding=True, return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+
+    class LastHidden(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *args):
+            return self.model(**dict(zip(names, args))).last_hidden_state
+
+    os.makedirs(out_dir, exist_ok=True)
+    fp32 = os.path.join(out_dir, ONNX_FILES["onnx"])
+    axes = {n: {0: "batch", 1: "seq"} for n in names + ["last_hidden_state"]}
+    with torch.no_grad():
+        torch.onnx.export(LastHidden(hf), tuple(sample[n] for n in names), fp32,
+                          input_names=names, output_names=["last_hidden_state"],
+                          dynamic_axes=axes, opset_version=opset, do_constant_folding=True)
+    tok.backend_tokenizer.save(os.path.join(out_dir, "tokenizer.json"))
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32, os.path.join(out_dir, ONNX_FILES["onnx-int8"]), weight_type=QuantType.QInt8)
+
+    meta = {"version": ENCODER_VERSION, "model": model_name, "max_seq_length": st.max_seq_length,
+            "dim": st.get_sentence_embedding_dimension(), "pad_id": tok.pad_token_id, "inputs": names,
+            "backends": [b for b in ONNX_FILES if os.path.exists(os.path.join(out_dir, ONNX_FILES[b]))]}
+    with open(os.path.join(out_dir, "encoder.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+# ---------- Vérification : accord avec l'encodeur torch ----------
+def agreement(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """Cosinus ligne à ligne entre deux matrices d'embeddings normalisés."""
+    cos = np.einsum("ij,ij->i", reference, candidate)
+    return {"n": int(len(cos)), "min_cosine": float(cos.min()), "mean_cosine": float(cos.mean())}
+
+def topk_overlap(index, reference: np.ndarray, candidate: np.ndarray, k: int = 10) -> float:
+    """Part moyenne des k plus proches voisins FAISS communs aux deux encodeurs."""
+    _, a = index.search(reference, k)
+    _, b = index.search(candidate, k)
+    return float(np.mean([len(set(x) & set(y)) / k for x, y in zip(a, b)]))
+
+def median_ms(enc: Embeddings, texts: List[str]) -> float:
+    """Latence médiane d'un embed_query (une requête, comme en service)."""
+    enc.embed_query(texts[0])
+    lat = []
+    for t in texts:
+        t0 = time.perf_counter()
+        enc.embed_query(t)
+        lat.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(lat))
+
+def check_texts(index_dir: str, queries_file: str, n_chunks: int = 200) -> List[str]:
+    """Requêtes du benchmark (réécrites) + un échantillon de chunks de l'index (textes longs)."""
+    from chunk_store import ChunkStore
+    from hybrid_search import normalize_query, rewrite
+
+    with open(queries_file, encoding="utf-8") as f:
+        texts = [rewrite(normalize_query(json.loads(line)["query"])) for line in f if line.strip()]
+    store = ChunkStore(index_dir)
+    rows = np.linspace(0, len(store) - 1, min(n_chunks, len(store))).astype(int)
+    return texts + [store.document(int(r)).page_content for r in rows]
+
+def check(backend: str, model: str, index_dir: str, onnx_dir: str, queries_file: str) -> Dict:
+    from ann_index import read_index
+
+    texts = check_texts(index_dir, queries_file)
+    torch_enc = load_encoder("torch", model)
+    enc = load_encoder(backend, model, onnx_dir)
+    ref = np.asarray(torch_enc.embed_documents(texts), dtype=np.float32)
+    cand = np.asarray(enc.embed_documents(texts), dtype=np.float32)
+    index = read_index(os.path.join(index_dir, "index.faiss"))
+    report = agreement(ref, cand)
+    report["top10_overlap"] = topk_overlap(index, ref, cand)
+    report["torch_ms"] = median_ms(torch_enc, texts[:50])
+    report[f"{backend}_ms"] = median_ms(enc, texts[:50])
+    report["ok"] = report["min_cosine"] >= MIN_COSINE[backend]
+    return report
+
+if __name__ == "__main__":
+    from hybrid_search import EMBED_MODEL, INDEX_DIR
+
+    ap = argparse.ArgumentParser(description="Export ONNX de l'encodeur et vérification de l'accord avec torch.")
+    ap.add_argument("command", choices=("export", "check"))
+    ap.add_argument("--model", default=EMBED_MODEL)
+    ap.add_argument("--index-dir", default=INDEX_DIR)
+    ap.add_argument("--backend", choices=tuple(ONNX_FILES), help="check : backend vérifié (défaut : tous)")
+    ap.add_argument("--no-quantize", action="store_true", help="export : pas de version int8")
+    ap.add_argument("--queries", default="bench_queries.jsonl")
+    args = ap.parse_args()
+
+    out = os.path.join(args.index_dir, ONNX_DIR)
+    src = out
+    if args.command == "export":
+        # export dans un dossier temporaire, publié seulement si l'accord avec torch est suffisant
+        src = out + ".tmp"
+        shutil.rmtree(src, ignore_errors=True)
+        meta = export_onnx(args.model, src, quantize=not args.no_quantize)
+    else:
+        meta = read_meta(out)
+        if meta is None:
+            raise SystemExit(f"❌ export ONNX absent de {out} (python encoders.py export)")
+    backends = [args.backend] if args.backend else meta["backends"]
+    ok = True
+    for b in backends:
+        r = check(b, args.model, args.index_dir, src, args.queries)
+        meta.setdefault("agreement", {})[b] = r
+        ok &= r["ok"]
+        print(f"{'✅' if r['ok'] else '❌'} {b} : cosinus min {r['min_cosine']:.4f} · moyen {r['mean_cosine']:.4f} "
+              f"(seuil {MIN_COSINE[b]}) · top-10 FAISS communs {r['top10_overlap']:.3f} · "
+              f"{r['torch_ms']:.1f} ms (torch) → {r[f'{b}_ms']:.1f} ms ({r['n']} textes)")
+    with open(os.path.join(src, "encoder.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    if not ok:
+        raise SystemExit(f"❌ accord insuffisant avec l'encodeur torch ({src})")
+    if args.command == "export":
+        shutil.rmtree(out, ignore_errors=True)
+        os.replace(src, out)
+        print(f"✅ Encodeur ONNX → {out} ({', '.join(backends)})")
@@ -0,0 +1,96 @@
+# fusion.py — Fusion des classements dense / lexical sur tableaux NumPy (id, rang, score)
+# Les chunks sont identifiés par leur identifiant entier stable (chunk_store) : la fusion ne dépend
+# ni des objets Document ni de l'ordre des lignes FAISS, et reste sûre sur des résultats mis en
+# cache ou calculés par lot. Modes :
+# - rrf    : Σ poids / (k + rang) (poids égaux = RRF classique)
+# - minmax : scores ramenés dans [0, 1] par branche, somme pondérée
+# - zscore : scores centrés-réduits par branche, somme pondérée
+# Compatible Python 3.9
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+RUN_DTYPE = np.dtype([("id", "<i8"), ("rank", "<u4"), ("score", "<f4")])
+FUSION_MODES = ("rrf", "minmax", "zscore")
+RRF_K = 60
+PARTIAL_MIN = 4  # sélection partielle au-delà de PARTIAL_MIN × topk candidats pour une requête
+
+def make_run(ids: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """Classement d'une branche : ids du meilleur au moins bon, scores « plus grand = meilleur »."""
+    run = np.empty(len(ids), dtype=RUN_DTYPE)
+    run["id"] = ids
+    run["rank"] = np.arange(1, len(ids) + 1)
+    run["score"] = scores
+    return run
+
+def _contribution(run: np.ndarray, mode: str, rrf_k: int) -> np.ndarray:
+    if mode == "rrf":
+        return 1.0 / (rrf_k + run["rank"].astype(np.float64))
+    s = run["score"].astype(np.float64)
+    if mode == "minmax":
+        span = s.max() - s.min() if len(s) else 0.0
+        return (s - s.min()) / span if span > 0 else np.ones_like(s)
+    if mode == "zscore":
+        std = s.std() if len(s) else 0.0
+        return (s - s.mean()) / std if std > 0 else np.zeros_like(s)
+    raise ValueError(f"mode de fusion inconnu : {mode} ({', '.join(FUSION_MODES)})")
+
+def fuse_many(branches: Sequence[Sequence[np.ndarray]], topk: int, mode: str = "rrf",
+              weights: Optional[Sequence[float]] = None,
+              rrf_k: int = RRF_K) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Fusion d'un lot : branches[b][q] = classement (RUN_DTYPE) de la branche b pour la requête q.
+    Renvoie, par requête, (ids, scores fusionnés) des `topk` meilleurs, scores décroissants ; un id
+    absent d'une branche n'en reçoit aucune contribution. Tout le lot est regroupé et trié en une
+    passe ; ex aequo départagés par première apparition (branches dans l'ordre, puis rang)."""
+    weights = [1.0] * len(branches) if weights is None else list(weights)
+    if len(weights) != len(branches):
+        raise ValueError("un poids par branche")
+    n_queries = len(branches[0]) if branches else 0
+    runs = [(q, w, run) for per_query, w in zip(branches, weights) for q, run in enumerate(per_query)]
+    if not any(len(run) for _, _, run in runs):
+        return [(np.zeros(0, np.int64), np.zeros(0)) for _ in range(n_queries)]
+    sizes = [len(run) for _, _, run in runs]
+    ids = np.concatenate([run["id"] for _, _, run in runs])
+    query = np.repeat([q for q, _, _ in runs], sizes)
+    if mode == "rrf":  # une seule opération pour tout le lot
+        ranks = np.concatenate([run["rank"] for _, _, run in runs])
+        contrib = np.repeat([w for _, w, _ in runs], sizes) / (rrf_k + ranks)
+    else:
+        contrib = np.concatenate([w * _contribution(run, mode, rrf_k) for _, w, run in runs])
+
+    # regroupement (requête, id) : tri stable → la 1re ligne d'un groupe est sa 1re apparition
+    order = np.lexsort((ids, query))
+    q_sorted, id_sorted = query[order], ids[order]
+    new_group = (q_sorted[1:] != q_sorted[:-1]) | (id_sorted[1:] != id_sorted[:-1])
+    start = np.flatnonzero(np.concatenate(([True], new_group)))
+    g_query, g_id, g_first = q_sorted[start], id_sorted[start], order[start]
+    g_score = np.add.reduceat(contrib[order], start)
+    return _top_k_per_query(g_query, g_id, g_score, g_first, n_queries, topk)
+
+def _top_k_per_query(query: np.ndarray, ids: np.ndarray, scores: np.ndarray, first: np.ndarray,
+                     n_queries: int, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Groupes contigus par requête → top-k de chaque requête. Les requêtes à beaucoup de
+    candidats sont d'abord élaguées par sélection partielle (np.partition, ex aequo de la
+    frontière conservés), puis un seul tri ordonne tout le lot."""
+    counts = np.bincount(query, minlength=n_queries)
+    if k > 0 and (counts > PARTIAL_MIN * k).any():
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        keep = np.ones(len(query), dtype=bool)
+        for q in np.flatnonzero(counts > PARTIAL_MIN * k):
+            s = scores[bounds[q]:bounds[q + 1]]
+            keep[bounds[q]:bounds[q + 1]] = s >= -np.partition(-s, k - 1)[k - 1]
+        query, ids, scores, first = query[keep], ids[keep], scores[keep], first[keep]
+        counts = np.bincount(query, minlength=n_queries)
+    order = np.lexsort((first, -scores, query))
+    ids, scores = ids[order], scores[order]
+    out, a = [], 0
+    for n in counts.tolist():
+        out.append((ids[a:a + min(n, max(k, 0))], scores[a:a + min(n, max(k, 0))]))
+        a += n
+    return out
+
+def fuse(runs: Sequence[np.ndarray], topk: int, mode: str = "rrf",
+         weights: Optional[Sequence[float]] = None, rrf_k: int = RRF_K) -> Tuple[np.ndarray, np.ndarray]:
+    """Fusion d'une requête : runs[b] = classement de la branche b (cf. fuse_many)."""
+    return fuse_many([[run] for run in runs], topk, mode, weights, rrf_k)[0]
@@ -1,31 +1,36 @@
-# app.py — UI Gradio simple (FAISS-only) avec citations cliquables
-import gradio as gr
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+# app.py — UI Gradio simple (recherche hybride FAISS + BM25) avec citations cliquables
+import os
 
-INDEX_DIR = "faiss_open_index"
-EMBED_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+import gradio as gr
 
-def load_vs():
-    emb = HuggingFaceEmbeddings(
-        model_name=EMBED_MODEL,
-        encode_kwargs={"normalize_embeddings": True},
-    )
-    # L’index doit être présent dans ./faiss_open_index
-    return FAISS.load_local(INDEX_DIR, emb, allow_dangerous_deserialization=True)
+# hybrid_search.py et ses modules (chunk_store, bm25_index, term_signals, ann_index, metrics, …) sont
+# copiés à côté de ce fichier par `python sync_space.py` (racine du dépôt), avant l'envoi de la Space
+from metrics import METRICS, serve as serve_metrics
+from retrieval_client import RETRIEVAL_URL, RemoteSearcher
 
-vs = load_vs()
+# RETRIEVAL_URL défini → client léger de retrieval_server.py (plusieurs workers, un seul index).
+# Sinon l’index doit être présent dans ./faiss_open_index (FAISS + chunk store + BM25) ;
+# chargé en arrière-plan (mmap + snapshot ./faiss_open_index/warm) pendant que l'UI démarre
+if RETRIEVAL_URL:
+    loader = RemoteSearcher(RETRIEVAL_URL)
+else:
+    from hybrid_search import SearcherLoader
+    loader = SearcherLoader()
 
-def search(query: str, k: int, lang_filter: str):
+async def search(query: str, k: int, lang_filter: str):
     q = (query or "").strip()
     if not q:
         return "<i>Entre une question…</i>"
-    docs = vs.similarity_search(q, k=int(k))
-    # petit filtre langue (optionnel)
-    if lang_filter in ("FR", "EN"):
-        keep = "fr" if lang_filter == "FR" else "en"
-        docs = [d for d in docs if (d.metadata.get("language","") == keep)] or docs
+    # filtre langue appliqué dans FAISS et BM25 : exactement k passages de la langue demandée ;
+    # seuls les k chunks retenus sont matérialisés en Document ; FAISS ‖ BM25 hors boucle asyncio
+    filters = {"language": lang_filter.lower()} if lang_filter in ("FR", "EN") else None
+    hs = await loader.aget()
+    docs, _ = await hs.asearch(q, k_final=int(k), filters=filters)
+
+    with METRICS.span("html"):
+        return render(docs)
 
+def render(docs) -> str:
     html = []
     for i, d in enumerate(docs, 1):
         title = d.metadata.get("title", "—")
@@ -42,7 +47,7 @@ def search(query: str, k: int, lang_filter: str):
     return "\n".join(html)
 
 with gr.Blocks(theme=gr.themes.Soft()) as demo:
-    gr.Markdown("## 🔎 Experiment Brief — Recherche sourcée (FAISS)")
+    gr.Markdown("## 🔎 Experiment Brief — Recherche sourcée (FAISS + BM25)")
     with gr.Row():
         q = gr.Textbox(label="Ta question", placeholder="Ex. Différence interleaving vs A/B ?")
     with gr.Row():
@@ -53,4 +58,6 @@ with gr.Blocks(theme=gr.themes.Soft()) as demo:
     go.click(search, inputs=[q, k, lang], outputs=out)
 
 if __name__ == "__main__":
+    if os.getenv("METRICS_PORT"):  # /metrics (Prometheus), /metrics.json, sonde /ready
+        serve_metrics(METRICS, int(os.environ["METRICS_PORT"]), ready=loader.ready)
     demo.launch()
@@ -1,18 +1,62 @@
 # hybrid_search.py — Hybrid retrieval (FAISS dense + BM25 lexical) + query rewrite + domain filter + SRM boost
 # Compatible Python 3.9
 
-from typing import List, Tuple, Dict
-from collections import defaultdict
+from typing import Any, List, Tuple, Dict, Optional, Sequence, Union
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+import argparse
+import asyncio
+import os
 import re
+import threading
+import time
+
+import numpy as np
 
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.retrievers import BM25Retriever
 from langchain_core.documents import Document
 
+from ann_index import (INDEX_FILE, id_selector, load_ann, load_index_meta, read_index, search_subset,
+                       set_search_params)
+from bm25_index import BM25Index, tokenize
+from chunk_store import ChunkStore
+from encoders import BACKENDS, ONNX_DIR, load_encoder
+from fusion import FUSION_MODES, RUN_DTYPE, fuse_many, make_run
+from metrics import METRICS, Metrics, format_trace
+from term_signals import load_signals
+from warm_snapshot import WarmSnapshot, load_snapshot
+
 # ---------- Config ----------
 INDEX_DIR = "faiss_open_index"  # dossier créé par index_open_faiss.py
 EMBED_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+# Encodeur des requêtes : torch (référence), onnx ou onnx-int8 (export INDEX_DIR/onnx, cf. encoders.py)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+BM25_K = 12  # top lexical
+
+# Index approché (index_ann.faiss, cf. index_open_faiss.py --index-spec) : réglages de recherche
+ANN_NPROBE = 16      # IVF : nombre de listes inversées visitées
+ANN_EF_SEARCH = 64   # HNSW : taille de la file de candidats
+
+# Cache des requêtes (réécriture, embedding, résultats finaux)
+CACHE_SIZE = 512          # entrées max par niveau de cache
+CACHE_TTL = 15 * 60       # durée de vie d'une entrée (secondes)
+INDEX_CHECK_EVERY = 5.0   # intervalle min. entre deux vérifications de l'index (secondes)
+
+# Branches dense (embedding + FAISS) et lexicale (BM25) exécutées en parallèle
+# (torch, FAISS et NumPy relâchent le GIL). Au-delà de son budget, une branche est ignorée
+# et la fusion se fait sur l'autre seule. None = pas de limite. Une branche hors budget encore en
+# cours occupe un thread du pool : tant qu'elle n'a pas fini, la même branche n'est plus soumise
+# (requêtes servies par l'autre), pour que le pool ne se remplisse pas de travail orphelin.
+PARALLEL_BRANCHES = True
+BRANCH_WORKERS = 4        # threads du pool persistant (plusieurs requêtes simultanées)
+DENSE_TIMEOUT = 1.5       # secondes
+SPARSE_TIMEOUT = 1.5      # secondes
+
+# Fusion dense + lexicale sur les identifiants stables des chunks (cf. fusion.py) :
+# rrf (poids = RRF pondéré), minmax ou zscore (scores normalisés par branche)
+FUSION_MODE = "rrf"
+FUSION_WEIGHTS = (1.0, 1.0)  # (dense, lexical)
+
+WARMUP_QUERY = "a/b testing sample ratio mismatch"  # premier passage complet avant la 1re vraie requête
 
 # Expansion de requêtes (ajoute du contexte domaine)
 EXPAND: Dict[str, List[str]] = {
@@ -52,7 +96,15 @@ BOOST_TERMS = [
     "chi-squared","goodness of fit","a/a test"
 ]
 
+# Filtres de métadonnées : {"language": "fr"}, {"split": ["wiki_fr", "wiki_en"], "source_type": "wiki"}…
+# (champs : chunk_store.PARTITION_FIELDS)
+Filters = Dict[str, Union[str, Sequence[str]]]
+
 # ---------- Utilitaires ----------
+def normalize_query(q: str) -> str:
+    """Normalise les espaces (clé de cache) sans toucher à la casse : BM25 et l'encodeur y sont sensibles."""
+    return " ".join((q or "").split())
+
 def rewrite(q: str) -> str:
     """Ajoute des termes de domaine en fonction de la requête."""
     qn = q.lower()
@@ -62,95 +114,535 @@ def rewrite(q: str) -> str:
             extra += terms
     return q if not extra else f"{q} " + " ".join(extra)
 
-def rrf(dense_hits: List[Tuple[Document, float]],
-        sparse_hits: List[Document],
-        k: int = 60,
-        topk: int = 5) -> List[Document]:
-    """Reciprocal Rank Fusion (RRF) — fusionne l'ordre dense et lexical."""
-    score = defaultdict(float)
-
-    for rank, (doc, _) in enumerate(dense_hits, start=1):
-        score[id(doc)] += 1.0 / (k + rank)
-
-    for rank, doc in enumerate(sparse_hits, start=1):
-        score[id(doc)] += 1.0 / (k + rank)
-
-    uniq: Dict[int, Document] = {}
-    for (doc, _) in dense_hits:
-        uniq[id(doc)] = doc
-    for doc in sparse_hits:
-        uniq[id(doc)] = doc
-
-    ranked = sorted(uniq.values(), key=lambda d: score[id(d)], reverse=True)
-    return ranked[:topk]
-
 def is_domain(doc: Document) -> bool:
     """Filtre simple : conserve les docs contenant des termes de notre domaine."""
     hay = (doc.metadata.get("title", "") + " " + doc.page_content).lower()
     return any(t in hay for t in DOMAIN_TERMS)
 
+def boost_score(doc: Document) -> int:
+    """Nombre d'occurrences des termes SRM dans le chunk."""
+    txt = (doc.page_content + " " + doc.metadata.get("title","")).lower()
+    return sum(txt.count(t) for t in BOOST_TERMS)
+
 def boost_rank(docs: List[Document]) -> List[Document]:
     """Boost très simple pour SRM (compte des occurrences)."""
-    def score(doc: Document) -> int:
-        txt = (doc.page_content + " " + doc.metadata.get("title","")).lower()
-        return sum(txt.count(t) for t in BOOST_TERMS)
-    return sorted(docs, key=score, reverse=True)
+    return sorted(docs, key=boost_score, reverse=True)
+
+# ---------- Cache ----------
+class TTLCache:
+    """Cache LRU borné avec expiration (TTL) et compteurs hits/misses (thread-safe)."""
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: Optional[float] = CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl and time.monotonic() - item[0] > self.ttl:
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+def filter_key(filters: Optional[Filters]) -> Tuple:
+    """Forme canonique (hashable, clé de cache) d'un filtre ; valeurs vides ignorées."""
+    key = []
+    for field, values in sorted((filters or {}).items()):
+        values = (values,) if isinstance(values, str) else tuple(values or ())
+        values = tuple(sorted({v for v in values if v}))
+        if values:
+            key.append((field, values))
+    return tuple(key)
+
+class Partition:
+    """Lignes retenues par un filtre : masque (BM25), sélecteur FAISS et effectif."""
+    __slots__ = ("mask", "size", "selector")
+
+    def __init__(self, mask: np.ndarray):
+        self.mask = mask
+        self.size = int(mask.sum())
+        self.selector = id_selector(mask)
+
+class IndexState:
+    """Tout ce qui dépend de l'index chargé (snapshot, encodeur, FAISS, chunk store, BM25, signaux,
+    partitions) : construit en entier puis publié d'un bloc par HybridSearcher, jamais modifié
+    ensuite (hors cache des partitions). Une recherche le lit une seule fois."""
+    __slots__ = ("fingerprint", "warm", "emb", "index", "store", "bm25", "signals", "partitions")
+
+    def __init__(self, fingerprint: Tuple, warm: Optional[WarmSnapshot], emb, index, store: ChunkStore,
+                 bm25: BM25Index, signals: Optional[np.ndarray]):
+        self.fingerprint, self.warm, self.emb, self.index = fingerprint, warm, emb, index
+        self.store, self.bm25, self.signals = store, bm25, signals
+        self.partitions: Dict[Tuple, Partition] = {}  # filtre → lignes (calculées au 1er usage)
+
+    def partition(self, key: Tuple) -> Optional[Partition]:
+        if not key:
+            return None
+        part = self.partitions.get(key)
+        if part is None:
+            part = self.partitions[key] = Partition(self.store.rows_where(dict(key)))
+        return part
+
+    def is_domain(self, row: int) -> bool:
+        if self.signals is None:
+            return is_domain(self.store.document(row))
+        return bool(self.signals[row]["domain"])
+
+    def boost_rank(self, rows: List[int]) -> List[int]:
+        def score(row: int) -> int:
+            if self.signals is None:
+                return boost_score(self.store.document(row))
+            return int(self.signals[row]["boost"])
+        return sorted(rows, key=score, reverse=True)
+
+def index_fingerprint(index_dir: str = INDEX_DIR) -> Tuple:
+    """Signature (nom, taille, mtime) des fichiers de l'index : change à chaque reconstruction."""
+    sig = []
+    for name in sorted(os.listdir(index_dir)):
+        st = os.stat(os.path.join(index_dir, name))
+        sig.append((name, st.st_size, st.st_mtime_ns))
+    return tuple(sig)
 
 # ---------- Chargement index + BM25 ----------
-def load_retrievers():
-    emb = HuggingFaceEmbeddings(
-        model_name=EMBED_MODEL,
-        encode_kwargs={"normalize_embeddings": True},
-    )
-    # FAISS inclut les chunks quand on sauvegarde via save_local
-    vs = FAISS.load_local(INDEX_DIR, emb, allow_dangerous_deserialization=True)
+def load_embeddings(model: str, backend: str = "torch", onnx_dir: Optional[str] = None):
+    """Encodeur du backend demandé ; repli sur torch si l'export ONNX manque ou ne correspond pas."""
+    if backend != "torch":
+        try:
+            return load_encoder(backend, model, onnx_dir)
+        except (OSError, ValueError, ImportError) as e:
+            print(f"⚠️  encodeur {backend} indisponible ({e}) : repli sur torch")
+    return load_encoder("torch", model)
+
+def load_retrievers(index_dir: str = INDEX_DIR, embed_model: str = EMBED_MODEL,
+                    backend: str = EMBED_BACKEND, onnx_dir: Optional[str] = None):
+    """embed_model : nom du modèle (ou dossier local du snapshot de démarrage, backend torch)."""
+    emb = load_embeddings(embed_model, backend, onnx_dir or os.path.join(index_dir, ONNX_DIR))
+    # Ordre inverse de l'écriture (index_open_faiss : fichiers dérivés, index.faiss, puis index.json) :
+    # empreinte d'abord, vecteurs ensuite, chunk store et dérivés enfin. Une mise à jour en cours
+    # donne alors des empreintes différentes (rechargement retenté) plutôt qu'un mélange silencieux.
+    meta = load_index_meta(index_dir)
+    flat = read_index(os.path.join(index_dir, INDEX_FILE))
+    # Vecteurs FAISS seuls : les chunks sont lus dans le chunk store (pas de docstore pickle)
+    store = ChunkStore(index_dir)
+    rows_hash = meta["faiss_rows"] if meta else store.rows_hash  # index antérieur à index.json
+    if store.rows_hash != rows_hash or len(store) != flat.ntotal or (meta and meta["ntotal"] != flat.ntotal):
+        raise ValueError("chunk store désynchronisé de l'index FAISS (relancer index_open_faiss.py)")
+    # index approché s'il a été construit pour ces lignes, sinon l'index exact ; lus en mmap
+    index = load_ann(index_dir, rows_hash) or flat
 
-    # Construire BM25 sur les mêmes documents (chunks)
-    docs = list(vs.docstore._dict.values())
-    bm25 = BM25Retriever.from_documents(docs)
-    bm25.k = 12  # top lexical
+    # Index lexical persisté par index_open_faiss.py (postings CSR, lignes = lignes FAISS)
+    bm25 = BM25Index.load(index_dir, store.rows_hash)
+    if bm25 is None:
+        print("⚠️  index BM25 absent ou périmé : reconstruction en mémoire (relancer index_open_faiss.py)")
+        bm25 = BM25Index.from_texts(store.texts())
 
-    return vs, bm25
+    return emb, index, store, bm25
 
 # ---------- API de recherche ----------
 class HybridSearcher:
-    def __init__(self):
-        self.vs, self.bm25 = load_retrievers()
+    def __init__(self, cache_size: int = CACHE_SIZE, cache_ttl: Optional[float] = CACHE_TTL,
+                 nprobe: Optional[int] = ANN_NPROBE, ef_search: Optional[int] = ANN_EF_SEARCH,
+                 parallel: bool = PARALLEL_BRANCHES, dense_timeout: Optional[float] = DENSE_TIMEOUT,
+                 sparse_timeout: Optional[float] = SPARSE_TIMEOUT, workers: int = BRANCH_WORKERS,
+                 metrics: Optional[Metrics] = None, index_dir: str = INDEX_DIR,
+                 embed_model: str = EMBED_MODEL, embed_backend: str = EMBED_BACKEND,
+                 onnx_dir: Optional[str] = None, fusion: str = FUSION_MODE,
+                 fusion_weights: Sequence[float] = FUSION_WEIGHTS):
+        if fusion not in FUSION_MODES:
+            raise ValueError(f"mode de fusion inconnu : {fusion} ({', '.join(FUSION_MODES)})")
+        self.fusion, self.fusion_weights = fusion, tuple(fusion_weights)
+        self.index_dir, self.embed_model = index_dir, embed_model
+        self.embed_backend, self.onnx_dir = embed_backend, onnx_dir
+        self.nprobe, self.ef_search = nprobe, ef_search
+        self.metrics = metrics or METRICS
+        self.dense_timeout, self.sparse_timeout = dense_timeout, sparse_timeout
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="hybrid") if parallel else None
+        self._stragglers: Dict[str, Future] = {}  # branche → dernier calcul hors budget encore en cours
+        # état de l'index, remplacé d'un bloc au rechargement (un seul rechargement à la fois)
+        self._reload_lock = threading.Lock()
+        self._state = self._load_state(index_fingerprint(index_dir))
+        self._checked_at = time.monotonic()
+        # 3 niveaux : réécriture, embedding de q2, résultats finaux (q, k_dense, k_final)
+        self._rewrites = TTLCache(cache_size, cache_ttl)
+        self._embeddings = TTLCache(cache_size, cache_ttl)
+        self._results = TTLCache(cache_size, cache_ttl)
+        self.metrics.register_caches("search", self.cache_stats)
+
+    def _load_state(self, fingerprint: Tuple) -> IndexState:
+        # snapshot de démarrage (INDEX_DIR/warm) : modèle local + réécritures / embeddings pré-calculés
+        warm = load_snapshot(self.index_dir, self.embed_model, EXPAND, self.embed_backend)
+        # le modèle local du snapshot ne sert qu'à torch ; l'export ONNX est vérifié sur le nom du modèle
+        model = warm.model_dir if warm and self.embed_backend == "torch" else self.embed_model
+        emb, index, store, bm25 = load_retrievers(self.index_dir, model, self.embed_backend, self.onnx_dir)
+        set_search_params(index, self.nprobe, self.ef_search)
+        # signaux domaine / boost pré-calculés par index_open_faiss.py (lignes FAISS)
+        signals = load_signals(self.index_dir, index.ntotal, store.rows_hash, DOMAIN_TERMS, BOOST_TERMS)
+        if signals is None:
+            print("⚠️  signals.npy absent ou périmé : filtrage sur le texte (relancer index_open_faiss.py)")
+        return IndexState(fingerprint, warm, emb, index, store, bm25, signals)
+
+    # état courant, en lecture (bench, outils) ; une recherche passe l'état qu'elle a lu
+    @property
+    def emb(self):
+        return self._state.emb
+
+    @property
+    def index(self):
+        return self._state.index
+
+    @property
+    def store(self) -> ChunkStore:
+        return self._state.store
+
+    @property
+    def bm25(self) -> BM25Index:
+        return self._state.bm25
+
+    def _check_index(self) -> None:
+        """Recharge l'index et vide les caches si INDEX_DIR a été reconstruit. Le nouvel état est
+        construit à part puis publié d'un bloc ; pendant ce temps les autres threads servent l'ancien."""
+        if time.monotonic() - self._checked_at < INDEX_CHECK_EVERY:
+            return
+        if not self._reload_lock.acquire(blocking=False):
+            return  # vérification / rechargement déjà en cours dans un autre thread
+        try:
+            now = time.monotonic()
+            if now - self._checked_at < INDEX_CHECK_EVERY:
+                return
+            self._checked_at = now
+            fp = index_fingerprint(self.index_dir)
+            if fp == self._state.fingerprint:
+                return
+            try:
+                state = self._load_state(fp)
+            except Exception as e:  # index en cours d'écriture : on réessaiera plus tard
+                print(f"⚠️  rechargement de l'index impossible ({e})")
+                return
+            self._state = state
+            self.clear_cache()
+        finally:
+            self._reload_lock.release()
+
+    def clear_cache(self) -> None:
+        for c in (self._rewrites, self._embeddings, self._results):
+            c.clear()
+
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            "rewrite": self._rewrites.stats(),
+            "embedding": self._embeddings.stats(),
+            "results": self._results.stats(),
+        }
+
+    def _rewrite(self, q: str, st: Optional[IndexState] = None) -> str:
+        warm = (st or self._state).warm
+        q2 = self._rewrites.get(q)
+        if q2 is None:
+            q2 = warm.rewrites.get(q) if warm else None
+            if q2 is None:
+                q2 = rewrite(q)
+            self._rewrites.put(q, q2)
+        return q2
+
+    def _embed_many(self, q2s: List[str], trace: Optional[Dict[str, float]] = None,
+                    st: Optional[IndexState] = None) -> List[List[float]]:
+        """Embeddings des requêtes ; les absents du cache passent en un seul forward pass."""
+        st = st or self._state
+        vecs = [self._embeddings.get(q2) for q2 in q2s]
+        if st.warm:
+            vecs = [st.warm.vectors.get(q2) if v is None else v for q2, v in zip(q2s, vecs)]
+        missing = [i for i, v in enumerate(vecs) if v is None]
+        if missing:
+            with self.metrics.span("embedding", trace):
+                fresh = st.emb.embed_documents([q2s[i] for i in missing])
+            for i, v in zip(missing, fresh):
+                vecs[i] = v
+                if st is self._state:  # pas d'entrée d'un encodeur remplacé entre-temps
+                    self._embeddings.put(q2s[i], v)
+        return vecs
+
+    def embed_query(self, q: str) -> np.ndarray:
+        """Embedding de la question telle quelle, sans expansion (clé du cache de réponses d'app.py)."""
+        return np.asarray(self._embed_many([normalize_query(q)])[0], dtype=np.float32)
+
+    def _dense_many(self, vecs: List[List[float]], k: int, trace: Optional[Dict[str, float]] = None,
+                    part: Optional[Partition] = None, st: Optional[IndexState] = None) -> List[np.ndarray]:
+        """Une seule recherche FAISS multi-lignes → classement (id, rang, cosinus) par requête.
+        Avec `part`, le sélecteur restreint la recherche aux lignes du filtre (dans FAISS)."""
+        st = st or self._state
+        with self.metrics.span("faiss", trace):
+            xq = np.array(vecs, dtype=np.float32)
+            if part is None:
+                dists, indices = st.index.search(xq, k)
+            else:
+                dists, indices = search_subset(st.index, xq, k, part.selector, part.size)
+        ids = st.store.ids
+        # distance L2² entre vecteurs normalisés → cosinus ; -1 : moins de k lignes disponibles
+        return [make_run(ids[irow[irow != -1]], 1.0 - drow[irow != -1] / 2)
+                for drow, irow in zip(dists, indices)]
+
+    def _sparse_many(self, q2s: List[str], trace: Optional[Dict[str, float]] = None,
+                     part: Optional[Partition] = None, st: Optional[IndexState] = None) -> List[np.ndarray]:
+        """BM25 pour tout le lot (postings des seuls termes des requêtes, top-k partiel)."""
+        st = st or self._state
+        with self.metrics.span("bm25", trace):
+            hits = st.bm25.search_many([tokenize(q2) for q2 in q2s], BM25_K,
+                                       None if part is None else part.mask)
+        return [make_run(st.store.ids[rows], scores) for rows, scores in hits]
+
+    def _dense_branch(self, q2s: List[str], k: int, trace: Optional[Dict[str, float]] = None,
+                      part: Optional[Partition] = None, st: Optional[IndexState] = None) -> List[np.ndarray]:
+        return self._dense_many(self._embed_many(q2s, trace, st), k, trace, part, st)
+
+    def _branches(self, q2s: List[str], k_dense: int, trace: Optional[Dict[str, float]] = None,
+                  part: Optional[Partition] = None, st: Optional[IndexState] = None):
+        """Branches dense et lexicale, en parallèle sur le pool, chacune dans son budget.
+        Renvoie (dense, sparse, complet) ; une branche hors budget ou en erreur → classements vides.
+        Une branche dont le dernier calcul hors budget tourne encore n'est pas soumise (sauf si
+        les deux sont dans ce cas)."""
+        if self._pool is None:
+            return (self._dense_branch(q2s, k_dense, trace, part, st), self._sparse_many(q2s, trace, part, st),
+                    True)
+        busy = {name for name, fut in list(self._stragglers.items()) if not fut.done()}
+        if len(busy) == 2:
+            busy = set()  # aucune branche libre : on retente les deux plutôt que rien
+        start = time.monotonic()
+        branches = {"dense": (self._dense_branch, (q2s, k_dense, trace, part, st)),
+                    "sparse": (self._sparse_many, (q2s, trace, part, st))}
+        futures: Dict[str, Future] = {}
+        for name, (fn, args) in branches.items():
+            if name in busy:
+                self.metrics.inc("branch_degraded", branch=name, reason="busy")
+                print(f"⚠️  branche {name} occupée (calcul hors budget) : ignorée pour cette requête")
+            else:
+                futures[name] = self._pool.submit(fn, *args)
+        budgets = {"dense": self.dense_timeout, "sparse": self.sparse_timeout}
+        results: Dict[str, List[np.ndarray]] = {}
+        late: Dict[str, Future] = {}
+        for name, fut in futures.items():
+            budget = budgets[name]
+            try:
+                results[name] = fut.result(
+                    timeout=None if budget is None else max(0.0, budget - (time.monotonic() - start)))
+            except FutureTimeout:
+                late[name] = fut
+                self.metrics.inc("branch_degraded", branch=name, reason="timeout")
+                print(f"⚠️  branche {name} hors budget ({budget * 1000:.0f} ms) : ignorée pour cette requête")
+            except Exception as e:
+                self.metrics.inc("branch_degraded", branch=name, reason="error")
+                print(f"⚠️  branche {name} en échec ({e}) : ignorée pour cette requête")
+        if not results:
+            # rien dans le budget : on prend la première qui aboutit plutôt que rien
+            names = {fut: name for name, fut in late.items()}
+            for fut in as_completed(late.values()):
+                if fut.exception() is None:
+                    results[names[fut]] = fut.result()
+                    break
+            else:
+                raise RuntimeError("recherche impossible : branches dense et lexicale en échec")
+        for name, fut in late.items():
+            # encore en file → annulée ; déjà démarrée → suivie jusqu'à sa fin (cf. busy)
+            if not fut.done() and not fut.cancel():
+                self._stragglers[name] = fut
+        empty = [np.zeros(0, dtype=RUN_DTYPE) for _ in q2s]
+        return results.get("dense", empty), results.get("sparse", empty), len(results) == 2
+
+    def warmup(self) -> None:
+        """Premier passage complet (torch, pages mmap de FAISS / BM25) hors requête utilisateur."""
+        st = self._state
+        vecs = st.emb.embed_documents([WARMUP_QUERY])
+        self._dense_many(vecs, 1, st=st)
+        self._sparse_many([WARMUP_QUERY], st=st)
+
+    def close(self) -> None:
+        """Arrête le pool de threads (les branches en cours se terminent)."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def search(self, q: str, k_dense: int = 12, k_final: int = 5,
+               trace: Optional[Dict[str, float]] = None, filters: Optional[Filters] = None):
+        return self.search_many([q], k_dense=k_dense, k_final=k_final, trace=trace, filters=filters)[0]
+
+    async def asearch(self, q: str, k_dense: int = 12, k_final: int = 5,
+                      trace: Optional[Dict[str, float]] = None, filters: Optional[Filters] = None):
+        """Variante async (handlers Gradio) : la recherche tourne hors de la boucle d'événements."""
+        # pas sur self._pool : la requête y attendrait ses propres branches
+        return await asyncio.to_thread(self.search, q, k_dense, k_final, trace, filters)
+
+    def search_many(self, queries: List[str], k_dense: int = 12, k_final: int = 5,
+                    trace: Optional[Dict[str, float]] = None, filters: Optional[Filters] = None):
+        """Recherche par lot : renvoie [(résultats, q2), …] dans l'ordre des requêtes.
+        `trace` (optionnel) reçoit la durée en ms de chaque étape, cumulée sur le lot.
+        `filters` restreint FAISS et BM25 aux lignes correspondantes ; chaque requête reçoit
+        exactement k_final résultats tant que le filtre retient assez de chunks."""
+        with self.metrics.span("search", trace):
+            return self._search_many(queries, k_dense, k_final, trace, filter_key(filters))
+
+    def _search_many(self, queries: List[str], k_dense: int, k_final: int,
+                     trace: Optional[Dict[str, float]], fkey: Tuple):
+        self._check_index()
+        st = self._state  # lu une fois : un rechargement concurrent ne mélange pas deux index
+        part = st.partition(fkey)
+        out: List[Optional[Tuple[List[Document], str]]] = [None] * len(queries)
+        todo: Dict[str, List[int]] = {}  # requête normalisée → positions (doublons du lot)
+        for i, q in enumerate(queries):
+            q = normalize_query(q)
+            hit = self._results.get((q, k_dense, k_final, fkey))
+            if hit is not None:
+                out[i] = (list(hit[0]), hit[1])
+            else:
+                todo.setdefault(q, []).append(i)
+        if not todo:
+            return out
+
+        uniq = list(todo)
+        with self.metrics.span("rewrite", trace):
+            q2s = [self._rewrite(q, st) for q in uniq]
+
+        # denses + scores ‖ lexical (top BM25_K), dans la partition du filtre s'il y en a un
+        dense, sparse, complete = self._branches(q2s, max(k_dense, k_final), trace, part, st)
+
+        m = self.metrics
+        # fusion de tout le lot en une passe, sur les identifiants stables des chunks
+        with m.span("fusion", trace):
+            fused_ids = fuse_many([dense, sparse], max(k_final * 3, 12), self.fusion, self.fusion_weights)
+        for q, q2, d_run, s_run, (ids, _) in zip(uniq, q2s, dense, sparse, fused_ids):
+            m.count("faiss", len(d_run))
+            m.count("bm25", len(s_run))
+            fused = st.store.rows_of(ids).tolist()
+            m.count("fusion", len(fused))
+            with m.span("is_domain", trace):
+                filtered = [r for r in fused if st.is_domain(r)]
+            m.count("is_domain", len(filtered))
+            with m.span("boost_rank", trace):
+                ranked = st.boost_rank(filtered)[:k_final]
+                if len(ranked) < k_final:  # complété dans l'ordre de fusion par les chunks hors domaine
+                    kept = set(ranked)
+                    ranked += [r for r in fused if r not in kept][:k_final - len(ranked)]
+            # seuls les résultats finaux deviennent des Document
+            with m.span("documents", trace):
+                results = [st.store.document(r) for r in ranked]
+            # un résultat dégradé (une seule branche) ou calculé sur un index remplacé n'est pas mis en cache
+            if complete and st is self._state:
+                self._results.put((q, k_dense, k_final, fkey), (results, q2))
+            for i in todo[q]:
+                out[i] = (list(results), q2)
+        return out
+
+# ---------- Chargement en arrière-plan (apps) ----------
+class SearcherLoader:
+    """Construit et chauffe HybridSearcher dans un thread : l'UI démarre sans attendre l'index.
+    ready() sert de sonde de disponibilité ; get() / aget() attendent la fin du chargement."""
+
+    def __init__(self, **kwargs: Any):
+        self.searcher: Optional[HybridSearcher] = None
+        self.error: Optional[BaseException] = None
+        self.timings: Dict[str, float] = {}  # secondes : load, warmup
+        self._done = threading.Event()
+        threading.Thread(target=self._run, args=(kwargs,), name="searcher-loader", daemon=True).start()
 
-    def search(self, q: str, k_dense: int = 12, k_final: int = 5):
-        q2 = rewrite(q)
+    def _run(self, kwargs: Dict[str, Any]) -> None:
+        try:
+            t = time.perf_counter()
+            hs = HybridSearcher(**kwargs)
+            self.timings["load"] = time.perf_counter() - t
+            t = time.perf_counter()
+            hs.warmup()
+            self.timings["warmup"] = time.perf_counter() - t
+            for stage, seconds in self.timings.items():
+                hs.metrics.observe(f"startup_{stage}", seconds)
+            self.searcher = hs
+            print(f"Hybrid search prêt ✅ ({self.timings['load']:.1f}s chargement, "
+                  f"{self.timings['warmup']:.1f}s chauffe)")
+        except Exception as e:
+            self.error = e
+            print(f"⚠️  chargement de la recherche impossible ({e})")
+        finally:
+            self._done.set()
 
-        # denses + scores
-        dense = self.vs.similarity_search_with_score(q2, k=k_dense)
+    def ready(self) -> bool:
+        return self.searcher is not None
 
-        # lexical — utiliser .invoke() (évite le warning deprecation)
-        sparse = self.bm25.invoke(q2)
+    def get(self, timeout: Optional[float] = None) -> HybridSearcher:
+        if not self._done.wait(timeout):
+            raise TimeoutError("recherche en cours de chargement")
+        if self.searcher is None:
+            raise RuntimeError("chargement de la recherche impossible") from self.error
+        return self.searcher
 
-        fused = rrf(dense, sparse, topk=max(k_final * 3, 12))
-        filtered = [d for d in fused if is_domain(d)]
-        candidates = filtered or fused
-        results = boost_rank(candidates)[:k_final]
-        return results, q2
+    async def aget(self) -> HybridSearcher:
+        return await asyncio.to_thread(self.get)
 
 # ---------- CLI ----------
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Recherche hybride interactive (FAISS + BM25).")
+    ap.add_argument("--profile", action="store_true", help="détail des durées par étape après chaque requête")
+    ap.add_argument("--metrics-json", help="écrit les métriques agrégées (JSON) en quittant")
+    ap.add_argument("--backend", default=EMBED_BACKEND, choices=BACKENDS, help="encodeur des requêtes")
+    ap.add_argument("--fusion", default=FUSION_MODE, choices=FUSION_MODES, help="mode de fusion dense + BM25")
+    ap.add_argument("--filter", action="append", default=[], metavar="CHAMP=VALEUR",
+                    help="ex. language=fr, split=wiki_en, source_type=wiki (répétable)")
+    args = ap.parse_args()
+    filters: Dict[str, List[str]] = {}
+    for f in args.filter:
+        field, _, value = f.partition("=")
+        filters.setdefault(field.strip(), []).append(value.strip())
+    hs = None
     try:
-        hs = HybridSearcher()
+        hs = HybridSearcher(embed_backend=args.backend, fusion=args.fusion)
         print("Hybrid search prêt ✅ (FAISS + BM25).")
         while True:
             q = input("\nTa question (ENTER pour quitter): ").strip()
             if not q:
                 break
-            hits, q2 = hs.search(q)
+            trace: Dict[str, float] = {}
+            hits, q2 = hs.search(q, trace=trace, filters=filters)
             print(f"\nQuery réécrite: {q2}")
             if not hits:
                 print("Aucun résultat.")
-                continue
             for i, d in enumerate(hits, 1):
                 title = d.metadata.get("title")
                 url = d.metadata.get("url")
                 lang = d.metadata.get("language")
                 snippet = d.page_content[:160].replace("\n", " ")
                 print(f"{i}. {title} [{lang}] — {url}\n   {snippet} …")
-    except KeyboardInterrupt:
+            if args.profile:
+                print("\n⏱  étapes :" + (" (résultat en cache)" if len(trace) == 1 else ""))
+                print(format_trace(trace))
+    except (KeyboardInterrupt, EOFError):
         pass
+    finally:
+        if hs is not None and args.profile:
+            print("\n" + hs.metrics.to_prometheus())
+        if hs is not None and args.metrics_json:
+            hs.metrics.dump_json(args.metrics_json)
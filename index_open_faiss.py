@@ -1,34 +1,117 @@
 # index_open_faiss.py — construit un index FAISS à partir du dataset open
-from datasets import load_dataset, DatasetDict
+# Mode incrémental par défaut : seuls les chunks nouveaux sont embeddés (cache disque par hash),
+# les chunks disparus sont supprimés de l'index existant.
+# Pipeline en flux : lignes du dataset → chunk() → lots d'embeddings sur un pool de processus
+# → ajout à FAISS au fil de l'eau (mémoire bornée par le nombre de lots en vol). Aucun Document
+# n'est gardé : les textes vont dans le chunk store, les vecteurs dans un index FAISS brut (pas de
+# docstore pickle), et BM25 / signaux sont calculés en relisant le chunk store.
+# Les chunks quasi dupliqués (mêmes paragraphes recopiés d'un article à l'autre, cf. near_dup.py) sont
+# écartés avant l'embedding : une seule copie canonique par langue, les autres restent citables via
+# le chunk store (renvois dups.npy).
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import sqlite3
+import time
+
+import faiss
+import numpy as np
+from datasets import load_dataset
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_core.documents import Document
 from tqdm import tqdm
-import re
+
+from ann_index import (INDEX_FILE, build_ann, evaluate, load_index_meta, print_report, remove_ann, save_ann,
+                       save_index_meta)
+from bm25_index import BM25Index, faiss_rows_hash
+from chunk_store import ChunkStore, ChunkStoreWriter, stable_id
+from hybrid_search import DOMAIN_TERMS, BOOST_TERMS
+from near_dup import THRESHOLD as DEDUP_THRESHOLD, NearDupIndex
+from term_signals import compute_signals, save_signals
 
 DATASET_ID = "lmhdii/experiment-brief-open"  # ← laisse ton ID
 INDEX_DIR = "faiss_open_index"
+EMBED_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+EMB_CACHE = "emb_cache.sqlite"  # cache disque des embeddings de chunks (hors INDEX_DIR)
 
-def chunk(text, size=900, overlap=150):
+BATCH_SIZE = 256                                    # chunks par lot d'embeddings
+WORKERS = min(4, max(1, (os.cpu_count() or 2) // 2))  # processus d'embedding (0 = dans le processus principal)
+
+def chunk_spans(text, size=900, overlap=150):
+    """Texte normalisé + fenêtres (début, fin) en caractères."""
     text = re.sub(r"\s+", " ", text or "").strip()
-    out, i = [], 0
+    spans, i = [], 0
     while i < len(text):
-        out.append(text[i:i+size])
+        spans.append((i, min(i + size, len(text))))
         i += max(size - overlap, 1)
-    return out
+    return text, spans
 
-print("→ Loading dataset…")
-dsd = DatasetDict()
-for split in ["wiki_en", "wiki_fr"]:
-    try:
-        dsd[split] = load_dataset(DATASET_ID, split=split)
-        print(f"  {split}: {len(dsd[split])} rows")
-    except Exception as e:
-        print(f"  skip {split} ({e})")
-
-docs = []
-for split, ds in dsd.items():
-    for r in tqdm(ds, desc=f"chunk {split}"):
+def chunk(text, size=900, overlap=150):
+    text, spans = chunk_spans(text, size, overlap)
+    return [text[a:b] for a, b in spans]
+
+def chunk_id(meta: Dict, text: str, model: str = EMBED_MODEL) -> str:
+    """Identifiant docstore déterministe : modèle + métadonnées + texte du chunk."""
+    h = hashlib.sha1(model.encode("utf-8"))
+    h.update(json.dumps(meta, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+def embedding_key(text: str, model: str = EMBED_MODEL) -> str:
+    """Clé du cache d'embeddings : modèle + texte (partagée entre chunks identiques)."""
+    return hashlib.sha1(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+# ---------- Cache d'embeddings ----------
+class EmbeddingCache:
+    """Embeddings de chunks persistés dans SQLite, indexés par embedding_key()."""
+
+    def __init__(self, path: str = EMB_CACHE):
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS emb (key TEXT PRIMARY KEY, vec BLOB)")
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        for i in range(0, len(keys), 500):  # limite de variables SQLite
+            batch = keys[i:i+500]
+            marks = ",".join("?" * len(batch))
+            for key, blob in self.db.execute(f"SELECT key, vec FROM emb WHERE key IN ({marks})", batch):
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items: List[Tuple[str, np.ndarray]]) -> None:
+        self.db.executemany(
+            "INSERT OR REPLACE INTO emb (key, vec) VALUES (?, ?)",
+            ((k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in items),
+        )
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+# ---------- Corpus → chunks (générateurs) ----------
+def iter_rows(streaming: bool = True) -> Iterator[Tuple[str, Dict]]:
+    """Lignes (split, row) du dataset, lues en flux depuis le Hub."""
+    for split in ["wiki_en", "wiki_fr"]:
+        try:
+            ds = load_dataset(DATASET_ID, split=split, streaming=streaming)
+        except Exception as e:
+            print(f"  skip {split} ({e})")
+            continue
+        yield from ((split, r) for r in ds)
+
+def iter_chunks(rows: Iterable[Tuple[str, Dict]],
+                store: Optional[ChunkStoreWriter] = None) -> Iterator[Tuple[str, str, Dict]]:
+    """(identifiant, texte, métadonnées) de chaque chunk ; identifiants uniques et stables.
+
+    Si `store` est fourni, le texte de chaque article y est écrit une fois avec les offsets de ses chunks.
+    """
+    seen: Dict[str, int] = {}
+    for split, r in rows:
         meta = {
             "id": r["id"],
             "title": r["title"],
@@ -37,28 +120,280 @@ for split, ds in dsd.items():
             "source_type": r["source_type"],
             "split": split,
         }
-        for c in chunk(r["text"]):
-            docs.append(Document(page_content=c, metadata=meta))
-
-print(f"→ Total chunks: {len(docs)}")
-
-# Multilingue FR/EN
-emb = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-    encode_kwargs={"normalize_embeddings": True}
-)
-
-print("→ Building FAISS…")
-vs = FAISS.from_documents(docs, emb)
-vs.save_local(INDEX_DIR)
-print(f"✅ Saved index to ./{INDEX_DIR}")
-
-# Smoke test
-q = "Qu'est-ce qu'un SRM en A/B testing et comment le diagnostiquer ?"
-retriever = vs.as_retriever(search_kwargs={"k": 5})
-hits = retriever.invoke(q)
-
-print("\nTop-5 résultats :")
-for i, d in enumerate(hits, 1):
-    print(f"{i}. {d.metadata.get('title')} [{d.metadata.get('language')}] — {d.metadata.get('url')}")
-    print("   ", d.page_content[:140].replace("\n", " "), "…")
+        text, spans = chunk_spans(r["text"])
+        if store is not None:
+            art = store.add_article(meta, text)
+            # offset UTF-8 (octets) de chaque position de caractère
+            pos = range(len(text) + 1) if text.isascii() else \
+                np.cumsum([0] + [len(ch.encode("utf-8")) for ch in text]).tolist()
+        for a, b in spans:
+            c = text[a:b]
+            cid = chunk_id(meta, c)
+            n = seen.get(cid, 0)
+            seen[cid] = n + 1
+            if n:
+                cid = f"{cid}-{n}"  # même fenêtre répétée dans l'article
+            if store is not None:
+                store.add_chunk(cid, art, pos[a], pos[b])
+            yield cid, c, meta
+
+def batched(it: Iterable, n: int) -> Iterator[List]:
+    batch = []
+    for x in it:
+        batch.append(x)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def dedupe_chunks(chunks: Iterable[Tuple[str, str, Dict]], dedup: NearDupIndex,
+                  store: Optional[ChunkStoreWriter] = None) -> Iterator[Tuple[str, str, Dict]]:
+    """Ne laisse passer que les copies canoniques (première occurrence dans l'ordre du dataset) ;
+    les quasi-doublons sont enregistrés comme renvois dans `store` et ne sont jamais embeddés.
+    Ils n'entrent pas non plus dans `seen` : une mise à jour incrémentale les retire de l'index.
+    Les candidats LSH sont confirmés par Jaccard exact des shingles (NearDupIndex.add)."""
+    for cid, text, meta in chunks:
+        canonical = dedup.add(cid, text, meta["language"])
+        if canonical is None:
+            yield cid, text, meta
+        elif store is not None:
+            store.add_duplicate(cid, canonical)
+
+def print_dedup_report(report: Dict, dim: int) -> None:
+    print(f"  near-duplicates: {report['dropped']}/{report['chunks']} chunks dropped "
+          f"({report['shrink']:.1%}, Jaccard ≥ {report['threshold']}) · "
+          f"~{report['dropped'] * dim * 4 / 2**20:.1f} MiB of vectors saved")
+    for lang, r in report["by_language"].items():
+        print(f"    [{lang}] {r['kept']} kept / {r['dropped']} dropped")
+
+def iter_chunks_new(chunks: Iterable[Tuple[str, str, Dict]], existing: set,
+                    seen: set) -> Iterator[Tuple[int, str]]:
+    """Enregistre les identifiants stables vus et ne laisse passer que les chunks absents de l'index."""
+    for cid, text, _ in chunks:
+        sid = stable_id(cid)
+        seen.add(sid)
+        if sid not in existing:
+            yield sid, text
+
+# ---------- Workers d'embedding ----------
+_WORKER_EMB = None
+
+def _init_worker(model: str, threads: int) -> None:
+    global _WORKER_EMB
+    import torch
+    torch.set_num_threads(threads)
+    _WORKER_EMB = HuggingFaceEmbeddings(model_name=model, encode_kwargs={"normalize_embeddings": True})
+
+def _embed_batch(texts: List[str]) -> np.ndarray:
+    return np.asarray(_WORKER_EMB.embed_documents(texts), dtype=np.float32)
+
+# ---------- Construction / mise à jour ----------
+def load_existing() -> Tuple[Optional[faiss.Index], List[int]]:
+    """Index exact et identifiants stables de ses lignes (chunk store), ou (None, []) si inutilisables."""
+    path = os.path.join(INDEX_DIR, INDEX_FILE)
+    if not os.path.exists(path):
+        return None, []
+    try:
+        old = ChunkStore(INDEX_DIR)
+        ids = np.array(old.ids).tolist()
+        index = faiss.read_index(path)
+    except (OSError, ValueError, KeyError, RuntimeError) as e:
+        print(f"⚠️  index existant illisible ({e}) : reconstruction complète")
+        return None, []
+    meta = load_index_meta(INDEX_DIR)
+    if len(ids) != index.ntotal or (meta and meta.get("faiss_rows") != old.rows_hash):
+        print("⚠️  chunk store désynchronisé de l'index existant : reconstruction complète")
+        return None, []
+    return index, ids
+
+def build_index(chunks: Iterable[Tuple[str, str, Dict]], emb, cache: EmbeddingCache,
+                incremental: bool = True, workers: int = WORKERS,
+                batch_size: int = BATCH_SIZE) -> Tuple[faiss.Index, List[int]]:
+    """Met à jour l'index existant (ajouts / suppressions) ou le reconstruit, en flux.
+    Renvoie l'index exact et l'identifiant stable de chacune de ses lignes.
+
+    Les lots sont embeddés en parallèle mais ajoutés dans l'ordre de soumission (build déterministe) ;
+    au plus 2 × workers lots sont en vol (contre-pression sur le générateur de chunks).
+    """
+    index, row_ids = load_existing() if incremental else (None, [])
+    existing = set(row_ids)
+    if index is not None:
+        print(f"→ Incremental update of {len(existing)} chunks…")
+    else:
+        print("→ Building FAISS…")
+
+    pool = None  # démarré au premier lot à embedder (rien à charger si tout est en cache)
+    max_inflight = max(1, 2 * workers)
+    pending: deque = deque()  # (ids, textes, vecteurs, indices manquants, future)
+    seen: set = set()
+    n_new = n_cached = 0
+    progress = tqdm(unit="chunk", desc="embed")
+    t0 = time.perf_counter()
+
+    def drain(limit: int) -> None:
+        nonlocal index, n_new
+        while len(pending) > limit:
+            ids, texts, vectors, missing, fut = pending.popleft()
+            if fut is not None:
+                fresh = fut.result()
+                cache.put_many([(embedding_key(texts[i]), v) for i, v in zip(missing, fresh)])
+                for i, v in zip(missing, fresh):
+                    vectors[i] = v
+            xb = np.asarray(vectors, dtype=np.float32)
+            if index is None:
+                index = faiss.IndexFlatL2(xb.shape[1])
+            index.add(xb)
+            row_ids.extend(ids)
+            progress.update(len(ids))
+            n_new += len(ids)
+
+    try:
+        for batch in batched(iter_chunks_new(chunks, existing, seen), batch_size):
+            ids, texts = (list(x) for x in zip(*batch))
+            keys = [embedding_key(t) for t in texts]
+            found = cache.get_many(list(set(keys)))
+            vectors = [found.get(k) for k in keys]
+            missing = [i for i, v in enumerate(vectors) if v is None]
+            n_cached += len(texts) - len(missing)
+            fut: Optional[Future] = None
+            if missing and workers > 0:
+                if pool is None:
+                    threads = max(1, (os.cpu_count() or 1) // workers)
+                    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                               initializer=_init_worker, initargs=(EMBED_MODEL, threads))
+                fut = pool.submit(_embed_batch, [texts[i] for i in missing])
+            elif missing:
+                fut = Future()
+                fut.set_result(np.asarray(emb.embed_documents([texts[i] for i in missing]),
+                                          dtype=np.float32))
+            pending.append((ids, texts, vectors, missing, fut))
+            drain(max_inflight)
+        drain(0)
+    finally:
+        progress.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    dt = time.perf_counter() - t0
+    print(f"  {n_new} chunks embedded/added in {dt:.1f}s ({n_new / dt if dt else 0:.1f} chunks/s, "
+          f"{n_cached} from cache)")
+
+    removed = [r for r, i in enumerate(row_ids) if i not in seen]
+    if removed:  # IndexFlat : suppression par numéro de ligne, l'ordre des lignes restantes est gardé
+        index.remove_ids(faiss.IDSelectorBatch(np.asarray(removed, dtype=np.int64)))
+        row_ids = [i for i in row_ids if i in seen]
+    if existing:
+        print(f"  +{n_new} / -{len(removed)} chunks ({len(existing) - len(removed)} kept)")
+    if index is None or not index.ntotal:
+        raise SystemExit("Aucun chunk à indexer.")
+    return index, row_ids
+
+def write_sidecars(index: faiss.Index, row_ids: List[int], store: ChunkStoreWriter,
+                   index_spec: str = "Flat") -> str:
+    """Fichiers dérivés, alignés sur l'ordre final des lignes FAISS (chunk store, signaux, BM25) ;
+    signaux et BM25 relisent les textes dans le chunk store (en flux, sans docstore).
+    Écrits avant index.faiss (save_index) ; renvoie l'empreinte des lignes."""
+    rows_hash = faiss_rows_hash(str(i) for i in row_ids)
+
+    # Chunk store colonnaire (texte par article + offsets)
+    store.close(row_ids, rows_hash)
+    chunks = ChunkStore(INDEX_DIR)
+
+    # Signaux domaine / boost SRM
+    print("→ Precomputing domain / boost signals…")
+    signals = compute_signals((chunks.document(r) for r in range(len(chunks))), DOMAIN_TERMS, BOOST_TERMS)
+    save_signals(INDEX_DIR, signals, rows_hash, DOMAIN_TERMS, BOOST_TERMS)
+    print(f"  {int(signals['domain'].sum())}/{len(signals)} chunks in domain")
+
+    # Index lexical BM25 (postings CSR), lié à l'ordre des lignes FAISS
+    print("→ Building BM25 postings…")
+    bm25 = BM25Index.from_texts(chunks.texts())
+    bm25.save(INDEX_DIR, rows_hash)
+    print(f"  {len(bm25.terms)} terms, {len(bm25.doc_ids)} postings")
+
+    # Index approché / quantifié dérivé de l'index exact + rapport rappel / latence / taille
+    if index_spec.lower() == "flat":
+        remove_ann(INDEX_DIR)
+        return rows_hash
+    print(f"→ Building ANN index ({index_spec})…")
+    xb = index.reconstruct_n(0, index.ntotal)
+    ann = build_ann(xb, index_spec)
+    report = evaluate(index, xb, "Flat") + evaluate(ann, xb, index_spec)
+    print_report(report)
+    save_ann(INDEX_DIR, ann, index_spec, rows_hash, report)
+    return rows_hash
+
+def save_index(index: faiss.Index, rows_hash: str) -> None:
+    """Écriture dans un fichier temporaire puis renommage : les lecteurs qui ont mmappé
+    l'ancien index.faiss (hybrid_search) ne voient jamais un fichier à moitié écrit.
+    Appelé après write_sidecars ; index.json, écrit en tout dernier, valide l'ensemble."""
+    path = os.path.join(INDEX_DIR, INDEX_FILE)
+    faiss.write_index(index, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    save_index_meta(INDEX_DIR, rows_hash, index.ntotal)
+    stale = os.path.join(INDEX_DIR, "index.pkl")  # docstore LangChain des anciennes versions
+    if os.path.exists(stale):
+        os.remove(stale)
+
+def smoke_test(index: faiss.Index, emb) -> None:
+    q = "Qu'est-ce qu'un SRM en A/B testing et comment le diagnostiquer ?"
+    store = ChunkStore(INDEX_DIR)
+    _, rows = index.search(np.asarray([emb.embed_query(q)], dtype=np.float32), 5)
+
+    print("\nTop-5 résultats :")
+    for i, row in enumerate(r for r in rows[0] if r != -1):
+        d = store.document(int(row))
+        print(f"{i + 1}. {d.metadata.get('title')} [{d.metadata.get('language')}] — {d.metadata.get('url')}")
+        print("   ", d.page_content[:140].replace("\n", " "), "…")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Construit / met à jour l'index FAISS + BM25.")
+    ap.add_argument("--full", action="store_true",
+                    help="reconstruit l'index au lieu de le mettre à jour (le cache d'embeddings reste utilisé)")
+    ap.add_argument("--no-cache", action="store_true", help="ignore le cache d'embeddings existant")
+    ap.add_argument("--workers", type=int, default=WORKERS, help="processus d'embedding (0 = aucun pool)")
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="chunks par lot d'embeddings")
+    ap.add_argument("--index-spec", default="Flat",
+                    help="index servi : Flat, IVF, HNSW, IVF-PQ, SQ8, float16 ou chaîne index_factory")
+    ap.add_argument("--no-dedup", action="store_true", help="indexe aussi les chunks quasi dupliqués")
+    ap.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD,
+                    help="Jaccard des shingles au-delà duquel un chunk est un doublon")
+    args = ap.parse_args()
+
+    # Multilingue FR/EN
+    emb = HuggingFaceEmbeddings(
+        model_name=EMBED_MODEL,
+        encode_kwargs={"normalize_embeddings": True}
+    )
+
+    if args.no_cache and os.path.exists(EMB_CACHE):
+        os.remove(EMB_CACHE)
+    cache = EmbeddingCache()
+    store = ChunkStoreWriter(INDEX_DIR)
+    print("→ Streaming dataset…")
+    chunks = iter_chunks(iter_rows(), store)
+    dedup = None if args.no_dedup else NearDupIndex(args.dedup_threshold)
+    if dedup is not None:
+        chunks = dedupe_chunks(chunks, dedup, store)
+    index, row_ids = build_index(chunks, emb, cache, incremental=not args.full,
+                                 workers=args.workers, batch_size=args.batch_size)
+    cache.close()
+    print(f"→ Total chunks: {index.ntotal}")
+    report_path = os.path.join(INDEX_DIR, "dedup.json")
+    if dedup is not None:
+        report = dedup.report()
+        print_dedup_report(report, index.d)
+        with open(report_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        os.replace(report_path + ".tmp", report_path)
+    elif os.path.exists(report_path):
+        os.remove(report_path)
+    # fichiers dérivés d'abord, vecteurs ensuite : un lecteur ne voit jamais les nouveaux
+    # vecteurs avec l'ancien chunk store / BM25 (cf. hybrid_search.load_retrievers)
+    rows_hash = write_sidecars(index, row_ids, store, args.index_spec)
+    save_index(index, rows_hash)
+    print(f"✅ Saved index to ./{INDEX_DIR}")
+
+    # Smoke test
+    smoke_test(index, emb)
@@ -0,0 +1,177 @@
+# metrics.py — Latences par étape (p50/p95/p99), nombre de candidats, compteurs et taux de cache
+# Export texte Prometheus et JSON ; petit serveur HTTP optionnel (/metrics, /metrics.json, /ready).
+# Compatible Python 3.9
+
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+import numpy as np
+
+PREFIX = "rag"
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW = 2048  # derniers échantillons gardés par série (quantiles glissants)
+
+class Summary:
+    """Série d'observations : compte et somme cumulés, quantiles sur une fenêtre glissante."""
+    __slots__ = ("samples", "count", "total")
+
+    def __init__(self, window: int = WINDOW):
+        self.samples: deque = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def snapshot(self) -> Dict[str, float]:
+        qs = (np.percentile(np.fromiter(self.samples, dtype=float), [q * 100 for q in QUANTILES])
+              if self.samples else [float("nan")] * len(QUANTILES))
+        out = {"count": self.count, "sum": self.total}
+        out.update({f"p{round(q * 100)}": float(v) for q, v in zip(QUANTILES, qs)})
+        return out
+
+class Metrics:
+    """Registre thread-safe : latences (secondes) et candidats par étape, compteurs, caches."""
+
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._latency: Dict[str, Summary] = {}
+        self._candidates: Dict[str, Summary] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = defaultdict(float)
+        self._caches: Dict[str, Callable[[], Dict[str, Dict]]] = {}
+
+    def _series(self, table: Dict[str, Summary], stage: str) -> Summary:
+        s = table.get(stage)
+        if s is None:
+            s = table[stage] = Summary(self.window)
+        return s
+
+    def observe(self, stage: str, seconds: float, trace: Optional[Dict[str, float]] = None) -> None:
+        """Durée d'une étape ; `trace` (ms par étape) sert au détail d'une seule requête."""
+        with self._lock:
+            self._series(self._latency, stage).observe(seconds)
+        if trace is not None:
+            trace[stage] = trace.get(stage, 0.0) + seconds * 1000
+
+    @contextmanager
+    def span(self, stage: str, trace: Optional[Dict[str, float]] = None) -> Iterator[None]:
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t, trace)
+
+    def count(self, stage: str, n: int) -> None:
+        """Nombre de candidats en sortie d'une étape."""
+        with self._lock:
+            self._series(self._candidates, stage).observe(n)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def register_caches(self, name: str, stats: Callable[[], Dict[str, Dict]]) -> None:
+        """`stats()` → {cache: {size, hits, misses, hit_rate}} (ex. HybridSearcher.cache_stats)."""
+        self._caches[name] = stats
+
+    def reset(self) -> None:
+        with self._lock:
+            self._latency.clear()
+            self._candidates.clear()
+            self._counters.clear()
+
+    # ---------- Export ----------
+    def to_dict(self) -> Dict:
+        with self._lock:
+            latency = {k: s.snapshot() for k, s in self._latency.items()}
+            candidates = {k: s.snapshot() for k, s in self._candidates.items()}
+            counters = [{"name": n, "labels": dict(lb), "value": v} for (n, lb), v in self._counters.items()]
+        caches = {f"{owner}.{cache}": st for owner, fn in self._caches.items() for cache, st in fn().items()}
+        return {"latency_seconds": latency, "candidates": candidates, "counters": counters, "caches": caches}
+
+    def dump_json(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def to_prometheus(self) -> str:
+        d = self.to_dict()
+        lines = []
+
+        def summary(name: str, help_: str, table: Dict[str, Dict]) -> None:
+            lines.append(f"# HELP {PREFIX}_{name} {help_}")
+            lines.append(f"# TYPE {PREFIX}_{name} summary")
+            for stage, s in sorted(table.items()):
+                for q in QUANTILES:
+                    lines.append(f'{PREFIX}_{name}{{stage="{stage}",quantile="{q}"}} {s[f"p{round(q * 100)}"]}')
+                lines.append(f'{PREFIX}_{name}_sum{{stage="{stage}"}} {s["sum"]}')
+                lines.append(f'{PREFIX}_{name}_count{{stage="{stage}"}} {s["count"]}')
+
+        summary("stage_latency_seconds", "Durée de chaque étape du pipeline.", d["latency_seconds"])
+        summary("stage_candidates", "Candidats en sortie de chaque étape.", d["candidates"])
+
+        seen = set()
+        for c in sorted(d["counters"], key=lambda c: c["name"]):
+            name = f"{PREFIX}_{c['name']}_total"
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter")
+                seen.add(name)
+            labels = ",".join(f'{k}="{v}"' for k, v in sorted(c["labels"].items()))
+            lines.append(f"{name}{{{labels}}} {c['value']}" if labels else f"{name} {c['value']}")
+
+        if d["caches"]:
+            for metric, key, kind in (("cache_hit_ratio", "hit_rate", "gauge"), ("cache_entries", "size", "gauge"),
+                                      ("cache_hits_total", "hits", "counter"),
+                                      ("cache_misses_total", "misses", "counter")):
+                lines.append(f"# TYPE {PREFIX}_{metric} {kind}")
+                for cache, st in sorted(d["caches"].items()):
+                    lines.append(f'{PREFIX}_{metric}{{cache="{cache}"}} {st[key]}')
+        return "\n".join(lines) + "\n"
+
+# ---------- Détail d'une requête (CLI --profile) ----------
+def format_trace(trace: Dict[str, float]) -> str:
+    width = max((len(k) for k in trace), default=0)
+    return "\n".join(f"  {stage:<{width}} {ms:8.2f} ms" for stage, ms in trace.items())
+
+# ---------- Serveur HTTP (scrape Prometheus, sondes) ----------
+def serve(metrics: "Metrics", port: int, host: str = "0.0.0.0",
+          ready: Optional[Callable[[], bool]] = None) -> ThreadingHTTPServer:
+    """Sert /metrics (texte Prometheus) et /metrics.json dans un thread démon, plus les sondes
+    /healthz (processus vivant) et /ready (200 quand `ready()` est vrai, 503 sinon)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_GET(self):
+            status = 200
+            if self.path == "/metrics":
+                body, ctype = metrics.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, ctype = json.dumps(metrics.to_dict()).encode("utf-8"), "application/json"
+            elif self.path == "/healthz":
+                body, ctype = b"ok\n", "text/plain"
+            elif self.path == "/ready":
+                ok = ready is None or ready()
+                status, body, ctype = (200, b"ok\n", "text/plain") if ok else (503, b"loading\n", "text/plain")
+            else:
+                self.send_error(404)
+                return
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+METRICS = Metrics()  # registre par défaut (HybridSearcher, app.py)
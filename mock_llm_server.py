@@ -0,0 +1,123 @@
+# mock_llm_server.py — Faux serveur LLM compatible Groq / OpenAI (chat completions, streaming SSE)
+# Permet de tester app.py hors ligne, sans clé ni quota :
+#   python mock_llm_server.py --port 8008
+#   GROQ_API_BASE=http://127.0.0.1:8008 GROQ_API_KEY=mock python app.py
+# Le client Groq appelle {base}/openai/v1/chat/completions ; /v1/chat/completions est aussi accepté.
+# Compatible Python 3.9 (bibliothèque standard uniquement)
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import threading
+import time
+import uuid
+
+REPLY = ("Réponse simulée : le serveur LLM local renvoie ce texte mot par mot "
+         "pour tester le streaming, le temps jusqu'au premier token et l'annulation.")
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockLLM/0.1"
+
+    # réglés par le CLI
+    reply = REPLY
+    ttft = 0.3        # s avant le premier token
+    token_delay = 0.03  # s entre deux tokens
+    stats = {"requests": 0, "completed": 0, "cancelled": 0}
+    lock = threading.Lock()
+
+    def log_message(self, fmt, *args):  # silencieux (voir /stats pour les compteurs)
+        pass
+
+    def _count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] += 1
+
+    def _json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            return self._json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        if self.path == "/stats":
+            with self.lock:
+                return self._json(200, dict(self.stats))
+        self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+        req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self._count("requests")
+        model = req.get("model", "mock")
+        cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        tokens = [w + " " for w in self.reply.split()]
+        tokens[-1] = tokens[-1].rstrip()
+        usage = {"prompt_tokens": sum(len(m.get("content", "").split()) for m in req.get("messages", [])),
+                 "completion_tokens": len(tokens)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not req.get("stream"):
+            time.sleep(self.ttft + self.token_delay * len(tokens))
+            self._count("completed")
+            return self._json(200, {
+                "id": cid, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(tokens)}}],
+                "usage": usage,
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: dict, finish=None, **extra) -> None:
+            chunk = {"id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish}], **extra}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            time.sleep(self.ttft)
+            event({"role": "assistant", "content": ""})
+            for tok in tokens:
+                event({"content": tok})
+                time.sleep(self.token_delay)
+            event({}, "stop", x_groq={"id": cid, "usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self._count("completed")
+        except (BrokenPipeError, ConnectionResetError):
+            # le client a coupé la connexion (requête annulée côté app) → on arrête de générer
+            self._count("cancelled")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Faux serveur LLM (API chat completions Groq/OpenAI).")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8008)
+    ap.add_argument("--ttft-ms", type=float, default=300, help="délai avant le premier token")
+    ap.add_argument("--token-ms", type=float, default=30, help="délai entre deux tokens")
+    ap.add_argument("--reply", default=REPLY, help="texte renvoyé (découpé en tokens sur les espaces)")
+    args = ap.parse_args()
+
+    MockLLMHandler.reply = args.reply
+    MockLLMHandler.ttft = args.ttft_ms / 1000
+    MockLLMHandler.token_delay = args.token_ms / 1000
+    server = ThreadingHTTPServer((args.host, args.port), MockLLMHandler)
+    print(f"Mock LLM → http://{args.host}:{args.port}  (GROQ_API_BASE=http://{args.host}:{args.port})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        with MockLLMHandler.lock:
+            print(f"\n{MockLLMHandler.stats}")
@@ -0,0 +1,116 @@
+# mock_wiki_server.py — Faux serveur API MediaWiki (action=query) pour tester wiki_fetch.py hors ligne
+#   python mock_wiki_server.py --port 8010 --latency-ms 200
+#   WIKI_API='http://127.0.0.1:8010/{lang}/w/api.php' python build_open_dataset_curated.py --no-push
+# Toute page existe (texte généré à partir du titre) sauf celles de --missing ; la révision dépend du
+# titre et de --revision (l'incrémenter simule une modification de toutes les pages).
+# Compatible Python 3.9 (bibliothèque standard uniquement)
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+import argparse
+import json
+import threading
+import time
+import zlib
+
+class MockWikiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockWiki/0.1"
+
+    # réglés par le CLI
+    latency = 0.0       # s par requête
+    revision = 0        # ajouté à toutes les révisions
+    missing = set()     # titres (canoniques) absents
+    throttle = 0        # toutes les N requêtes : 429 (0 = jamais)
+    stats = {"requests": 0, "info": 0, "extracts": 0, "throttled": 0, "max_in_flight": 0}
+    in_flight = 0
+    lock = threading.Lock()
+
+    def log_message(self, fmt, *args):  # silencieux (voir /stats pour les compteurs)
+        pass
+
+    def _json(self, status: int, payload: dict, headers: dict = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def canonical(title: str) -> str:
+        title = title.replace("_", " ").strip()
+        return title[:1].upper() + title[1:]
+
+    def page(self, lang: str, title: str, extract: bool) -> dict:
+        if title in self.missing:
+            return {"ns": 0, "title": title, "missing": True}
+        revid = zlib.crc32(f"{lang}:{title}".encode("utf-8")) % 10**8 + self.revision
+        p = {"pageid": revid, "ns": 0, "title": title, "lastrevid": revid,
+             "fullurl": f"https://{lang}.wikipedia.org/wiki/{quote(title.replace(' ', '_'))}"}
+        if extract:
+            p["revisions"] = [{"revid": revid, "parentid": revid - 1}]
+            p["extract"] = (f"{title} — page simulée ({lang}, révision {revid}).\n\n"
+                            f"Définition\n{title.lower()} : texte de test pour la récupération concurrente.")
+        return p
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/stats":
+            with self.lock:
+                return self._json(200, dict(self.stats))
+        parts = url.path.strip("/").split("/")
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if len(parts) != 3 or parts[1:] != ["w", "api.php"] or q.get("action") != "query":
+            return self._json(404, {"error": {"code": "badpath", "info": self.path}})
+        lang = parts[0]
+
+        with self.lock:
+            self.stats["requests"] += 1
+            throttled = self.throttle > 0 and self.stats["requests"] % self.throttle == 0
+            self.stats["throttled"] += throttled
+            MockWikiHandler.in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+        try:
+            time.sleep(self.latency)
+            if throttled:
+                return self._json(429, {"error": {"code": "ratelimited"}}, {"Retry-After": "0"})
+            extract = "extracts" in q.get("prop", "").split("|")
+            with self.lock:
+                self.stats["extracts" if extract else "info"] += 1
+            titles = [t for t in q.get("titles", "").split("|") if t]
+            normalized = [{"from": t, "to": self.canonical(t)} for t in titles if self.canonical(t) != t]
+            pages = [self.page(lang, t, extract) for t in dict.fromkeys(map(self.canonical, titles))]
+            query = {"pages": pages}
+            if normalized:
+                query["normalized"] = normalized
+            self._json(200, {"batchcomplete": True, "query": query})
+        finally:
+            with self.lock:
+                MockWikiHandler.in_flight -= 1
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Faux serveur API MediaWiki (action=query).")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8010)
+    ap.add_argument("--latency-ms", type=float, default=100, help="délai par requête")
+    ap.add_argument("--revision", type=int, default=0, help="décalage des révisions (simule des modifications)")
+    ap.add_argument("--missing", action="append", default=[], help="titre absent (répétable)")
+    ap.add_argument("--throttle", type=int, default=0, help="répond 429 toutes les N requêtes")
+    args = ap.parse_args()
+
+    MockWikiHandler.latency = args.latency_ms / 1000
+    MockWikiHandler.revision = args.revision
+    MockWikiHandler.missing = set(args.missing)
+    MockWikiHandler.throttle = args.throttle
+    server = ThreadingHTTPServer((args.host, args.port), MockWikiHandler)
+    print(f"Mock MediaWiki → WIKI_API='http://{args.host}:{args.port}/{{lang}}/w/api.php'")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        with MockWikiHandler.lock:
+            print(f"\n{MockWikiHandler.stats}")
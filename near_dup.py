@@ -0,0 +1,108 @@
+# near_dup.py — Détection des chunks quasi dupliqués (MinHash + LSH par bandes, confirmation exacte)
+# Signature MinHash des shingles de 3 mots de chaque chunk ; deux chunks d'une même langue qui
+# partagent une bande de la signature sont candidats, et seul un Jaccard exact (ensembles de shingles)
+# ≥ THRESHOLD fait du second un renvoi vers le premier (copie canonique). Les fenêtres voisines d'un
+# même article (150 caractères de recouvrement sur 900) restent bien en dessous du seuil.
+# Compatible Python 3.9
+
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import re
+
+import numpy as np
+
+NUM_PERM = 64        # fonctions de hachage de la signature
+BANDS = 8            # 8 bandes × 8 lignes : paires candidates dès ~0.77 de Jaccard
+THRESHOLD = 0.8      # Jaccard exact (shingles) au-delà duquel deux chunks sont des doublons
+SHINGLE = 3          # mots par shingle
+MAX_SLACK = 0.15     # candidats dont le Jaccard estimé est sous THRESHOLD − MAX_SLACK : non vérifiés (~3 σ)
+
+_WORD = re.compile(r"\w+")
+
+def shingle_hashes(text: str, k: int = SHINGLE) -> np.ndarray:
+    """Hachages 64 bits (blake2b), triés et distincts, des k-grammes de mots du texte normalisé."""
+    words = _WORD.findall(text.lower())
+    grams = [" ".join(words[i:i + k]) for i in range(max(len(words) - k + 1, 1))] if words else []
+    digests = b"".join(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest() for g in grams)
+    return np.unique(np.frombuffer(digests, dtype="<u8"))
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """Finaliseur splitmix64 : chaque bit d'entrée influence tous les bits de sortie (modulo 2^64)."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    """Jaccard exact de deux ensembles de shingles (tableaux triés distincts) ; 0 si l'un est vide."""
+    if not len(a) or not len(b):
+        return 0.0
+    inter = len(np.intersect1d(a, b, assume_unique=True))
+    return inter / (len(a) + len(b) - inter)
+
+class MinHasher:
+    """h_i(x) = mix64(x ⊕ s_i) : une graine 64 bits par permutation, résultat sur tout [0, 2^64)."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.seeds = rng.integers(0, np.iinfo(np.uint64).max, num_perm, dtype=np.uint64, endpoint=True)
+
+    def signature(self, text: str) -> np.ndarray:
+        return self.signature_of(shingle_hashes(text))
+
+    def signature_of(self, shingles: np.ndarray) -> np.ndarray:
+        if not len(shingles):
+            return np.full(len(self.seeds), np.iinfo(np.uint64).max, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            return _mix64(shingles[:, None] ^ self.seeds).min(axis=0)
+
+class NearDupIndex:
+    """Copies canoniques vues jusqu'ici, par langue. add() renvoie la clé de la copie canonique
+    dont le chunk est un quasi-doublon (Jaccard exact ≥ threshold), ou None s'il devient lui-même
+    canonique. Les shingles des copies canoniques sont gardés pour cette vérification."""
+
+    def __init__(self, threshold: float = THRESHOLD, num_perm: int = NUM_PERM, bands: int = BANDS):
+        if num_perm % bands:
+            raise ValueError("num_perm doit être un multiple de bands")
+        self.hasher = MinHasher(num_perm)
+        self.threshold, self.bands, self.rows = threshold, bands, num_perm // bands
+        self._buckets: Dict[Tuple[str, int, bytes], List[int]] = {}
+        self._keys: List[str] = []
+        self._sigs: List[np.ndarray] = []
+        self._shingles: List[np.ndarray] = []
+        self.kept: Dict[str, int] = {}     # langue → chunks canoniques
+        self.dropped: Dict[str, int] = {}  # langue → doublons écartés
+
+    def add(self, key: str, text: str, language: str) -> Optional[str]:
+        shingles = shingle_hashes(text)
+        if not len(shingles):  # aucun mot : rien à comparer, chunk gardé tel quel
+            self.kept[language] = self.kept.get(language, 0) + 1
+            return None
+        sig = self.hasher.signature_of(shingles)
+        bands = [(language, b, sig[b * self.rows:(b + 1) * self.rows].tobytes()) for b in range(self.bands)]
+        candidates = sorted({i for band in bands for i in self._buckets.get(band, ())})
+        if candidates:
+            est = (np.stack([self._sigs[i] for i in candidates]) == sig).mean(axis=1)
+            # du plus proche estimé au moins proche (à égalité, la copie la plus ancienne)
+            for j in np.argsort(-est, kind="stable"):
+                if est[j] < self.threshold - MAX_SLACK:
+                    break
+                i = candidates[j]
+                if jaccard(shingles, self._shingles[i]) >= self.threshold:
+                    self.dropped[language] = self.dropped.get(language, 0) + 1
+                    return self._keys[i]
+        idx = len(self._keys)
+        self._keys.append(key)
+        self._sigs.append(sig)
+        self._shingles.append(shingles)
+        for band in bands:
+            self._buckets.setdefault(band, []).append(idx)
+        self.kept[language] = self.kept.get(language, 0) + 1
+        return None
+
+    def report(self) -> Dict:
+        kept, dropped = sum(self.kept.values()), sum(self.dropped.values())
+        total = kept + dropped
+        return {"threshold": self.threshold, "chunks": total, "kept": kept, "dropped": dropped,
+                "shrink": round(dropped / total, 4) if total else 0.0,
+                "by_language": {lang: {"kept": self.kept.get(lang, 0), "dropped": self.dropped.get(lang, 0)}
+                                for lang in sorted(set(self.kept) | set(self.dropped))}}
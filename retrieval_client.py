@@ -0,0 +1,125 @@
+# retrieval_client.py — Client léger du serveur de recherche (retrieval_server.py)
+# Les apps Gradio n'ont alors ni modèle d'embedding ni index en mémoire : un seul processus serveur
+# les partage entre tous les workers. RETRIEVAL_URL = http://127.0.0.1:8090 ou unix:///chemin/socket.
+# Compatible Python 3.9 (bibliothèque standard + NumPy / langchain_core)
+
+from typing import Any, Dict, List, Optional, Tuple
+from http.client import HTTPConnection, HTTPException
+from urllib.parse import urlsplit
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+
+from langchain_core.documents import Document
+
+RETRIEVAL_URL = os.getenv("RETRIEVAL_URL")  # non défini → recherche en local (SearcherLoader)
+TIMEOUT = 30.0  # secondes par requête (file d'attente du serveur comprise)
+
+class UnixHTTPConnection(HTTPConnection):
+    """HTTP sur socket Unix (serveur lancé avec --socket)."""
+
+    def __init__(self, path: str, timeout: float = TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+def connect(url: str, timeout: float = TIMEOUT) -> HTTPConnection:
+    u = urlsplit(url)
+    if u.scheme == "unix":
+        return UnixHTTPConnection(u.path, timeout)
+    if u.scheme != "http":
+        raise ValueError(f"URL du serveur de recherche non gérée : {url} (http://hôte:port ou unix:///socket)")
+    return HTTPConnection(u.hostname or "127.0.0.1", u.port or 80, timeout=timeout)
+
+def to_document(d: Dict[str, Any]) -> Document:
+    return Document(page_content=d["page_content"], metadata=d["metadata"])
+
+class RemoteSearcher:
+    """Même interface que SearcherLoader (ready, get, aget) et HybridSearcher (search, asearch,
+    search_many, embed_query) : les apps passent de l'un à l'autre sans autre changement."""
+
+    def __init__(self, url: str = RETRIEVAL_URL, timeout: float = TIMEOUT):
+        self.url, self.timeout = url, timeout
+        self._local = threading.local()  # une connexion persistante (keep-alive) par thread
+
+    def _request(self, method: str, path: str, payload: Optional[Dict] = None) -> Tuple[int, Dict]:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in range(2):  # connexion fermée par le serveur entre deux requêtes → une reprise
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = connect(self.url, self.timeout)
+            try:
+                conn.request(method, path, body, headers)
+                r = conn.getresponse()
+                return r.status, json.loads(r.read() or b"{}")
+            except (HTTPException, ConnectionError) as e:
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise ConnectionError(f"serveur de recherche injoignable ({self.url}) : {e}") from e
+        raise RuntimeError("unreachable")
+
+    def _call(self, path: str, payload: Dict) -> Dict:
+        status, data = self._request("POST", path, payload)
+        if status != 200:
+            raise RuntimeError(f"serveur de recherche : HTTP {status} ({data.get('error', '?')})")
+        return data
+
+    # ---------- interface SearcherLoader ----------
+    def ready(self) -> bool:
+        try:
+            return self._request("GET", "/ready")[0] == 200
+        except OSError:
+            return False
+
+    def get(self, timeout: Optional[float] = None) -> "RemoteSearcher":
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.ready():
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"serveur de recherche pas prêt ({self.url})")
+            time.sleep(0.2)
+        return self
+
+    async def aget(self) -> "RemoteSearcher":
+        return await asyncio.to_thread(self.get)
+
+    # ---------- interface HybridSearcher ----------
+    def search_many(self, queries: List[str], k_dense: int = 12, k_final: int = 5,
+                    trace: Optional[Dict[str, float]] = None, filters: Optional[Dict] = None):
+        t = time.perf_counter()
+        data = self._call("/search", {"queries": queries, "k_dense": k_dense, "k_final": k_final,
+                                      "filters": filters})
+        if trace is not None:
+            trace["remote"] = trace.get("remote", 0.0) + (time.perf_counter() - t) * 1000
+        return [([to_document(d) for d in r["docs"]], r["q2"]) for r in data["results"]]
+
+    def search(self, q: str, k_dense: int = 12, k_final: int = 5,
+               trace: Optional[Dict[str, float]] = None, filters: Optional[Dict] = None):
+        return self.search_many([q], k_dense, k_final, trace, filters)[0]
+
+    async def asearch(self, q: str, k_dense: int = 12, k_final: int = 5,
+                      trace: Optional[Dict[str, float]] = None, filters: Optional[Dict] = None):
+        return await asyncio.to_thread(self.search, q, k_dense, k_final, trace, filters)
+
+    def embed_query(self, q: str) -> np.ndarray:
+        return np.asarray(self._call("/embed", {"q": q})["vec"], dtype=np.float32)
+
+    def stats(self) -> Dict:
+        return self._request("GET", "/stats")[1]
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
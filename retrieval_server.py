@@ -0,0 +1,274 @@
+# retrieval_server.py — Serveur de recherche partagé (HybridSearcher) avec micro-lots
+# Un seul processus charge le modèle d'embedding, FAISS et BM25 ; les workers Gradio deviennent
+# des clients légers (retrieval_client.RemoteSearcher, RETRIEVAL_URL). Les requêtes simultanées
+# sont regroupées : la première ouvre une fenêtre de --window-ms, le lot part à --max-batch requêtes
+# ou à la fin de la fenêtre, et passe en un seul search_many (un forward pass, une recherche FAISS).
+#   python retrieval_server.py serve --port 8090          (ou --socket /tmp/rag-retrieval.sock)
+#   RETRIEVAL_URL=http://127.0.0.1:8090 python app.py
+#   python retrieval_server.py bench --url http://127.0.0.1:8090 --clients 1,4,16
+# Compatible Python 3.9
+
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+
+import numpy as np
+
+from encoders import BACKENDS
+from fusion import FUSION_MODES
+from hybrid_search import (CACHE_SIZE, EMBED_BACKEND, FUSION_MODE, HybridSearcher, SearcherLoader,
+                           filter_key)
+from metrics import METRICS
+from retrieval_client import RemoteSearcher
+
+PORT = 8090
+BATCH_WINDOW_MS = 5.0   # attente max. d'autres requêtes après la première d'un lot
+MAX_BATCH = 16          # requêtes max. par lot
+QUERIES_FILE = "bench_queries.jsonl"
+BENCH_CLIENTS = (1, 4, 16)
+BENCH_REQUESTS = 200    # requêtes par client et par palier
+
+class _Pending:
+    __slots__ = ("query", "k_dense", "k_final", "filters", "future", "arrived")
+
+    def __init__(self, query: str, k_dense: int, k_final: int, filters: Optional[Dict]):
+        self.query, self.k_dense, self.k_final, self.filters = query, k_dense, k_final, filters
+        self.future: Future = Future()
+        self.arrived = time.monotonic()
+
+class MicroBatcher:
+    """File de requêtes → lots exécutés par un seul thread (search_many par jeu de paramètres)."""
+
+    def __init__(self, loader: SearcherLoader, window_ms: float = BATCH_WINDOW_MS,
+                 max_batch: int = MAX_BATCH):
+        self.loader, self.window, self.max_batch = loader, window_ms / 1000, max(1, max_batch)
+        self.batches = self.queries = 0
+        self._queue: "queue.Queue[Optional[_Pending]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, query: str, k_dense: int, k_final: int, filters: Optional[Dict]) -> Future:
+        p = _Pending(query, k_dense, k_final, filters)
+        self._queue.put(p)
+        return p.future
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first: _Pending) -> Tuple[List[_Pending], bool]:
+        """Lot ouvert par `first` ; les requêtes déjà en file partent même si la fenêtre est passée."""
+        batch, deadline = [first], first.arrived + self.window
+        while len(batch) < self.max_batch:
+            left = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=left) if left > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        hs = None
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, stop = self._collect(first)
+            try:
+                hs = hs or self.loader.get()
+            except Exception as e:
+                for p in batch:
+                    p.future.set_exception(e)
+            else:
+                self._execute(hs, batch)
+            if stop:
+                return
+
+    def _execute(self, hs: HybridSearcher, batch: List[_Pending]) -> None:
+        start = time.monotonic()
+        for p in batch:
+            METRICS.observe("batch_wait", start - p.arrived)
+        METRICS.count("batch", len(batch))
+        self.batches += 1
+        self.queries += len(batch)
+        groups: Dict[Tuple, List[_Pending]] = {}
+        for p in batch:
+            groups.setdefault((p.k_dense, p.k_final, filter_key(p.filters)), []).append(p)
+        for (k_dense, k_final, _), items in groups.items():
+            try:
+                results = hs.search_many([p.query for p in items], k_dense, k_final, filters=items[0].filters)
+            except Exception as e:  # l'erreur est renvoyée à chaque client du groupe
+                for p in items:
+                    p.future.set_exception(e)
+                continue
+            for p, r in zip(items, results):
+                p.future.set_result(r)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"batches": self.batches, "queries": self.queries,
+                "mean_batch": self.queries / self.batches if self.batches else 0.0,
+                "window_ms": self.window * 1000, "max_batch": self.max_batch}
+
+# ---------- HTTP (localhost ou socket Unix) ----------
+def _json_default(o: Any) -> Any:
+    return o.item() if isinstance(o, np.generic) else str(o)
+
+def make_handler(loader: SearcherLoader, batcher: MicroBatcher):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # connexions persistantes (un thread par client)
+        server_version = "RAGRetrieval/0.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, status: int, payload: Dict) -> None:
+            body = json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/ready":
+                return self._send(200, {"ready": True}) if loader.ready() else self._send(503, {"ready": False})
+            if self.path == "/healthz":
+                return self._send(200, {"ok": True})
+            if self.path == "/stats":
+                caches = loader.searcher.cache_stats() if loader.ready() else {}
+                return self._send(200, {"batcher": batcher.stats(), "caches": caches})
+            if self.path == "/metrics.json":
+                return self._send(200, METRICS.to_dict())
+            self._send(404, {"error": f"chemin inconnu : {self.path}"})
+
+        def do_POST(self):
+            try:
+                req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except ValueError as e:
+                return self._send(400, {"error": f"JSON invalide ({e})"})
+            if not loader.ready():
+                return self._send(503, {"error": "index en cours de chargement"})
+            try:
+                if self.path == "/search":
+                    futures = [batcher.submit(q, int(req.get("k_dense", 12)), int(req.get("k_final", 5)),
+                                              req.get("filters")) for q in req.get("queries", [])]
+                    results = [f.result() for f in futures]
+                    return self._send(200, {"results": [
+                        {"q2": q2, "docs": [{"page_content": d.page_content, "metadata": d.metadata}
+                                            for d in docs]} for docs, q2 in results]})
+                if self.path == "/embed":
+                    return self._send(200, {"vec": loader.searcher.embed_query(req["q"]).tolist()})
+            except (KeyError, TypeError, ValueError) as e:
+                return self._send(400, {"error": f"requête invalide ({e})"})
+            except Exception as e:
+                return self._send(500, {"error": str(e)})
+            self._send(404, {"error": f"chemin inconnu : {self.path}"})
+
+    return Handler
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+def serve(loader: SearcherLoader, batcher: MicroBatcher, port: int = PORT, host: str = "127.0.0.1",
+          socket_path: Optional[str] = None) -> socketserver.BaseServer:
+    handler = make_handler(loader, batcher)
+    if socket_path:
+        if os.path.exists(socket_path):  # socket d'un serveur précédent
+            os.remove(socket_path)
+        return ThreadingUnixHTTPServer(socket_path, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+# ---------- Benchmark (1, 4, 16 clients) ----------
+def bench(url: str, queries: List[str], clients: List[int], requests: int = BENCH_REQUESTS,
+          k_final: int = 5) -> List[Dict]:
+    """Chaque client (thread, connexion propre) enchaîne `requests` requêtes ; débit et p50 / p99
+    côté client, taille moyenne des lots côté serveur."""
+    rc = RemoteSearcher(url).get(timeout=600)
+    rc.search(queries[0], k_final=k_final)  # connexion + chauffe
+    rows = []
+    for n in clients:
+        lat: List[List[float]] = [[] for _ in range(n)]
+
+        def client(i: int) -> None:
+            for j in range(requests):
+                t = time.perf_counter()
+                rc.search(queries[(i * 7 + j) % len(queries)], k_final=k_final)
+                lat[i].append((time.perf_counter() - t) * 1000)
+
+        before = rc.stats()["batcher"]
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(n)]
+        t0 = time.perf_counter()
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        wall = time.perf_counter() - t0
+        after = rc.stats()["batcher"]
+        all_ms = [x for per in lat for x in per]
+        batches = after["batches"] - before["batches"]
+        rows.append({"clients": n, "qps": round(len(all_ms) / wall, 1),
+                     "p50_ms": round(float(np.percentile(all_ms, 50)), 2),
+                     "p99_ms": round(float(np.percentile(all_ms, 99)), 2),
+                     "mean_batch": round((after["queries"] - before["queries"]) / batches, 2) if batches else 0.0})
+    return rows
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Serveur de recherche partagé (micro-lots) et son benchmark.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sv = sub.add_parser("serve", help="charge l'index et sert /search, /embed, /ready, /stats")
+    sv.add_argument("--host", default="127.0.0.1")
+    sv.add_argument("--port", type=int, default=PORT)
+    sv.add_argument("--socket", help="socket Unix (au lieu de --host / --port)")
+    sv.add_argument("--window-ms", type=float, default=BATCH_WINDOW_MS, help="fenêtre de regroupement")
+    sv.add_argument("--max-batch", type=int, default=MAX_BATCH, help="1 = pas de micro-lots")
+    sv.add_argument("--backend", default=EMBED_BACKEND, choices=BACKENDS, help="encodeur des requêtes")
+    sv.add_argument("--fusion", default=FUSION_MODE, choices=FUSION_MODES, help="mode de fusion dense + BM25")
+    sv.add_argument("--no-cache", action="store_true", help="sans cache de résultats (benchmark)")
+    bn = sub.add_parser("bench", help="débit et p50 / p99 avec 1, 4, 16 clients simultanés")
+    bn.add_argument("--url", default=f"http://127.0.0.1:{PORT}", help="http://hôte:port ou unix:///socket")
+    bn.add_argument("--clients", default=",".join(map(str, BENCH_CLIENTS)))
+    bn.add_argument("--requests", type=int, default=BENCH_REQUESTS, help="requêtes par client")
+    bn.add_argument("--queries", default=QUERIES_FILE)
+    bn.add_argument("--out", help="fichier JSON des résultats")
+    args = ap.parse_args()
+
+    if args.cmd == "bench":
+        with open(args.queries, encoding="utf-8") as f:
+            qs = [json.loads(line)["query"] for line in f if line.strip()]
+        rows = bench(args.url, qs, [int(c) for c in args.clients.split(",")], args.requests)
+        print(f"{'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'lot moy.':>8}")
+        for r in rows:
+            print(f"{r['clients']:>7} {r['qps']:>8} {r['p50_ms']:>8} {r['p99_ms']:>8} {r['mean_batch']:>8}")
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump({"url": args.url, "rows": rows}, f, indent=2)
+    else:
+        loader = SearcherLoader(cache_size=0 if args.no_cache else CACHE_SIZE, embed_backend=args.backend,
+                                fusion=args.fusion)
+        batcher = MicroBatcher(loader, args.window_ms, args.max_batch)
+        server = serve(loader, batcher, args.port, args.host, args.socket)
+        where = f"unix://{args.socket}" if args.socket else f"http://{args.host}:{args.port}"
+        print(f"Serveur de recherche → RETRIEVAL_URL={where}  "
+              f"(lots ≤ {args.max_batch}, fenêtre {args.window_ms} ms)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if args.socket and os.path.exists(args.socket):
+                os.remove(args.socket)
+            batcher.close()
+            print(f"\n{batcher.stats()}")
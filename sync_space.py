@@ -0,0 +1,88 @@
+# sync_space.py — Copie dans hf-space/ les modules de la racine dont dépend hf-space/app.py
+#   python sync_space.py           # copie (ou met à jour) les modules, puis vérifie leur import isolé
+#   python sync_space.py --check   # n'écrit rien : code de sortie 1 si une copie manque ou est périmée
+# Les dépendances sont lues dans les imports de app.py (AST), récursivement ; seuls les modules présents
+# à la racine du dépôt sont copiés (les paquets pip viennent de hf-space/requirements.txt). Les copies
+# ne sont pas versionnées (.gitignore) : lancer ce script avant chaque envoi de la Space.
+# Compatible Python 3.9 (bibliothèque standard uniquement)
+
+from typing import List, Set
+import argparse
+import ast
+import filecmp
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SPACE_DIR = os.path.join(ROOT, "hf-space")
+SPACE_APP = os.path.join(SPACE_DIR, "app.py")
+
+def _is_main_guard(node: ast.stmt) -> bool:
+    """`if __name__ == "__main__":` — imports du CLI, inutiles à la Space."""
+    test = getattr(node, "test", None)
+    return (isinstance(node, ast.If) and isinstance(test, ast.Compare)
+            and isinstance(test.left, ast.Name) and test.left.id == "__name__")
+
+def local_imports(path: str) -> Set[str]:
+    """Modules de la racine importés par `path`, y compris dans les fonctions (hors bloc __main__)."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    names = set()
+    for stmt in tree.body:
+        if _is_main_guard(stmt):
+            continue
+        for node in ast.walk(stmt):
+            if isinstance(node, ast.Import):
+                names.update(alias.name.split(".")[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                names.add(node.module.split(".")[0])
+    return {n for n in names if os.path.isfile(os.path.join(ROOT, f"{n}.py"))}
+
+def space_modules(app: str = SPACE_APP) -> List[str]:
+    """Fermeture des imports locaux de l'app de la Space (noms de modules, triés)."""
+    todo, seen = list(local_imports(app)), set()
+    while todo:
+        name = todo.pop()
+        if name not in seen:
+            seen.add(name)
+            todo += local_imports(os.path.join(ROOT, f"{name}.py"))
+    return sorted(seen)
+
+def sync(modules: List[str], check: bool = False) -> List[str]:
+    """Copie les modules absents ou différents de la racine ; renvoie leurs noms (check : rien n'est écrit)."""
+    stale = []
+    for name in modules:
+        src, dst = os.path.join(ROOT, f"{name}.py"), os.path.join(SPACE_DIR, f"{name}.py")
+        if os.path.exists(dst) and filecmp.cmp(src, dst, shallow=False):
+            continue
+        stale.append(name)
+        if not check:
+            shutil.copy2(src, dst)
+    return stale
+
+def verify(modules: List[str]) -> None:
+    """Importe les modules depuis hf-space/ seul, comme dans la Space : interpréteur isolé (-I),
+    ni la racine du dépôt ni le dossier courant dans sys.path. Lève CalledProcessError sinon."""
+    code = (f"import sys; sys.path.insert(0, {SPACE_DIR!r})\n"
+            f"import {', '.join(modules)}\n"
+            f"bad = [m.__name__ for m in ({', '.join(modules)},) if not m.__file__.startswith({SPACE_DIR!r})]\n"
+            f"assert not bad, bad")
+    subprocess.run([sys.executable, "-I", "-c", code], cwd=SPACE_DIR, check=True)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Copie dans hf-space/ les modules dont dépend la Space.")
+    ap.add_argument("--check", action="store_true",
+                    help="n'écrit rien ; échoue si une copie manque ou diffère de la racine")
+    args = ap.parse_args()
+
+    modules = space_modules()
+    stale = sync(modules, args.check)
+    if args.check and stale:
+        print(f"⚠️  copies absentes ou périmées dans hf-space/ : {', '.join(stale)} "
+              "(lancer python sync_space.py)")
+        sys.exit(1)
+    verify(modules)
+    print(f"✅ hf-space/ : {len(modules)} modules ({', '.join(modules)}), {len(stale)} copiés ; "
+          "import isolé vérifié")
@@ -0,0 +1,116 @@
+# term_signals.py — Signaux "domaine" et "boost SRM" pré-calculés à l'indexation
+# Un automate Aho-Corasick parcourt chaque chunk une seule fois, quel que soit le nombre de termes.
+# Compatible Python 3.9
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import deque
+import json
+import os
+
+import numpy as np
+
+SIGNALS_FILE = "signals.npy"    # tableau (domain, boost) aligné sur les lignes FAISS
+SIGNALS_META = "signals.json"   # listes de termes utilisées (détection d'un fichier périmé)
+
+SIGNAL_DTYPE = np.dtype([("domain", "u1"), ("boost", "<u4")])
+
+# ---------- Aho-Corasick ----------
+class TermMatcher:
+    """Recherche multi-motifs (Aho-Corasick) sur du texte déjà en minuscules."""
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms = list(terms)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for idx, term in enumerate(self.terms):
+            if not term:
+                continue
+            node = 0
+            for ch in term:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][ch] = nxt
+                node = nxt
+            self._out[node].append(idx)
+
+        # liens d'échec (parcours en largeur)
+        queue = deque(self._goto[0].values())
+        while queue:
+            r = queue.popleft()
+            for ch, u in self._goto[r].items():
+                queue.append(u)
+                f = self._fail[r]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[u] = self._goto[f].get(ch, 0)
+                self._out[u] = self._out[u] + self._out[self._fail[u]]
+
+    def matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Génère (indice du terme, position de fin) pour chaque occurrence, chevauchements compris."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for pos, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for idx in out[node]:
+                yield idx, pos + 1
+
+    def any(self, text: str) -> bool:
+        return next(self.matches(text), None) is not None
+
+    def counts(self, text: str) -> List[int]:
+        """Occurrences par terme, non chevauchantes (même sémantique que str.count)."""
+        counts = [0] * len(self.terms)
+        last_end = [0] * len(self.terms)
+        for idx, end in self.matches(text):
+            if end - len(self.terms[idx]) >= last_end[idx]:
+                counts[idx] += 1
+                last_end[idx] = end
+        return counts
+
+# ---------- Calcul / persistance ----------
+def compute_signals(docs: Iterable, domain_terms: List[str], boost_terms: List[str]) -> np.ndarray:
+    """Même logique que is_domain / boost_rank, calculée une fois par chunk."""
+    domain = TermMatcher(domain_terms)
+    boost = TermMatcher(boost_terms)
+    rows = []
+    for doc in docs:
+        title = doc.metadata.get("title", "")
+        rows.append((
+            domain.any((title + " " + doc.page_content).lower()),
+            sum(boost.counts((doc.page_content + " " + title).lower())),
+        ))
+    return np.array(rows, dtype=SIGNAL_DTYPE)
+
+def save_signals(index_dir: str, signals: np.ndarray, rows_hash: str,
+                 domain_terms: List[str], boost_terms: List[str]) -> None:
+    """rows_hash : faiss_rows_hash() de l'index FAISS auquel ces signaux correspondent."""
+    path = os.path.join(index_dir, SIGNALS_FILE)
+    with open(path + ".tmp", "wb") as f:  # écriture atomique (lecteurs en mmap)
+        np.save(f, signals)
+    os.replace(path + ".tmp", path)
+    with open(os.path.join(index_dir, SIGNALS_META + ".tmp"), "w", encoding="utf-8") as f:
+        json.dump({"rows": len(signals), "faiss_rows": rows_hash, "domain_terms": list(domain_terms),
+                   "boost_terms": list(boost_terms)}, f, ensure_ascii=False)
+    os.replace(os.path.join(index_dir, SIGNALS_META + ".tmp"), os.path.join(index_dir, SIGNALS_META))
+
+def load_signals(index_dir: str, n_rows: int, rows_hash: str,
+                 domain_terms: List[str], boost_terms: List[str]) -> Optional[np.ndarray]:
+    """Charge les signaux (mmap) ; None si absents ou calculés avec d'autres termes / un autre index."""
+    try:
+        with open(os.path.join(index_dir, SIGNALS_META), encoding="utf-8") as f:
+            meta = json.load(f)
+        signals = np.load(os.path.join(index_dir, SIGNALS_FILE), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if (meta.get("rows") != n_rows or len(signals) != n_rows or meta.get("faiss_rows") != rows_hash
+            or meta.get("domain_terms") != list(domain_terms)
+            or meta.get("boost_terms") != list(boost_terms)):
+        return None
+    return signals
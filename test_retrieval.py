@@ -1,6 +1,9 @@
-from langchain_community.vectorstores import FAISS
+import numpy as np
 from langchain_community.embeddings import HuggingFaceEmbeddings
 
+from ann_index import read_index
+from chunk_store import ChunkStore
+
 INDEX_DIR = "faiss_open_index"
 
 emb = HuggingFaceEmbeddings(
@@ -8,16 +11,17 @@ emb = HuggingFaceEmbeddings(
     encode_kwargs={"normalize_embeddings": True}
 )
 
-# allow_dangerous_deserialization est nécessaire pour recharger FAISS sauvegardé
-vs = FAISS.load_local(INDEX_DIR, emb, allow_dangerous_deserialization=True)
-retriever = vs.as_retriever(search_kwargs={"k": 5})
+# vecteurs seuls dans index.faiss ; textes et métadonnées dans le chunk store
+index = read_index(f"{INDEX_DIR}/index.faiss")
+store = ChunkStore(INDEX_DIR)
 
 while True:
     try:
         q = input("\nTa question (ENTER pour quitter): ").strip()
         if not q:
             break
-        hits = retriever.invoke(q)
+        _, rows = index.search(np.asarray([emb.embed_query(q)], dtype=np.float32), 5)
+        hits = [store.document(int(r)) for r in rows[0] if r != -1]
         for i, d in enumerate(hits, 1):
             print(f"{i}. {d.metadata.get('title')} — {d.metadata.get('url')}")
             print("   ", d.page_content[:140].replace('\\n',' '), "…")
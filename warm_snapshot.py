@@ -0,0 +1,97 @@
+# warm_snapshot.py — Snapshot de démarrage à chaud, livré avec l'index (INDEX_DIR/warm)
+# - model/ : poids + tokenizer (fast) du modèle d'embedding, chargés sans passer par le Hub
+# - rewrites.json : table requête normalisée → requête réécrite (requêtes fréquentes)
+# - embeddings.npy : embeddings pré-calculés de ces requêtes réécrites (encodeur torch)
+# HybridSearcher l'utilise s'il a été construit pour le même modèle ; la table de réécriture
+# n'est reprise que si les règles EXPAND n'ont pas changé, les embeddings que si le backend des
+# requêtes est celui qui les a calculés (sinon deux encodeurs se mélangeraient dans un même flux).
+# Compatible Python 3.9
+
+from typing import Dict, List, Optional
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+SNAPSHOT_DIR = "warm"  # sous-dossier de INDEX_DIR
+SNAPSHOT_VERSION = 1
+SNAPSHOT_BACKEND = "torch"  # encodeur des embeddings pré-calculés (SentenceTransformer)
+
+def rules_hash(expand: Dict[str, List[str]]) -> str:
+    return hashlib.sha1(json.dumps(expand, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class WarmSnapshot:
+    """Modèle local + tables pré-calculées (lecture seule)."""
+    __slots__ = ("model_dir", "rewrites", "vectors")
+
+    def __init__(self, model_dir: str, rewrites: Dict[str, str], vectors: Dict[str, List[float]]):
+        self.model_dir = model_dir
+        self.rewrites = rewrites
+        self.vectors = vectors
+
+def save_snapshot(index_dir: str, model_name: str, expand: Dict[str, List[str]], model,
+                  rewrites: Dict[str, str], vectors: np.ndarray) -> None:
+    """model : SentenceTransformer ; vectors alignés sur les valeurs distinctes de `rewrites`."""
+    out = os.path.join(index_dir, SNAPSHOT_DIR)
+    tmp = out + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    model.save(os.path.join(tmp, "model"))
+    np.save(os.path.join(tmp, "embeddings.npy"), np.asarray(vectors, dtype=np.float32))
+    with open(os.path.join(tmp, "rewrites.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": SNAPSHOT_VERSION,
+            "model": model_name,
+            "backend": SNAPSHOT_BACKEND,
+            "rules": rules_hash(expand),
+            "rewrites": rewrites,
+            "embedded": list(dict.fromkeys(rewrites.values())),
+        }, f, ensure_ascii=False)
+    shutil.rmtree(out, ignore_errors=True)
+    os.replace(tmp, out)
+
+def load_snapshot(index_dir: str, model_name: str, expand: Dict[str, List[str]],
+                  backend: str = SNAPSHOT_BACKEND) -> Optional[WarmSnapshot]:
+    """Snapshot s'il existe et correspond à `model_name`, sinon None. `backend` : encodeur des
+    requêtes ; les embeddings pré-calculés ne sont repris que s'il a servi à les calculer."""
+    src = os.path.join(index_dir, SNAPSHOT_DIR)
+    try:
+        with open(os.path.join(src, "rewrites.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        vectors = np.load(os.path.join(src, "embeddings.npy"))
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != SNAPSHOT_VERSION or meta.get("model") != model_name:
+        print("⚠️  snapshot de démarrage périmé (autre modèle) : ignoré (relancer warm_snapshot.py)")
+        return None
+    # les embeddings dépendent du modèle et de l'encodeur ; la table de réécriture, des règles EXPAND
+    rewrites = meta["rewrites"] if meta.get("rules") == rules_hash(expand) else {}
+    same_encoder = meta.get("backend", SNAPSHOT_BACKEND) == backend  # snapshots antérieurs : torch
+    return WarmSnapshot(os.path.join(src, "model"), rewrites,
+                        {q2: v.tolist() for q2, v in zip(meta["embedded"], vectors)} if same_encoder else {})
+
+if __name__ == "__main__":
+    from sentence_transformers import SentenceTransformer
+
+    from hybrid_search import EMBED_MODEL, EXPAND, INDEX_DIR, normalize_query, rewrite
+
+    ap = argparse.ArgumentParser(description="Construit le snapshot de démarrage à chaud (INDEX_DIR/warm).")
+    ap.add_argument("--index-dir", default=INDEX_DIR)
+    ap.add_argument("--model", default=EMBED_MODEL)
+    ap.add_argument("--queries", default="bench_queries.jsonl",
+                    help="requêtes fréquentes : .jsonl (champ query) ou une requête par ligne")
+    args = ap.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    queries = [json.loads(line)["query"] if line.startswith("{") else line for line in lines]
+
+    rewrites = {normalize_query(q): rewrite(normalize_query(q)) for q in queries}
+    model = SentenceTransformer(args.model)
+    embedded = list(dict.fromkeys(rewrites.values()))
+    vectors = model.encode(embedded, normalize_embeddings=True, batch_size=64)
+    save_snapshot(args.index_dir, args.model, EXPAND, model, rewrites, vectors)
+    print(f"✅ Snapshot → {os.path.join(args.index_dir, SNAPSHOT_DIR)} "
+          f"({len(rewrites)} requêtes, {len(embedded)} embeddings, modèle {args.model})")
@@ -0,0 +1,231 @@
+# wiki_fetch.py — Récupération concurrente et mise en cache des pages Wikipédia (API MediaWiki)
+# - titres résolus par lots de 50 (titre canonique, redirections, révision courante, URL)
+# - texte brut téléchargé seulement si (langue, titre, révision) manque au cache disque (SQLite)
+# - pool de threads borné, débit limité par hôte, nouvel essai sur 429 / 5xx
+# - hors ligne : tout est rejoué depuis le cache (dernière résolution connue de chaque titre)
+# WIKI_API (gabarit avec {lang}) permet de viser un autre serveur, ex. mock_wiki_server.py.
+# Compatible Python 3.9 (bibliothèque standard uniquement)
+
+from typing import Dict, Iterable, List, Optional, Tuple
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urlsplit
+from urllib.request import Request, urlopen
+import json
+import os
+import sqlite3
+import threading
+import time
+
+WIKI_API = os.getenv("WIKI_API", "https://{lang}.wikipedia.org/w/api.php")
+USER_AGENT = "experiment-brief-assistant/0.4"
+WIKI_CACHE = "wiki_cache.sqlite"  # cache disque des pages (hors dataset)
+
+WORKERS = 8            # requêtes HTTP simultanées (toutes langues confondues)
+RATE_PER_HOST = 10.0   # requêtes / s max. vers un même hôte
+RETRIES = 3            # nouveaux essais sur 429 / 5xx / erreur réseau
+TIMEOUT = 30           # secondes par requête
+INFO_BATCH = 50        # titres par requête de résolution (limite de l'API)
+
+def retry_after(value: Optional[str], default: float) -> float:
+    """Délai (s) d'un en-tête Retry-After : secondes ou date HTTP ; `default` si absent ou illisible."""
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+class Page:
+    """Page résolue : titre canonique, URL, révision et texte brut (sections en texte simple)."""
+    __slots__ = ("title", "url", "revid", "text")
+
+    def __init__(self, title: str, url: str, revid: int, text: str):
+        self.title = title
+        self.url = url
+        self.revid = revid
+        self.text = text
+
+class RateLimiter:
+    """Intervalle minimal entre deux requêtes vers un même hôte (partagé entre threads)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host: str) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, 0.0))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class PageCache:
+    """Pages par (langue, titre, révision) + dernière résolution connue de chaque titre demandé."""
+
+    def __init__(self, path: str = WIKI_CACHE):
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS pages (lang TEXT, title TEXT, revid INTEGER, url TEXT, "
+                        "text TEXT, PRIMARY KEY (lang, title, revid))")
+        # title NULL : page absente lors de la dernière résolution
+        self.db.execute("CREATE TABLE IF NOT EXISTS titles (lang TEXT, requested TEXT, title TEXT, "
+                        "revid INTEGER, PRIMARY KEY (lang, requested))")
+
+    def get(self, lang: str, title: str, revid: int) -> Optional[Page]:
+        with self._lock:
+            row = self.db.execute("SELECT url, text FROM pages WHERE lang = ? AND title = ? AND revid = ?",
+                                  (lang, title, revid)).fetchone()
+        return Page(title, row[0], revid, row[1]) if row else None
+
+    def put(self, lang: str, page: Page) -> None:
+        with self._lock:
+            self.db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                            (lang, page.title, page.revid, page.url, page.text))
+            self.db.commit()
+
+    def resolution(self, lang: str, requested: str) -> Optional[Tuple[Optional[str], Optional[int]]]:
+        with self._lock:
+            row = self.db.execute("SELECT title, revid FROM titles WHERE lang = ? AND requested = ?",
+                                  (lang, requested)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def remember(self, lang: str, resolved: Dict[str, Optional[Tuple[str, int, str]]]) -> None:
+        with self._lock:
+            self.db.executemany("INSERT OR REPLACE INTO titles VALUES (?, ?, ?, ?)",
+                                ((lang, req, r[0] if r else None, r[1] if r else None)
+                                 for req, r in resolved.items()))
+            self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+class WikiFetcher:
+    """fetch_many(lang, titres) → {titre demandé: Page | None}, chaque titre au plus une fois."""
+
+    def __init__(self, cache_path: str = WIKI_CACHE, api: str = WIKI_API, workers: int = WORKERS,
+                 rate: float = RATE_PER_HOST, offline: bool = False, user_agent: str = USER_AGENT):
+        self.api, self.offline, self.user_agent = api, offline, user_agent
+        self.cache = PageCache(cache_path)
+        self.limiter = RateLimiter(rate)
+        self.stats: Counter = Counter()  # requests, retries, downloaded, cache_hits, missing
+        self._stats_lock = threading.Lock()
+        self._pool = None if offline else ThreadPoolExecutor(workers, thread_name_prefix="wiki")
+
+    def __enter__(self) -> "WikiFetcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self.cache.close()
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += n
+
+    # ---------- HTTP ----------
+    def _query(self, lang: str, **params: str) -> Dict:
+        """GET action=query (JSON, formatversion 2) avec limite de débit et nouveaux essais."""
+        url = self.api.format(lang=lang) + "?" + urlencode(
+            {"action": "query", "format": "json", "formatversion": "2", **params})
+        host = urlsplit(url).netloc
+        for attempt in range(RETRIES + 1):
+            self.limiter.wait(host)
+            self._count("requests")
+            try:
+                with urlopen(Request(url, headers={"User-Agent": self.user_agent}), timeout=TIMEOUT) as r:
+                    return json.load(r)
+            except HTTPError as e:
+                if e.code != 429 and e.code < 500 or attempt == RETRIES:
+                    raise
+                delay = retry_after(e.headers.get("Retry-After"), 2 ** attempt)
+            except URLError:
+                if attempt == RETRIES:
+                    raise
+                delay = 2 ** attempt
+            self._count("retries")
+            time.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    def _resolve(self, lang: str, titles: List[str]) -> Dict[str, Optional[Tuple[str, int, str]]]:
+        """Titre demandé → (titre canonique, révision courante, URL) ou None si la page n'existe pas."""
+        data = self._query(lang, prop="info", inprop="url", redirects="1", titles="|".join(titles))
+        q = data.get("query", {})
+        hops = {n["from"]: n["to"] for n in q.get("normalized", []) + q.get("redirects", [])}
+        pages = {p["title"]: p for p in q.get("pages", [])}
+        out: Dict[str, Optional[Tuple[str, int, str]]] = {}
+        for requested in titles:
+            title, seen = requested, set()
+            while title in hops and title not in seen:  # normalisation puis redirections
+                seen.add(title)
+                title = hops[title]
+            p = pages.get(title)
+            ok = p is not None and not p.get("missing") and not p.get("invalid")
+            out[requested] = (p["title"], int(p["lastrevid"]), p["fullurl"]) if ok else None
+        return out
+
+    def _download(self, lang: str, title: str) -> Optional[Page]:
+        data = self._query(lang, prop="extracts|revisions|info", explaintext="1", exsectionformat="plain",
+                           rvprop="ids", inprop="url", titles=title)
+        pages = data.get("query", {}).get("pages", [])
+        if not pages or pages[0].get("missing"):
+            return None
+        p = pages[0]
+        # révision renvoyée avec le texte (la page a pu changer depuis la résolution)
+        revid = int(p["revisions"][0]["revid"]) if p.get("revisions") else int(p["lastrevid"])
+        page = Page(p["title"], p["fullurl"], revid, p.get("extract") or "")
+        self.cache.put(lang, page)
+        self._count("downloaded")
+        return page
+
+    # ---------- API ----------
+    def fetch_many(self, lang: str, titles: Iterable[str]) -> Dict[str, Optional[Page]]:
+        titles = list(dict.fromkeys(titles))
+        if self.offline:
+            return {t: self._replay(lang, t) for t in titles}
+
+        batches = [titles[i:i + INFO_BATCH] for i in range(0, len(titles), INFO_BATCH)]
+        resolved: Dict[str, Optional[Tuple[str, int, str]]] = {}
+        for part in self._pool.map(lambda b: self._resolve(lang, b), batches):
+            resolved.update(part)
+        self.cache.remember(lang, resolved)
+
+        pages: Dict[Tuple[str, int], Optional[Page]] = {}
+        todo = []
+        for key in dict.fromkeys(r[:2] for r in resolved.values() if r):
+            page = self.cache.get(lang, *key)
+            if page is not None:
+                pages[key] = page
+                self._count("cache_hits")
+            else:
+                todo.append(key)
+        for key, page in zip(todo, self._pool.map(lambda k: self._download(lang, k[0]), todo)):
+            pages[key] = page
+
+        out = {t: pages.get(r[:2]) if r else None for t, r in resolved.items()}
+        self._count("missing", sum(p is None for p in out.values()))
+        return out
+
+    def _replay(self, lang: str, requested: str) -> Optional[Page]:
+        res = self.cache.resolution(lang, requested)
+        page = self.cache.get(lang, res[0], res[1]) if res and res[0] else None
+        if page is None:
+            self._count("missing")
+            if res is None or res[0]:
+                print(f"⚠️  hors ligne : [{lang}] {requested} absent du cache")
+        else:
+            self._count("cache_hits")
+        return page